@@ -22,12 +22,19 @@
 
 import argparse
 import logging
+import re
 import sys
+import subprocess
 import io
+import os
 import json
+import time
 from sys import platform
-from tabulate import tabulate
 from pyusb_chain.usb_tree_view_tool import UsbTreeViewTool
+from pyusb_chain.scan_scope import ScanScope
+from pyusb_chain.ingest import ArchiveIngester, ArchiveStore
+from pyusb_chain.table import TableRenderer
+from pyusb_chain.live_view import LiveView
 from pyusb_chain._version import VERSION
 
 logging.basicConfig(level=logging.INFO)
@@ -39,15 +46,34 @@ class USBDevicesChain(object):
     It implements the table print and export json features.
     """
     EXPORT_JSON_NAME = "usb_port_chain_export.json"
+    #: the hotplug journal kept across the command line runs in the per-user state directory, see --history
+    JOURNAL_NAME = "journal.json"
+    ARCHIVE_STORE_NAME = "usb_port_chain_archive.db"
+    #: the sub-commands, like "pyusb-chain ingest DIR", the other options are parsed as before
+    COMMANDS = ("ingest", "exec", "probe")
+    #: the placeholder of the port name in the command of "pyusb-chain exec", like {BOARD}
+    PLACEHOLDER = re.compile(r"\{(\w+)\}")
 
     def __init__(self):
         self.args = None
+        self.command = None
         pass
 
     def command_process(self):
         """Process command line
         :return: None
         """
+        if len(sys.argv) > 1 and sys.argv[1] in self.COMMANDS:
+            self.command = sys.argv[1]
+            parser = getattr(self, "{}_parser".format(self.command))()
+            parser.add_argument("-v", "--verbose", action="store", dest="verbose",
+                help="verbose log mode, 'debug', 'fatal', 'error', 'warning', 'info'")
+            self.args = parser.parse_args(sys.argv[2:])
+            USBDevicesChain.set_verbose(self.args.verbose)
+            logger.debug(sys.argv)
+            logger.debug(self.args)
+            return
+
         parser = argparse.ArgumentParser(description="Command line for port path of USB devices "
                                                      "(COM ports / Audio Devices)\r\nVersion:{}".format(VERSION))
         if "win32" == platform:
@@ -61,13 +87,53 @@ class USBDevicesChain(object):
             help="filter the key words of USB devices information")
         parser.add_argument("-e", "--export", action="store_true", default=False, dest="export",
             help="export the json format with all connected USB devices information")
+        parser.add_argument("-t", "--timeout", action="store", type=float, dest="timeout",
+            help="overall deadline of scanning in seconds, the partial result is listed if it times out")
+        parser.add_argument("--under", action="store", dest="under",
+            help="only scan the subtree of the port chain, like 1-7")
+        parser.add_argument("--vid", action="append", dest="vids",
+            help="only scan the devices of the vendor ID, like 0x10C4, use it multi-times for more IDs")
+        parser.add_argument("--pid", action="append", dest="pids",
+            help="only scan the devices of the product ID, like 0xEA60, use it multi-times for more IDs")
+        parser.add_argument("-w", "--watch", action="store", nargs="?", type=float, const=1.0, dest="watch",
+            help="list the devices in a live view, rescan only once the topology is changed and redraw the changed "
+                 "rows, every WATCH seconds (default is 1)")
+        parser.add_argument("--history", action="store", nargs="?", const="", dest="history",
+            help="scan and list the attach/detach history recorded by the runs with --history, "
+                 "only for the port chain if it's given, like 2-1-7-3-2")
+        parser.add_argument("--since", action="store", type=float, dest="since",
+            help="only list the history in the last minutes")
+        parser.add_argument("--journal", action="store", dest="journal", metavar="PATH",
+            help="the journal file of --history, default is journal.json of the per-user state directory")
+        parser.add_argument("--inventory", action="store", dest="inventory",
+            help="scan and validate the rig inventory file (json or INI) of the expected devices, "
+                 "exit with 1 if any device is not as expected")
         parser.add_argument("-v", "--verbose", action="store", dest="verbose",
             help="verbose log mode, 'debug', 'fatal', 'error', 'warning', 'info'")
 
         self.args = parser.parse_args()
+        USBDevicesChain.set_verbose(self.args.verbose)
+
+        logger.debug(sys.argv)
+        logger.debug(self.args)
+
+        if not self.args.list and not self.args.filter and not self.args.export and self.args.history is None \
+                and self.args.watch is None and not self.args.inventory:
+            if "win32" == platform:
+                if not self.args.gui:
+                    parser.print_help()
+            else:
+                parser.print_help()
+
+    @staticmethod
+    def set_verbose(verbose):
+        """Set the log level
+        :param verbose: 'debug', 'fatal', 'error', 'warning', 'info', None to keep the default
+        :return: None
+        """
         # enable all info log first if there is -v
-        if self.args.verbose:
-            v = self.args.verbose.lower()
+        if verbose:
+            v = verbose.lower()
             if "debug" == v:
                 logger.setLevel(logging.DEBUG)
             elif "fatal" == v:
@@ -79,55 +145,309 @@ class USBDevicesChain(object):
             elif "info" == v:
                 logger.setLevel(logging.INFO)
 
-        logger.debug(sys.argv)
-        logger.debug(self.args)
+    def ingest_parser(self):
+        parser = argparse.ArgumentParser(prog="pyusb-chain ingest",
+                                         description="Ingest the archived exports (XML reports of UsbTreeView.exe "
+                                                     "and json exports) of the directory into the aggregate store, "
+                                                     "the files ingested before are skipped by the content hash")
+        parser.add_argument("directory", help="the directory of the archived exports")
+        parser.add_argument("-s", "--store", action="store", dest="store", default=self.ARCHIVE_STORE_NAME,
+            help="the aggregate store (sqlite) file, default is {}".format(self.ARCHIVE_STORE_NAME))
+        parser.add_argument("-j", "--jobs", action="store", type=int, dest="jobs",
+            help="the count of the parsing processes, default is the CPU count")
+        return parser
 
-        if not self.args.list and not self.args.filter and not self.args.export:
-            if "win32" == platform:
-                if not self.args.gui:
-                    parser.print_help()
-            else:
-                parser.print_help()
+    def process_ingest(self):
+        """Ingest the archived exports, see ArchiveIngester
+        :return: None
+        """
+        store = ArchiveStore(self.args.store)
+        try:
+            ArchiveIngester(store, jobs=self.args.jobs).ingest(self.args.directory)
+        finally:
+            store.close()
+
+    def exec_parser(self):
+        parser = argparse.ArgumentParser(prog="pyusb-chain exec",
+                                         description="Resolve the port names of the port chains by one scan, "
+                                                     "substitute them into the command ({NAME} in the arguments and "
+                                                     "the NAME environment variables), then run the command instead "
+                                                     "of this process, like: pyusb-chain exec --map BOARD=1-7-5 "
+                                                     "-- flash.sh {BOARD}")
+        parser.add_argument("-m", "--map", action="append", dest="maps", default=[], metavar="NAME=CHAIN",
+            help="the placeholder and the port chain, like BOARD=1-7-5 or AUDIO=1-3-7-4:Speaker")
+        parser.add_argument("-i", "--inventory", action="store", dest="inventory",
+            help="the rig inventory file, the aliases of it are also available as the placeholders")
+        parser.add_argument("-t", "--timeout", action="store", type=float, dest="timeout",
+            help="overall deadline of scanning in seconds")
+        parser.add_argument("command", nargs=argparse.REMAINDER, help="the command to run after --")
+        return parser
+
+    def process_exec(self):
+        """Resolve the port chains and run the command, see exec_parser()
+        :return: None (the process is replaced by the command)
+        """
+        command = self.args.command[1:] if self.args.command[:1] == ["--"] else self.args.command
+        if not command:
+            logger.error("No command to run, like: pyusb-chain exec --map BOARD=1-7-5 -- flash.sh {BOARD}")
+            sys.exit(2)
+        maps = {}
+        for item in self.args.maps:
+            name, _, chain = item.partition("=")
+            if not name or not chain:
+                logger.error("Invalid map '{}', it should be NAME=CHAIN".format(item))
+                sys.exit(2)
+            maps[name] = chain
+
+        tool = UsbTreeViewTool()
+        tool.quiet = True
+        under = None
+        if self.args.inventory:
+            tool.load_inventory(self.args.inventory)
+        elif maps:
+            # the aliases may be found by the SN anywhere, so only the chains narrow the scan to their subtree
+            under = ScanScope.common_chain(maps.values())
+        tool.scan(timeout=self.args.timeout, under=under)
+        ports = USBDevicesChain.resolve_ports(tool, maps, command)
+        if ports is None:
+            sys.exit(2)
+
+        command = [USBDevicesChain.substitute(arg, ports) for arg in command]
+        env = dict(os.environ)
+        env.update(ports)
+        logger.debug("exec: {}".format(command))
+        if "win32" == platform:
+            # exec of Windows doesn't replace the process, the parent returns before the command is finished
+            sys.exit(subprocess.call(command, env=env))
+        os.execvpe(command[0], command, env)
+
+    @staticmethod
+    def resolve_ports(tool, maps, command=()):
+        """Resolve the port names of the placeholders in the scanned devices
+        :param tool: the scanned UsbTreeViewTool
+        :param maps: the dict of placeholder -> port chain
+        :param command: the command arguments, the placeholders of the aliases of the loaded inventory are resolved
+        :return: the dict of placeholder -> port name, None if any of them isn't found
+        """
+        ports = {}
+        missing = []
+        for name, chain in maps.items():
+            ports[name] = tool.get_port_from_chain(chain)
+        if tool.inventory is not None:
+            for arg in command:
+                for name in USBDevicesChain.PLACEHOLDER.findall(arg):
+                    if name not in ports and name in tool.inventory:
+                        ports[name] = tool.resolve_alias(name)
+        for name, port in sorted(ports.items()):
+            if not port:
+                missing.append(name)
+        if missing:
+            logger.error("Cannot resolve the port of: {}".format(", ".join(missing)))
+            return None
+        return ports
+
+    @staticmethod
+    def substitute(text, ports):
+        """Substitute the placeholders of the resolved ports, the other braces are kept as they are
+        :param text: the argument, like "{BOARD}" or "--port={BOARD}"
+        :param ports: the dict of placeholder -> port name
+        :return: the substituted text
+        """
+        return USBDevicesChain.PLACEHOLDER.sub(lambda m: ports.get(m.group(1), m.group(0)), text)
+
+    def probe_parser(self):
+        parser = argparse.ArgumentParser(prog="pyusb-chain probe",
+                                         description="Scan and check all serial ports are usable, they're opened, "
+                                                     "configured and optionally loopback tested concurrently, "
+                                                     "exit with 1 if any port fails")
+        parser.add_argument("-t", "--timeout", action="store", type=float, dest="timeout", default=2.0,
+            help="the timeout in seconds of each port, default is 2")
+        parser.add_argument("-j", "--jobs", action="store", type=int, dest="jobs", default=16,
+            help="the max count of the ports probed at the same time, default is 16")
+        parser.add_argument("-b", "--baudrate", action="store", type=int, dest="baudrate", default=115200,
+            help="the baudrate to configure, default is 115200")
+        parser.add_argument("-l", "--loopback", action="store_true", default=False, dest="loopback",
+            help="write and read back the payload, for the ports with the TX and RX wired")
+        parser.add_argument("-f", "--filter", action="store", dest="filter",
+            help="only probe the ports of the devices matched by the key words")
+        return parser
+
+    def process_probe(self):
+        """Probe the serial ports, see UsbTreeViewTool.probe()
+        :return: None
+        """
+        tool = UsbTreeViewTool()
+        tool.scan()
+        start = time.time()
+        results = tool.probe(timeout=self.args.timeout, workers=self.args.jobs, loopback=self.args.loopback,
+                             filters=self.args.filter, baudrate=self.args.baudrate)
+        print("\r\n")
+        USBDevicesChain.print_probe(results)
+        print("\nProbed {} ports in {:.1f}s".format(len(results), time.time() - start))
+        if not all(result.ok for result in results):
+            sys.exit(1)
 
     def process(self):
         """Process the action, start gui or list or export the json with filter options
         :return: None
         """
+        if self.command:
+            getattr(self, "process_{}".format(self.command))()
+            return
+
         tool = UsbTreeViewTool()
         if hasattr(self.args, "gui") and self.args.gui:
             tool.start_gui()
-        elif self.args.list or self.args.filter or self.args.export:
-            tool.scan()
+        elif self.args.watch is not None:
+            tool.quiet = True
+            view = LiveView(tool, USBDevicesChain.get_headers(self.args.allinfo), allInfo=self.args.allinfo,
+                            filters=self.args.filter, timeout=self.args.timeout, under=self.args.under,
+                            vids=self.args.vids, pids=self.args.pids)
+            try:
+                view.run(interval=self.args.watch)
+            except KeyboardInterrupt:
+                pass
+            return
+        elif self.args.list or self.args.filter or self.args.export or self.args.history is not None \
+                or self.args.inventory:
+            if self.args.history is not None:
+                tool.journal.load(self.args.journal or USBDevicesChain.get_journal_file())
+            result = tool.scan(timeout=self.args.timeout, under=self.args.under,
+                               vids=self.args.vids, pids=self.args.pids)
+            if not result.complete:
+                print("Scan timed out, partial result without: {}".format(", ".join(result.timedOut)))
 
         if self.args.list or self.args.filter:
             devices = tool.filter(self.args.filter)
-            data = []
-            headers = ["Port Chain Key", "Port Name", "Device Name"]
-            if self.args.allinfo:
-                headers.append("SN")
-                headers.append("Driver Key")
-            for device in devices:
-                data = data + device.export_data(self.args.allinfo, jsonFormat=False)
             print("\r\n")
-            print(tabulate(data, headers=headers))
+            USBDevicesChain.print_table(devices, self.args.allinfo)
 
         if self.args.export:
             devices = tool.filter(self.args.filter)
-            USBDevicesChain.export_json(devices)
+            USBDevicesChain.export_json(devices, text=tool.to_json(self.args.filter))
+
+        if self.args.history is not None:
+            journalFile = self.args.journal or USBDevicesChain.get_journal_file()
+            try:
+                if os.path.dirname(journalFile):
+                    os.makedirs(os.path.dirname(journalFile), exist_ok=True)
+                tool.journal.save(journalFile)
+            except (IOError, OSError):
+                logger.exception("Fail to save the journal '{}'".format(journalFile))
+            since = time.time() - self.args.since * 60 if self.args.since else None
+            print("\r\n")
+            USBDevicesChain.print_history(tool.journal, chain=self.args.history or None, since=since)
+
+        if self.args.inventory:
+            tool.load_inventory(self.args.inventory)
+            results = tool.validate_inventory()
+            print("\r\n")
+            USBDevicesChain.print_inventory(results)
+            if not all(result.ok for result in results):
+                sys.exit(1)
+
+    @staticmethod
+    def get_headers(allInfo=False):
+        """The column headers of the devices table
+        :param allInfo: add SN and Driver Key columns
+        :return: the headers list
+        """
+        headers = ["Port Chain Key", "Port Name", "Device Name"]
+        if allInfo:
+            headers.append("SN")
+            headers.append("Driver Key")
+        return headers
+
+    @staticmethod
+    def print_table(usbDevices, allInfo=False, stream=None):
+        """Print the table of usb devices information
+        :param usbDevices: the listed usb devices
+        :param allInfo: add SN and Driver Key columns
+        :param stream: the output stream, default is sys.stdout
+        :return: None
+        """
+        headers = USBDevicesChain.get_headers(allInfo)
+
+        def rows():
+            for device in usbDevices:
+                for row in device.rows(allInfo):
+                    yield row
+
+        TableRenderer(headers, stream=stream).render(rows())
+
+    @staticmethod
+    def get_journal_file():
+        """Get the default journal file of the current user, in %LOCALAPPDATA% of Windows, or $XDG_CACHE_HOME
+        (~/.cache) of the others, instead of the shared temp directory
+        :return: the file path
+        """
+        if "win32" == platform:
+            stateDir = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+        else:
+            stateDir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(stateDir, "pyusb_chain", USBDevicesChain.JOURNAL_NAME)
+
+    @staticmethod
+    def print_history(journal, chain=None, since=None, stream=None):
+        """Print the table of attach/detach events and the counters of each port chain
+        :param journal: the HotplugJournal
+        :param chain: only the events of the port chain
+        :param since: only the events at or after the time
+        :param stream: the output stream, default is sys.stdout
+        :return: None
+        """
+        events = journal.history(chain=chain, since=since)
+        rows = ([time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e.timestamp)),
+                 journal.KIND_NAMES[e.kind], e.chain, e.sn] for e in events)
+        TableRenderer(["Time", "Event", "Port Chain", "SN"], stream=stream).render(rows)
+
+        counters = {}
+        for e in events:
+            counters.setdefault(e.chain, [0, 0])[e.kind - 1] += 1
+        print("", file=stream or sys.stdout)
+        rows = ([key, attach, detach] for key, (attach, detach) in sorted(counters.items()))
+        TableRenderer(["Port Chain", "Attached", "Detached"], stream=stream).render(rows)
 
     @staticmethod
-    def export_json(usbDevices):
+    def print_inventory(results, stream=None):
+        """Print the rig health table of the inventory validation
+        :param results: the InventoryResult list, see UsbTreeViewTool.validate_inventory()
+        :param stream: the output stream, default is sys.stdout
+        :return: None
+        """
+        rows = ([r.entry.alias, r.entry.chain or "", r.status, r.port or "", "; ".join(r.problems)] for r in results)
+        TableRenderer(["Alias", "Port Chain", "Status", "Port Name", "Problems"], stream=stream).render(rows)
+        failed = sum(1 for r in results if not r.ok)
+        print("\n{} of {} devices are ok".format(len(results) - failed, len(results)), file=stream or sys.stdout)
+
+    @staticmethod
+    def print_probe(results, stream=None):
+        """Print the table of the probed ports
+        :param results: the ProbeResult list, see UsbTreeViewTool.probe()
+        :param stream: the output stream, default is sys.stdout
+        :return: None
+        """
+        rows = ([r.chain, r.port, r.status, "{:.1f}".format(r.latency * 1000) if r.latency is not None else "",
+                 r.error or ""] for r in results)
+        TableRenderer(["Port Chain Key", "Port Name", "Status", "Open (ms)", "Error"], stream=stream).render(rows)
+
+    @staticmethod
+    def export_json(usbDevices, text=None):
         """Export json format file for information of usb devices
         :param usbDevices: the exported usb devices
+        :param text: the serialised json of the devices, like the cached one by UsbTreeViewTool.to_json()
         :return: None (a json file will be saved in user command line path)
         """
         data = {}
         try:
-            for device in usbDevices:
-                data.update(device.export_data(jsonFormat=True))
+            if text is None:
+                for device in usbDevices:
+                    data.update(device.json_data())
             with io.open(USBDevicesChain.EXPORT_JSON_NAME, 'w', encoding='utf-8') as fobj:
                 if sys.version_info[0] <= 2:
-                    fobj.write(unicode(json.dumps(data, ensure_ascii=False, indent=4)))
+                    fobj.write(unicode(text or json.dumps(data, ensure_ascii=False, indent=4)))
+                elif text is not None:
+                    fobj.write(text)
                 else:
                     json.dump(data, fobj, indent=4)
             print("\nPlease get '{}' for dumped information!\n".format(USBDevicesChain.EXPORT_JSON_NAME))
@@ -0,0 +1,404 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import queue
+import logging
+import threading
+import subprocess
+from pyusb_chain.devices.comport_device import COMPortDevice
+from pyusb_chain.devices.audio_comport_device import AudioCOMPortDevice
+from pyusb_chain.fingerprint import xml_fingerprint, HashingReader
+from pyusb_chain.scan_result import ScanResult
+
+logger = logging.getLogger("pyusb_path")
+
+
+def merge_audio_card(comPortDevice, card):
+    """Merge the audio card and the VCOM of the same USB device to one AudioCOMPortDevice
+    :param comPortDevice: the COMPortDevice of the same port chain as the card
+    :param card: the AudioCardInfo of LinuxAudioScanner
+    :return: the parsed AudioCOMPortDevice
+    """
+    card.device = ",".join(comPortDevice.comPorts or [])
+    usbDevice = AudioCOMPortDevice(card.description, card)
+    usbDevice.parse()
+    usbDevice.descriptors = comPortDevice.descriptors
+    return usbDevice
+
+
+class ScannerBackend(object):
+    """The interface of the scanner backends run by CompositeScanner, like the XML report of UsbTreeView.exe,
+    the USB serial ports or the audio cards. Register the custom backend by UsbTreeViewTool.register_backend().
+    The backends are run concurrently, the scan of each one should stop at its deadline.
+    """
+    #: the name of the backend, the key of UsbTreeViewTool.backendBudgets and the name in ScanResult.timedOut
+    name = None
+    #: the devices of the backend are covered by the topology fingerprint (of the tool or the one set in the result),
+    #: the scan is skipped if the fingerprint is not changed
+    fingerprinted = False
+
+    def available(self):
+        """Check whether the backend is run in the scan, like the exporter or the scanner is set
+        :return: True if it's available
+        """
+        return True
+
+    def scan(self, deadline, scope, result):
+        """Scan the devices of the backend
+        :param deadline: the Deadline of the time budget of the backend, None for no deadline
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :param result: the ScanResult of the backend to add the parsed devices and the timed out items
+        :return: None
+        """
+        raise NotImplementedError()
+
+    def iter_scan(self, deadline, scope, result, lazy=False):
+        """Scan the devices of the backend lazily, each device is yielded as soon as it's parsed. The default one
+        runs scan() and yields its devices, the built-in backends yield the devices one by one.
+        :param deadline: the Deadline of the time budget of the backend, None for no deadline
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :param result: the ScanResult of the backend to record the timed out items, the fingerprint and cached,
+                       the yielded devices are not added to it
+        :param lazy: the caller may stop at any device, each device should be final when it's yielded
+        :return: the generator of the devices
+        """
+        self.scan(deadline, scope, result)
+        devices, result.devices = result.devices, []
+        for device in devices:
+            yield device
+
+    def merge(self, device, other):
+        """Merge the device of this backend with the device of the same port chain scanned by another backend
+        (registered before this one)
+        :param device: the device of this backend
+        :param other: the device of another backend
+        :return: the merged device to replace the other one, None to keep both
+        """
+        return None
+
+
+class UsbTreeViewBackend(ScannerBackend):
+    """Export the XML report by the exporter of the tool and parse it incrementally, the parsing is skipped if
+    the report is not changed since the last complete scan
+    """
+    fingerprinted = True
+
+    def __init__(self, tool):
+        """
+        :param tool: the UsbTreeViewTool
+        """
+        self.tool = tool
+        self.name = tool.BACKEND_USBTREEVIEW
+
+    def available(self):
+        return self.tool.exporter is not None
+
+    def scan(self, deadline, scope, result):
+        result.devices.extend(self.iter_scan(deadline, scope, result))
+
+    def iter_scan(self, deadline, scope, result, lazy=False):
+        try:
+            with self.tool.exporter.export(timeout=deadline.remaining() if deadline else None) as exportFile:
+                if exportFile:
+                    for device in self._iter_parse(exportFile, deadline, scope, result, lazy):
+                        yield device
+        except subprocess.TimeoutExpired:
+            result.timedOut.append(self.name)
+
+    def _iter_parse(self, exportFile, deadline, scope, result, lazy):
+        last = self.tool._lastFingerprint
+        if self.tool.skipUnchanged and last and last[0] == (scope.key() if scope else None):
+            # hash the report in blocks at first, the unchanged one is not parsed
+            result.fingerprint = xml_fingerprint(exportFile)
+            if last[1] == result.fingerprint:
+                result.cached = True
+                for device in last[2].devices:
+                    yield device
+                return
+            exportFile.seek(0)
+        # the report is hashed while it's parsed, it's never loaded whole
+        reader = HashingReader(exportFile)
+        nodes = self.tool.iter_xml_nodes(reader)
+        for device in self.tool._iter_xml_devices(nodes, deadline, result, scope, deferRanked=lazy):
+            yield device
+        result.fingerprint = reader.hexdigest()
+
+
+class LinuxSerialBackend(ScannerBackend):
+    """List the USB serial ports by the serial scanner of the tool, the ttys are read device by device
+    """
+    fingerprinted = True
+
+    def __init__(self, tool):
+        """
+        :param tool: the UsbTreeViewTool
+        """
+        self.tool = tool
+        self.name = tool.BACKEND_SERIAL
+
+    def available(self):
+        return self.tool.exporter is None and self.tool.serialScanner is not None
+
+    def scan(self, deadline, scope, result):
+        result.devices.extend(self.iter_scan(deadline, scope, result))
+
+    def iter_scan(self, deadline, scope, result, lazy=False):
+        return self.tool._iter_serial(deadline, result, scope, lazy)
+
+
+class LinuxAudioBackend(ScannerBackend):
+    """Discover the USB audio cards by the audio scanner of the tool, the card is merged with the VCOM of the same
+    USB device to one AudioCOMPortDevice
+    """
+    fingerprinted = True
+
+    def __init__(self, tool):
+        """
+        :param tool: the UsbTreeViewTool
+        """
+        self.tool = tool
+        self.name = tool.BACKEND_AUDIO
+
+    def available(self):
+        return self.tool.exporter is None and self.tool.audioScanner is not None
+
+    def scan(self, deadline, scope, result):
+        result.devices.extend(self.iter_scan(deadline, scope, result))
+
+    def iter_scan(self, deadline, scope, result, lazy=False):
+        return self.tool._iter_audio(deadline, result, scope)
+
+    def merge(self, device, other):
+        if isinstance(other, COMPortDevice):
+            return merge_audio_card(other, device.info)
+        return None
+
+
+class BackendStream(object):
+    """Run the backend in a daemon thread and iterate its devices, the iteration stops at the deadline of the backend.
+    The thread of a backend still blocked after its deadline is abandoned, it doesn't block the interpreter exit.
+    The only backend of the scan is run in the thread of the caller, it stops at its deadline by itself.
+    """
+    _END = object()
+
+    def __init__(self, backend, deadline, scope, lazy=False, prefetch=True, threaded=True):
+        """
+        :param backend: the ScannerBackend
+        :param deadline: the Deadline of the time budget of the backend, None for no deadline
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :param lazy: the caller may stop at any device, see ScannerBackend.iter_scan()
+        :param prefetch: scan ahead of the iteration, otherwise each device is scanned once it's asked for
+        :param threaded: run the backend in a daemon thread, otherwise in the thread of the iteration
+        """
+        self.backend = backend
+        self.deadline = deadline
+        #: the ScanResult of the backend, the timed out one is replaced by the result of only its name
+        self.result = ScanResult()
+        self._queue = queue.Queue()
+        self._demand = None if prefetch else threading.Semaphore(0)
+        self._stopped = False
+        self._devices = None
+        if not threaded:
+            self._devices = backend.iter_scan(deadline, scope, self.result, lazy)
+            return
+        thread = threading.Thread(target=self._run, args=(scope, lazy), name="pyusb_chain_{}".format(backend.name))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, scope, lazy):
+        devices = self.backend.iter_scan(self.deadline, scope, self.result, lazy)
+        try:
+            while True:
+                if self._demand is not None:
+                    self._demand.acquire()
+                if self._stopped:
+                    return
+                try:
+                    device = next(devices)
+                except StopIteration:
+                    self._queue.put((self._END, None))
+                    return
+                self._queue.put((device, None))
+        except BaseException as e:
+            self._queue.put((None, e))
+        finally:
+            devices.close()
+
+    def __iter__(self):
+        if self._devices is not None:
+            for device in self._devices:
+                yield device
+            return
+        while not self._stopped:
+            if self._demand is not None:
+                self._demand.release()
+            try:
+                device, error = self._queue.get(timeout=self.deadline.remaining() if self.deadline else None)
+            except queue.Empty:
+                # the devices of the backend after its deadline are dropped
+                self.close()
+                self.result = ScanResult(timedOut=[self.backend.name])
+                return
+            if error is not None:
+                raise error
+            if device is self._END:
+                return
+            yield device
+
+    def close(self):
+        """Stop the backend at the next device
+        :return: None
+        """
+        self._stopped = True
+        if self._devices is not None:
+            self._devices.close()
+        if self._demand is not None:
+            self._demand.release()
+
+
+class CompositeScanner(object):
+    """Run the available backends concurrently in the daemon threads, and merge the devices of them by the port chain,
+    in the order of the registration. The scan takes as long as the slowest backend instead of the sum of them.
+    The devices are merged as a stream, so the caller of iter_scan() gets each one once it's final.
+    """
+    def __init__(self, backends=()):
+        """
+        :param backends: the ScannerBackend list
+        """
+        self.backends = []
+        for backend in backends:
+            self.register(backend)
+
+    def register(self, backend):
+        """Register the backend, the one of the same name is replaced
+        :param backend: the ScannerBackend
+        :return: None
+        """
+        for index, item in enumerate(self.backends):
+            if item.name == backend.name:
+                self.backends[index] = backend
+                return
+        self.backends.append(backend)
+
+    def unregister(self, name):
+        """Remove the backend
+        :param name: the name of the backend
+        :return: the removed ScannerBackend, None if it's not registered
+        """
+        for index, item in enumerate(self.backends):
+            if item.name == name:
+                return self.backends.pop(index)
+        return None
+
+    def get_backends(self):
+        """Get the backends to run in the scan
+        :return: the available ScannerBackend list
+        """
+        return [backend for backend in self.backends if backend.available()]
+
+    def fingerprinted(self):
+        """All available backends are covered by the topology fingerprint
+        :return: True if the unchanged scan could be skipped by the fingerprint
+        """
+        return all(backend.fingerprinted for backend in self.get_backends())
+
+    def scan(self, deadline=None, scope=None, budgets=None):
+        """Run the available backends concurrently, each one is limited by its time budget
+        :param deadline: the overall Deadline, None for no deadline
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :param budgets: the time budget in seconds of each backend by the name, like {"usbtreeview": 10}
+        :return: the merged ScanResult, it's cached if all backends are unchanged since the last scan
+        """
+        result = ScanResult()
+        result.devices = list(self.iter_scan(deadline, scope, budgets, result))
+        return result
+
+    def iter_scan(self, deadline=None, scope=None, budgets=None, result=None, lazy=False):
+        """Run the available backends and get the merged devices as a stream, see scan()
+        :param deadline: the overall Deadline, None for no deadline
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :param budgets: the time budget in seconds of each backend by the name, like {"usbtreeview": 10}
+        :param result: the ScanResult to record the timed out items, the fingerprint and cached once all devices are
+                       iterated, the devices are not added to it
+        :param lazy: the caller may stop at any device, then the backends don't scan ahead of it, except the ones
+                     merging their devices into the others (they are iterated at first)
+        :return: the generator of the merged devices
+        """
+        backends = self.get_backends()
+        budgets = budgets or {}
+        streams = []
+        try:
+            for backend in backends:
+                budget = deadline.budget(budgets.get(backend.name)) if deadline else None
+                prefetch = not lazy or self.merges(backend)
+                streams.append(BackendStream(backend, budget, scope, lazy=lazy, prefetch=prefetch,
+                                             threaded=len(backends) > 1))
+            for device in self._merge(backends, streams):
+                yield device
+        finally:
+            for stream in streams:
+                stream.close()
+        if result is None:
+            return
+        for stream in streams:
+            result.timedOut.extend(stream.result.timedOut)
+        fingerprints = [stream.result.fingerprint for stream in streams]
+        if fingerprints and all(fingerprints):
+            result.fingerprint = "+".join(fingerprints)
+        result.cached = bool(streams) and all(stream.result.cached for stream in streams)
+
+    @staticmethod
+    def merges(backend):
+        """Check whether the backend merges its devices into the devices of the others, see ScannerBackend.merge()
+        :param backend: the ScannerBackend
+        :return: True if it overrides merge()
+        """
+        return type(backend).merge is not ScannerBackend.merge
+
+    def _merge(self, backends, streams):
+        # the devices of the merging backends are collected at first, each one is merged into the first device of
+        # the same port chain scanned by a backend registered before it, like the audio card into the VCOM
+        collected = {}
+        chainDevices = {}
+        for index, backend in enumerate(backends):
+            if index and self.merges(backend):
+                collected[index] = list(streams[index])
+                for device in collected[index]:
+                    if device.portChain:
+                        chainDevices.setdefault(device.portChain, {}).setdefault(index, device)
+        seen = set()
+        mergedIds = set()
+        for index, stream in enumerate(streams):
+            for device in collected.get(index, stream):
+                if id(device) in mergedIds:
+                    continue
+                chain = device.portChain
+                if chain and chain not in seen:
+                    seen.add(chain)
+                    for other, otherDevice in sorted(chainDevices.get(chain, {}).items()):
+                        if other <= index:
+                            continue
+                        mergedDevice = backends[other].merge(otherDevice, device)
+                        if mergedDevice is not None:
+                            mergedIds.add(id(otherDevice))
+                            device = mergedDevice
+                yield device
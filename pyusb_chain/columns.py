@@ -0,0 +1,290 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import time
+from array import array
+from pyusb_chain.utility import is_tree_view_info
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#: the NumPy backed query layer is available
+HAS_NUMPY = numpy is not None
+
+#: bus number and up to 7 tiers of hubs/ports
+MAX_CHAIN_DEPTH = 8
+
+VID_PID_REG = re.compile(r"VID_([0-9A-Fa-f]{4})&PID_([0-9A-Fa-f]{4})")
+
+
+class StringColumn(object):
+    """Dictionary encoded string column, the unique values with the integer codes of each row
+    """
+    def __init__(self):
+        self.values = []
+        self.codes = array("i")
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = len(self.values)
+            self._index[value] = code
+            self.values.append(value)
+        self.codes.append(code)
+
+    def code_of(self, value):
+        """Get the code of the value
+        :return: the code, -1 if the value is not in the column
+        """
+        return self._index.get(value, -1)
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class DeviceColumns(object):
+    """Columnar table of scanned USB devices, one row per device per scan, to analyse many archived scans:
+    which chains flap, which SNs moved, device counts per hub over time, .etc.
+    The string columns are dictionary encoded, the others are integer/float arrays. The filters and group-bys
+    run as NumPy vectorised masks if NumPy is installed, otherwise by the pure Python implementation.
+
+        columns = DeviceColumns()
+        columns.append(tool.snapshot, host="rig-1")
+        mask = columns.filter(under="1-7", vid=0x10C4)
+        counts = columns.group_count(("host", "chain"), mask)
+    """
+    STRING_COLUMNS = ("host", "chain", "sn", "deviceName", "deviceType")
+    INTEGER_COLUMNS = ("depth", "vid", "pid", "driverKey")
+
+    def __init__(self, useNumpy=None):
+        """
+        :param useNumpy: use the NumPy query layer, None to use it if it's installed
+        """
+        self.useNumpy = HAS_NUMPY if useNumpy is None else (useNumpy and HAS_NUMPY)
+        self.strings = dict((name, StringColumn()) for name in self.STRING_COLUMNS)
+        self.integers = dict((name, array("i")) for name in self.INTEGER_COLUMNS)
+        #: the chain segments, segments[0] is the bus number, -1 if the chain is shorter
+        self.segments = [array("i") for _ in range(MAX_CHAIN_DEPTH)]
+        self.scanTime = array("d")
+        self._numpyCache = {}
+
+    def __len__(self):
+        return len(self.scanTime)
+
+    def append(self, snapshot, host=None, scanTime=None):
+        """Append the devices of one scan
+        :param snapshot: the UsbSnapshot, or the devices list
+        :param host: the host name of the scan
+        :param scanTime: the time of the scan, default is the timestamp of the snapshot
+        :return: None
+        """
+        devices = getattr(snapshot, "devices", snapshot)
+        if scanTime is None:
+            scanTime = getattr(snapshot, "timestamp", None) or time.time()
+        for device in devices:
+            self.append_device(device, host, scanTime)
+
+    def append_device(self, device, host, scanTime):
+        """Append one device row
+        :param device: the USBDevice
+        :param host: the host name of the scan
+        :param scanTime: the time of the scan
+        :return: None
+        """
+        self._numpyCache.clear()
+        chain = device.portChain or ""
+        segments = [int(s) if s.isdigit() else -1 for s in chain.split("-")] if chain else []
+        vid, pid = get_device_ids(device)
+
+        strings = self.strings
+        strings["host"].append(host or "")
+        strings["chain"].append(chain)
+        strings["sn"].append(device.sn or "")
+        strings["deviceName"].append(device.deviceName or "")
+        strings["deviceType"].append(type(device).__name__)
+        integers = self.integers
+        integers["depth"].append(len(segments))
+        integers["vid"].append(vid)
+        integers["pid"].append(pid)
+        integers["driverKey"].append(device.driverKey or 0)
+        for index in range(MAX_CHAIN_DEPTH):
+            self.segments[index].append(segments[index] if index < len(segments) else -1)
+        self.scanTime.append(scanTime)
+
+    def column(self, name):
+        """Get the raw column data
+        :param name: the column name, like "chain", "vid", "scanTime", or "segment0" ~ "segment7"
+        :return: the codes of string column or the values, NumPy array if the NumPy layer is used, otherwise array
+        """
+        if name in self.strings:
+            data = self.strings[name].codes
+        elif name in self.integers:
+            data = self.integers[name]
+        elif name == "scanTime":
+            data = self.scanTime
+        elif name.startswith("segment"):
+            data = self.segments[int(name[len("segment"):])]
+        else:
+            raise KeyError(name)
+        if not self.useNumpy:
+            return data
+        # copy once, a view would block appending to the array
+        cached = self._numpyCache.get(name)
+        if cached is None:
+            cached = numpy.array(data)
+            self._numpyCache[name] = cached
+        return cached
+
+    def decode(self, name, value):
+        """Decode the value of the column, the code of string column to the string
+        """
+        if name in self.strings:
+            return self.strings[name].values[value]
+        return value
+
+    def filter(self, chain=None, under=None, vid=None, pid=None, sn=None, host=None, deviceType=None,
+               since=None, until=None):
+        """Get the mask of rows matched all conditions
+        :param chain: the exact port chain, like "1-7-5"
+        :param under: the subtree of the port chain (the chain itself included), like "1-7", no row is under the chain
+                      deeper than MAX_CHAIN_DEPTH
+        :param vid: the vendor ID integer
+        :param pid: the product ID integer
+        :param sn: the SN
+        :param host: the host name
+        :param deviceType: the device class name, like "COMPortDevice"
+        :param since: the scans at or after the time
+        :param until: the scans before the time
+        :return: the mask, NumPy bool array, or list of bool (pure Python)
+        """
+        conditions = []
+        for name, value in (("chain", chain), ("sn", sn), ("host", host), ("deviceType", deviceType)):
+            if value is not None:
+                conditions.append((name, "==", self.strings[name].code_of(value)))
+        for name, value in (("vid", vid), ("pid", pid)):
+            if value is not None:
+                conditions.append((name, "==", value))
+        if under:
+            segments = [int(s) for s in under.replace(".", "-").split("-")]
+            if len(segments) > MAX_CHAIN_DEPTH:
+                return numpy.zeros(len(self), dtype=bool) if self.useNumpy else [False] * len(self)
+            conditions.append(("depth", ">=", len(segments)))
+            for index, segment in enumerate(segments):
+                conditions.append(("segment{}".format(index), "==", segment))
+        if since is not None:
+            conditions.append(("scanTime", ">=", since))
+        if until is not None:
+            conditions.append(("scanTime", "<", until))
+
+        if self.useNumpy:
+            mask = numpy.ones(len(self), dtype=bool)
+            for name, op, value in conditions:
+                data = self.column(name)
+                mask &= (data == value) if "==" == op else (data >= value) if ">=" == op else (data < value)
+            return mask
+
+        mask = [True] * len(self)
+        for name, op, value in conditions:
+            data = self.column(name)
+            if "==" == op:
+                mask = [m and d == value for m, d in zip(mask, data)]
+            elif ">=" == op:
+                mask = [m and d >= value for m, d in zip(mask, data)]
+            else:
+                mask = [m and d < value for m, d in zip(mask, data)]
+        return mask
+
+    def count(self, mask=None):
+        """Count the rows of the mask
+        """
+        if mask is None:
+            return len(self)
+        return int(mask.sum()) if self.useNumpy else sum(1 for m in mask if m)
+
+    def group_count(self, by, mask=None):
+        """Count the rows by the values of the columns
+        :param by: the column name, or tuple of names, like ("host", "chain")
+        :param mask: the mask of rows, None for all rows
+        :return: dict of value (tuple of values for multi-columns) -> count
+        """
+        names = (by,) if isinstance(by, str) else tuple(by)
+        if self.useNumpy:
+            columns = [self.column(name) for name in names]
+            if mask is not None:
+                columns = [data[mask] for data in columns]
+            if not len(columns[0]):
+                return {}
+            # each column is factorized on its own, so the integer codes never mix with the float scan times
+            uniques = []
+            inverses = []
+            for data in columns:
+                values, inverse = numpy.unique(data, return_inverse=True)
+                uniques.append(values)
+                inverses.append(inverse.reshape(-1))
+            uniqueKeys, counts = numpy.unique(numpy.stack(inverses, axis=1), axis=0, return_counts=True)
+            rows = ((tuple(values[index].item() for values, index in zip(uniques, key)), int(count))
+                    for key, count in zip(uniqueKeys, counts))
+        else:
+            counts = {}
+            columns = [self.column(name) for name in names]
+            for index, key in enumerate(zip(*columns)):
+                if mask is None or mask[index]:
+                    counts[key] = counts.get(key, 0) + 1
+            rows = counts.items()
+
+        result = {}
+        for key, count in rows:
+            decoded = tuple(self.decode(name, value) for name, value in zip(names, key))
+            result[decoded if len(names) > 1 else decoded[0]] = count
+        return result
+
+    def distinct_count(self, by, of, mask=None):
+        """Count the distinct values of a column by the values of another, like the chains of each SN
+        (an SN which moved has more than 1 chain), or the devices of each chain
+        :param by: the column name to group by, like "sn"
+        :param of: the column name to count the distinct values, like "chain"
+        :param mask: the mask of rows, None for all rows
+        :return: dict of value -> distinct count
+        """
+        pairs = self.group_count((by, of), mask)
+        result = {}
+        for key in pairs:
+            result[key[0]] = result.get(key[0], 0) + 1
+        return result
+
+
+def get_device_ids(device):
+    """Get the VID and PID integers of the device
+    :param device: the USBDevice
+    :return: (vid, pid), -1 if it's unknown
+    """
+    if not is_tree_view_info(device.info):
+        vid = getattr(device.info, "vid", None)
+        pid = getattr(device.info, "pid", None)
+        return (vid if vid is not None else -1), (pid if pid is not None else -1)
+    matched = VID_PID_REG.search(device.deviceID or "")
+    if matched:
+        return int(matched.group(1), 16), int(matched.group(2), 16)
+    return -1, -1
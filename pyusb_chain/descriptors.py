@@ -0,0 +1,264 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import struct
+import logging
+import threading
+
+logger = logging.getLogger("pyusb_path")
+
+DESCRIPTOR_DEVICE = 1
+DESCRIPTOR_CONFIGURATION = 2
+DESCRIPTOR_INTERFACE = 4
+DESCRIPTOR_ENDPOINT = 5
+
+#: the interface classes, like the CDC of the USB serial and the audio class of the USB audio cards
+CLASS_AUDIO = 0x01
+CLASS_CDC = 0x02
+CLASS_HID = 0x03
+CLASS_MASS_STORAGE = 0x08
+CLASS_CDC_DATA = 0x0A
+CLASS_VENDOR = 0xFF
+
+_DEVICE = struct.Struct("<BBHBBBBHHHBBBB")
+_CONFIGURATION = struct.Struct("<BBHBBBBB")
+_INTERFACE = struct.Struct("<BBBBBBBBB")
+_ENDPOINT = struct.Struct("<BBBBHB")
+
+
+def format_bcd(value):
+    """Format the BCD version, like 0x0210 -> "2.10"
+    :param value: the BCD integer
+    :return: the version text
+    """
+    return "{:x}.{:02x}".format(value >> 8, value & 0xFF)
+
+
+def get_sysfs_name(chain):
+    """Get the sysfs name of the USB device by the port chain, like "1-7-5" -> "1-7.5"
+    :param chain: the port chain, like "1-7-5" or "1-7-5:Speaker"
+    :return: the sysfs name
+    """
+    bus, _, ports = chain.split(":")[0].partition("-")
+    return "{}-{}".format(bus, ports.replace("-", ".")) if ports else bus
+
+
+class EndpointDescriptor(object):
+    """The endpoint descriptor
+    """
+    __slots__ = ("address", "attributes", "maxPacketSize", "interval")
+
+    def __init__(self, address, attributes, maxPacketSize, interval):
+        #: the bEndpointAddress, the bit 7 is the direction (IN)
+        self.address = address
+        #: the bmAttributes, the bit 0..1 is the transfer type
+        self.attributes = attributes
+        self.maxPacketSize = maxPacketSize
+        self.interval = interval
+
+    @property
+    def isIn(self):
+        return bool(self.address & 0x80)
+
+    def __repr__(self):
+        return "EndpointDescriptor(0x{:02x})".format(self.address)
+
+
+class InterfaceDescriptor(object):
+    """The interface descriptor with the endpoint descriptors of it
+    """
+    __slots__ = ("number", "alternate", "interfaceClass", "subClass", "protocol", "endpoints")
+
+    def __init__(self, number, alternate, interfaceClass, subClass, protocol):
+        #: the bInterfaceNumber
+        self.number = number
+        #: the bAlternateSetting
+        self.alternate = alternate
+        #: the bInterfaceClass, like CLASS_CDC
+        self.interfaceClass = interfaceClass
+        self.subClass = subClass
+        self.protocol = protocol
+        #: the EndpointDescriptor list
+        self.endpoints = []
+
+    def __repr__(self):
+        return "InterfaceDescriptor({}, class=0x{:02x}, endpoints={})".format(self.number, self.interfaceClass,
+                                                                              len(self.endpoints))
+
+
+class ConfigurationDescriptor(object):
+    """The configuration descriptor with the interface descriptors of it
+    """
+    __slots__ = ("value", "attributes", "maxPower", "interfaces")
+
+    def __init__(self, value, attributes, maxPower):
+        #: the bConfigurationValue
+        self.value = value
+        self.attributes = attributes
+        #: the max power in mA (bMaxPower is in 2mA units)
+        self.maxPower = maxPower * 2
+        #: the InterfaceDescriptor list, including the alternate settings
+        self.interfaces = []
+
+
+class UsbDescriptors(object):
+    """The parsed descriptors of one USB device: the device descriptor and the configurations
+    """
+    __slots__ = ("bcdUSB", "deviceClass", "subClass", "protocol", "maxPacketSize0", "vid", "pid", "bcdDevice",
+                 "configurations")
+
+    def __init__(self, bcdUSB, deviceClass, subClass, protocol, maxPacketSize0, vid, pid, bcdDevice):
+        #: the USB version, like "2.00"
+        self.bcdUSB = format_bcd(bcdUSB)
+        self.deviceClass = deviceClass
+        self.subClass = subClass
+        self.protocol = protocol
+        self.maxPacketSize0 = maxPacketSize0
+        self.vid = vid
+        self.pid = pid
+        #: the device release, like "1.00"
+        self.bcdDevice = format_bcd(bcdDevice)
+        #: the ConfigurationDescriptor list
+        self.configurations = []
+
+    @property
+    def interfaces(self):
+        """The interfaces (alternate setting 0) of the first configuration
+        """
+        if not self.configurations:
+            return []
+        return [interface for interface in self.configurations[0].interfaces if not interface.alternate]
+
+    @staticmethod
+    def parse(data):
+        """Parse the raw descriptors, the device descriptor followed by the configuration descriptors, like the sysfs
+        "descriptors" file. The fields are unpacked in place from the buffer without slicing it.
+        :param data: the bytes (or any buffer)
+        :return: the UsbDescriptors, None if the device descriptor is invalid
+        """
+        view = memoryview(data)
+        size = len(view)
+        if size < _DEVICE.size:
+            return None
+        fields = _DEVICE.unpack_from(view, 0)
+        if fields[1] != DESCRIPTOR_DEVICE:
+            return None
+        descriptors = UsbDescriptors(*fields[2:10])
+
+        configuration = None
+        interface = None
+        offset = fields[0]
+        while offset + 2 <= size:
+            length = view[offset]
+            kind = view[offset + 1]
+            if length < 2 or offset + length > size:
+                logger.debug("Truncated descriptor at {}".format(offset))
+                break
+            if DESCRIPTOR_CONFIGURATION == kind and length >= _CONFIGURATION.size:
+                _, _, _, _, value, _, attributes, maxPower = _CONFIGURATION.unpack_from(view, offset)
+                configuration = ConfigurationDescriptor(value, attributes, maxPower)
+                descriptors.configurations.append(configuration)
+                interface = None
+            elif DESCRIPTOR_INTERFACE == kind and length >= _INTERFACE.size and configuration is not None:
+                _, _, number, alternate, _, interfaceClass, subClass, protocol, _ = _INTERFACE.unpack_from(view, offset)
+                interface = InterfaceDescriptor(number, alternate, interfaceClass, subClass, protocol)
+                configuration.interfaces.append(interface)
+            elif DESCRIPTOR_ENDPOINT == kind and length >= _ENDPOINT.size and interface is not None:
+                _, _, address, attributes, maxPacketSize, interval = _ENDPOINT.unpack_from(view, offset)
+                interface.endpoints.append(EndpointDescriptor(address, attributes, maxPacketSize & 0x7FF, interval))
+            offset += length
+        return descriptors
+
+
+class DescriptorReader(object):
+    """Read the descriptors of the USB devices from sysfs (Linux), each "descriptors" file is read once and parsed
+    in place. The results are cached by busnum/devnum, the device re-enumerated gets a new devnum and is read again,
+    the entries of the devices which are not read by the latest full scan are dropped by prune().
+    """
+    def __init__(self, sysfsRoot="/sys"):
+        """
+        :param sysfsRoot: the sysfs root
+        """
+        self.sysfsRoot = sysfsRoot
+        #: (busnum, devnum) -> UsbDescriptors
+        self._cache = {}
+        #: the (busnum, devnum) read since the last prune()
+        self._seen = set()
+        #: the lock of the cache and the seen devices, the scan threads read while a full scan prunes
+        self._lock = threading.Lock()
+
+    def get(self, chain):
+        """Get the descriptors of the USB device
+        :param chain: the port chain, like "1-7-5" or "1-7-5:Speaker"
+        :return: the UsbDescriptors, None if it's not available
+        """
+        path = os.path.join(self.sysfsRoot, "bus", "usb", "devices", get_sysfs_name(chain))
+        try:
+            key = (self._read_number(path, "busnum"), self._read_number(path, "devnum"))
+        except (IOError, OSError, ValueError):
+            return None
+        with self._lock:
+            self._seen.add(key)
+            descriptors = self._cache.get(key)
+        if descriptors is not None:
+            return descriptors
+        try:
+            with open(os.path.join(path, "descriptors"), "rb") as fobj:
+                data = fobj.read()
+        except (IOError, OSError):
+            logger.debug("Fail to read the descriptors of {}".format(chain))
+            return None
+        descriptors = UsbDescriptors.parse(data)
+        if descriptors is not None:
+            with self._lock:
+                self._cache[key] = descriptors
+        return descriptors
+
+    def prune(self):
+        """Drop the cached descriptors of the devices not read since the last call, like the unplugged and the
+        re-enumerated ones. It's called after each full scan, so the cache doesn't grow with the hotplug events.
+        :return: the count of the dropped descriptors
+        """
+        with self._lock:
+            seen, self._seen = self._seen, set()
+            dropped = [key for key in self._cache if key not in seen]
+            for key in dropped:
+                self._cache.pop(key, None)
+        return len(dropped)
+
+    def clear(self):
+        """Drop the cached descriptors
+        :return: None
+        """
+        with self._lock:
+            self._cache.clear()
+            self._seen = set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+    @staticmethod
+    def _read_number(path, attribute):
+        with open(os.path.join(path, attribute), "rb") as fobj:
+            return int(fobj.read().strip())
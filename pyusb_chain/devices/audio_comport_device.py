@@ -46,12 +46,19 @@ class AudioCOMPortDevice(AudioDevice):
             return None
         return self.comPorts[0]  # only support 1 COM port so far
 
+    def is_com_port(self, name):
+        """Check the port name or the chain addition is the COM port, like "COM23" or "/dev/ttyACM0" (Linux)
+        :param name: the port name or the chain addition
+        :return: True if it's the COM port
+        """
+        return name in (self.comPorts or []) or "com" in name.lower()
+
     def get_key(self, port="speaker"):
         """The key of the USB device, it's port chain with ":Speaker" or ":Microphone" or ":COM"
         :param port: port name to identify the Speaker or Microphone
         :return: the key port chain with ":Speaker" or ":Microphone"
         """
-        if "com" in port.lower():
+        if self.is_com_port(port):
             return "{}:{}".format(self.portChain, self.get_com_port())
         return super(AudioCOMPortDevice, self).get_key(port)
 
@@ -60,7 +67,7 @@ class AudioCOMPortDevice(AudioDevice):
         :param chain: the port chain with additional audio type
         :return: the port name
         """
-        if "com" in chain.lower():
+        if self.is_com_port(chain.split(":", 1)[-1]):
             return self.get_com_port()
         return super(AudioCOMPortDevice, self).get_port(chain)
 
@@ -80,7 +87,7 @@ class AudioCOMPortDevice(AudioDevice):
 
     def _get_data(self, allInfo=False, isDict=False, portName=None):
         d = super(AudioCOMPortDevice, self)._get_data(allInfo, isDict, portName)
-        if portName and "com" in portName.lower():
+        if portName and self.is_com_port(portName):
             if isDict:
                 if portName:
                     d["Port Name"] = portName
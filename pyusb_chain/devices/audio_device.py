@@ -22,7 +22,7 @@
 
 import logging
 from pyusb_chain.devices.usb_device import USBDevice
-from pyusb_chain.utility import get_values
+from pyusb_chain.utility import get_child_devices, is_tree_view_info
 logger = logging.getLogger("pyusb_path")
 
 
@@ -37,15 +37,20 @@ class AudioDevice(USBDevice):
         :return: None
         """
         super(AudioDevice, self).parse()
+        if not is_tree_view_info(self.info):
+            # the ALSA card information (Linux) has the names of playback and capture
+            self.audioPlaybackName = self.info.playbackName
+            self.audioRecordName = self.info.recordName
+            return
+
         # parse audio playback
         # search Child Device ... with Class : AudioEndpoint
         # then parser the Audio Port name from Child Device, note that '(Audio Endpoint)' should be excluded.
-        audioList = get_values(self.info, r"Child Device \d\s*:.*\s*Device ID.*?\s*Class\s*:\s*AudioEndpoint\s*")
-        if audioList:
-            for audioInfo in audioList:
-                audioInfoList = get_values(audioInfo, r"Child Device \d\s*:\s*.*?\r\n\s*Device ID",
-                                                [r"Child Device \d", ":", r"\(Audio Endpoint\)", "Device ID"])
-                self.__parse_audio_port_name(audioInfoList)
+        audioInfoList = []
+        for child in get_child_devices(self.info):
+            if "AudioEndpoint" == child.get("Class"):
+                audioInfoList.append(child["Name"].replace("(Audio Endpoint)", "").strip())
+        self.__parse_audio_port_name(audioInfoList)
 
     def __parse_audio_port_name(self, audioInfoList):
         if not audioInfoList:
@@ -63,7 +68,11 @@ class AudioDevice(USBDevice):
         :param port: port name to identify the Speaker or Microphone
         :return: the key port chain with ":Speaker" or ":Microphone"
         """
-        if "mic" in port.lower():
+        if port == self.audioPlaybackName:
+            return "{}:Speaker".format(self.portChain)
+        elif port == self.audioRecordName:
+            return "{}:Microphone".format(self.portChain)
+        elif "mic" in port.lower():
             return "{}:Microphone".format(self.portChain)
         elif "sp" in port.lower():
             return "{}:Speaker".format(self.portChain)
@@ -21,9 +21,8 @@
 # SOFTWARE.
 
 import logging
-from sys import platform
 from pyusb_chain.devices.usb_device import USBDevice
-from pyusb_chain.utility import get_values
+from pyusb_chain.utility import get_values, is_tree_view_info
 logger = logging.getLogger("pyusb_path")
 
 
@@ -39,24 +38,17 @@ class COMPortDevice(USBDevice):
         """Parse the XML information, to the get key values, for COM port USB device, will add com ports information.
         :return: None
         """
-        if "win32" == platform:
-            super(COMPortDevice, self).parse()
+        super(COMPortDevice, self).parse()
         self.comPorts = self.get_com_port_list(self)
 
     @staticmethod
     def get_com_port_list(device):
-        if "win32" == platform:
+        if is_tree_view_info(device.info):
             # parse COM ports, note that, for MPU boards, there are more than 1 USB COM port for the same USB port chain
             comPortList = get_values(device.info, r"COM-Port\s*:\s*.*?\(", ["COM-Port", ":", r"\("])
             if comPortList:
                 return comPortList
         else:
-            device.deviceName = device.info.description
-            if device.info.location:
-                device.portChain = device.info.location.split(":")[0].replace(".", "-")
-            device.locInfo = device.info.hwid
-            device.deviceID = "USB/VID_{}&PID_{}".format(device.info.vid, device.info.pid)
-            device.sn = device.info.serial_number
             if device.info.device:
                 return device.info.device.split(",")
         return None
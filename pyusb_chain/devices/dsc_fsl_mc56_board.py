@@ -21,9 +21,8 @@
 # SOFTWARE.
 
 import logging
-from sys import platform
 from pyusb_chain.devices.comport_device import COMPortDevice
-from pyusb_chain.utility import get_values
+from pyusb_chain.utility import get_values, is_tree_view_info
 logger = logging.getLogger("pyusb_path")
 
 
@@ -37,7 +36,7 @@ class DSCFSLMC56Board(COMPortDevice):
         self.deviceName = "{}, {}".format("DSC FSL", self.deviceName)
 
         # update driver key from emulation order
-        if "win32" == platform:
+        if is_tree_view_info(self.info):
             # parse COM ports, note that, for MPU boards, there are more than 1 USB COM port for the same USB port chain
             comPortInfoList = get_values(self.info, r"COM-Port\s*:\s*.*?\(.*\)", [r".*\\Device\\USBSER", r"\)"])
             if comPortInfoList:
@@ -21,13 +21,15 @@
 # SOFTWARE.
 
 import logging
-from pyusb_chain.utility import get_values
+from pyusb_chain.utility import get_values, is_tree_view_info
 logger = logging.getLogger("pyusb_path")
 
 
 class USBDevice(object):
     """USBDevice object uses to store the information of USB device
     (device name, port chain, location, device id, SN and driver key)
+    The rendered rows, json data and search text are cached, setting any public attribute (the parsed fields)
+    invalidates them, call invalidate() after changing a field in place, like appending to comPorts.
     """
     def __init__(self, name, info):
         self.name = name
@@ -56,10 +58,57 @@ class USBDevice(object):
         #: (CPLD downloader) which one is the first #0, or secondary #1, .etc.
         self.driverKey = 0
 
+        #: descriptors is the parsed UsbDescriptors (Linux, from sysfs), None if it's not available
+        self.descriptors = None
+
+    def __setattr__(self, key, value):
+        if not key.startswith("_"):
+            self.__dict__["_renderCache"] = None
+        object.__setattr__(self, key, value)
+
+    def invalidate(self):
+        """Drop the cached rows, json data and search text
+        :return: None
+        """
+        self._renderCache = None
+
+    def _get_cached(self, key, render):
+        cache = self.__dict__.get("_renderCache")
+        if cache is None:
+            cache = self._renderCache = {}
+        if key not in cache:
+            cache[key] = render()
+        return cache[key]
+
+    def rows(self, allInfo=False):
+        """The cached table rows, see export_data()
+        :param allInfo: Add all SN and Driver Key info in the rows
+        :return: the tuple of row tuples
+        """
+        return self._get_cached(("rows", allInfo),
+                                lambda: tuple(tuple(row) for row in self.export_data(allInfo, jsonFormat=False)))
+
+    def json_data(self):
+        """The cached json data, see export_data(), it's shared by the callers and should not be changed
+        :return: the dict of port chain key -> information dict
+        """
+        return self._get_cached("json", lambda: self.export_data(jsonFormat=True))
+
+    def search_text(self):
+        """The cached lower case text of all information (port chain, device name, sn, .etc) to filter the device
+        :return: the text
+        """
+        return self._get_cached("search", lambda: "".join("{}".format(item)
+                                                          for item in self.export_data() if item).lower())
+
     def parse(self):
         """Parse the XML information, to the get key values.
         :return: None
         """
+        if not is_tree_view_info(self.info):
+            self.parse_port_info()
+            return
+
         self.portChain = self.name.split(":")[0].replace("[", "").replace("]", "").strip()
         self.deviceName = self.name.replace("[{}] :".format(self.portChain), "").strip()
 
@@ -90,6 +139,31 @@ class USBDevice(object):
             except Exception:
                 logger.exception("Fail to parse to get driver key index: {}".format(driverKey))
 
+    def parse_port_info(self):
+        """Parse the port information object (Linux), like pyserial ListPortInfo, to get the key values.
+        :return: None
+        """
+        self.deviceName = self.info.description
+        if self.info.location:
+            self.portChain = self.info.location.split(":")[0].replace(".", "-")
+        self.locInfo = self.info.hwid
+        self.deviceID = "USB/VID_{}&PID_{}".format(self.info.vid, self.info.pid)
+        self.sn = self.info.serial_number
+
+    @property
+    def interfaces(self):
+        """The interface descriptors (Linux), like the CDC and CDC data interfaces of a USB serial
+        :return: the InterfaceDescriptor list, empty if the descriptors are not available
+        """
+        return self.descriptors.interfaces if self.descriptors else []
+
+    def has_interface(self, interfaceClass):
+        """Check the device has the interface of the class, without any I/O
+        :param interfaceClass: the bInterfaceClass, like 0x02 for CDC
+        :return: True if there is
+        """
+        return any(interface.interfaceClass == interfaceClass for interface in self.interfaces)
+
     def get_key(self, port=None):
         """The key of the USB device, it's port chain by default
         :param port: interface to be used in child classes
@@ -0,0 +1,114 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import shutil
+import logging
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from sys import platform
+
+logger = logging.getLogger("pyusb_path")
+
+
+class UsbTreeViewExporter(object):
+    """Exporter backend to run UsbTreeView.exe (or any command with the same "/X=<file>" option)
+    to get the XML report of all connected USB devices.
+    The command is run without a shell, the report is written into a private temp directory
+    and removed as soon as it has been consumed.
+    """
+    EXPORT_FILE_NAME = "export.xml"
+
+    #: tmpfs location to keep the temp report in memory where it's available (Linux)
+    TMPFS_ROOT = "/dev/shm"
+
+    def __init__(self, command, tempRoot=None):
+        """
+        :param command: the exporter command, the executable path or the argument list,
+                        like ["python", "stub_usbtreeview.py"], the "/X=<file>" is appended when running
+        :param tempRoot: the parent directory of the private temp directory, default is tmpfs or system temp path
+        """
+        if isinstance(command, (list, tuple)):
+            self.command = list(command)
+        else:
+            self.command = [command]
+        self.tempRoot = tempRoot
+
+    def get_temp_root(self):
+        """Get the parent directory for the private temp directory
+        :return: the directory path, None for the default system temp path
+        """
+        if self.tempRoot:
+            return self.tempRoot
+        if "win32" != platform and os.path.isdir(self.TMPFS_ROOT) and os.access(self.TMPFS_ROOT, os.W_OK):
+            return self.TMPFS_ROOT
+        return None
+
+    def run(self, exportFile, timeout=None):
+        """Run the exporter command to export the XML report to the file
+        :param exportFile: the XML file to be exported
+        :param timeout: seconds to wait for the exporter, None to wait until it exits
+        :return: True if the file is exported
+        :raise subprocess.TimeoutExpired: the exporter is killed after the timeout
+        """
+        cmd = self.command + ["/X={}".format(exportFile)]
+        logger.debug(cmd)
+        try:
+            process = subprocess.Popen(cmd)
+        except OSError:
+            logger.exception("Fail to run the exporter: {}".format(cmd))
+            return False
+        try:
+            returnCode = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.error("Exporter is killed after {} seconds: {}".format(timeout, cmd))
+            process.kill()
+            process.wait()
+            raise
+        if not os.path.exists(exportFile):
+            logger.error("Exporter exit with {}, but no file exported: {}".format(returnCode, exportFile))
+            return False
+        return True
+
+    @contextmanager
+    def export(self, timeout=None):
+        """Export the XML report into a private temp directory, and open it for parsing.
+        The temp directory is always removed when leaving the context.
+
+            with exporter.export() as f:
+                tool.parse(f)
+
+        :param timeout: seconds to wait for the exporter, None to wait until it exits
+        :return: the binary file object of the XML report (None if it fails to export)
+        :raise subprocess.TimeoutExpired: the exporter is killed after the timeout
+        """
+        tempDir = tempfile.mkdtemp(prefix="pyusb_chain_", dir=self.get_temp_root())
+        try:
+            exportFile = os.path.join(tempDir, self.EXPORT_FILE_NAME)
+            if not self.run(exportFile, timeout=timeout):
+                yield None
+            else:
+                with open(exportFile, "rb") as f:
+                    yield f
+        finally:
+            shutil.rmtree(tempDir, ignore_errors=True)
@@ -0,0 +1,99 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import hashlib
+
+#: the size of the blocks to hash the file
+BLOCK_SIZE = 1 << 16
+
+
+def sysfs_fingerprint(sysfsRoot="/sys"):
+    """Compute the cheap fingerprint of USB topology (Linux): the hash over /sys/bus/usb/devices entry names
+    with busnum and devnum of each device (changed by each re-enumeration), and the entry names of
+    /sys/class/tty and /sys/class/sound (the ports and cards may be bound later than the USB device).
+    :param sysfsRoot: the sysfs root
+    :return: the hex digest
+    """
+    digest = hashlib.sha1()
+    usbDevices = os.path.join(sysfsRoot, "bus", "usb", "devices")
+    for name in _list(usbDevices):
+        digest.update(name.encode("utf-8"))
+        if ":" in name:
+            continue  # interface, no busnum/devnum
+        for attribute in ("busnum", "devnum"):
+            try:
+                with open(os.path.join(usbDevices, name, attribute), "rb") as f:
+                    digest.update(b"/" + f.read().strip())
+            except (IOError, OSError):
+                pass
+        digest.update(b"\n")
+    for className in ("tty", "sound"):
+        digest.update(className.encode("utf-8") + b":")
+        for name in _list(os.path.join(sysfsRoot, "class", className)):
+            digest.update(name.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def xml_fingerprint(data):
+    """Compute the fingerprint of the XML report exported by UsbTreeView.exe
+    :param data: the raw bytes of the XML report, or the binary file object read in blocks
+    :return: the hex digest
+    """
+    if isinstance(data, bytes):
+        return hashlib.sha1(data).hexdigest()
+    digest = hashlib.sha1()
+    for block in iter(lambda: data.read(BLOCK_SIZE), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class HashingReader(object):
+    """Binary file object wrapper to compute the fingerprint of the XML report while it's read by the parser,
+    the report is hashed in the same pass without being loaded whole
+    """
+    def __init__(self, fobj):
+        """
+        :param fobj: the binary file object
+        """
+        self.fobj = fobj
+        self._digest = hashlib.sha1()
+
+    def read(self, size=-1):
+        data = self.fobj.read(size)
+        self._digest.update(data)
+        return data
+
+    def hexdigest(self):
+        """Get the fingerprint of the whole file, the rest not read by the parser is read and hashed as well
+        :return: the hex digest, the same as xml_fingerprint()
+        """
+        for block in iter(lambda: self.read(BLOCK_SIZE), b""):
+            pass
+        return self._digest.hexdigest()
+
+
+def _list(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
@@ -0,0 +1,253 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import io
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pyusb_chain.usb_tree_view_tool import UsbTreeViewTool
+
+logger = logging.getLogger("pyusb_path")
+
+#: the fields of the json export, see USBDevice.export_data()
+JSON_FIELDS = ("Port Name", "Device Name", "SN", "Location Info", "Device ID", "Driver Key")
+
+
+def read_file(path):
+    """Read the file once, for both the content hash and the parsing
+    :param path: the file path
+    :return: (the hex digest of the content hash, the content)
+    """
+    with open(path, "rb") as fobj:
+        data = fobj.read()
+    return hashlib.sha1(data).hexdigest(), data
+
+
+def parse_archive(path, data=None):
+    """Parse one archived export, the XML report of UsbTreeView.exe is parsed by UsbTreeViewTool.parse(),
+    the json file is the export of "pyusb-chain --export". It runs in the worker process.
+    :param path: the file path
+    :param data: the content of the file, None to read the file
+    :return: (host, scan time, devices, rows), rows is the list of (port chain key, data dict of JSON_FIELDS),
+             None if the file is not an export (like the json file of other tools)
+    """
+    if data is None:
+        with open(path, "rb") as fobj:
+            data = fobj.read()
+    if path.lower().endswith(".json"):
+        exported = json.loads(data.decode("utf-8"))
+        if not isinstance(exported, dict) or not all(isinstance(item, dict) for item in exported.values()):
+            return None
+        rows = sorted(exported.items())
+        # the composite device has one item of each port, "<port chain>:<index>"
+        return None, None, len(set(key.split(":")[0] for key, _ in rows)), rows
+
+    tool = UsbTreeViewTool()
+    tool.parse(io.BytesIO(data))
+    rows = []
+    for device in tool.usbDevices:
+        rows.extend(sorted(device.json_data().items()))
+    host = scanTime = None
+    if tool.root is not None:
+        host = tool.root.get("computername")
+        if tool.root.get("date"):
+            scanTime = "{} {}".format(tool.root.get("date"), tool.root.get("time", "")).strip()
+    return host, scanTime, len(tool.usbDevices), rows
+
+
+def _parse_archive(path, data):
+    # the worker never raises, a broken file is reported and ingested again next time
+    try:
+        return parse_archive(path, data), None
+    except Exception as e:
+        return None, "{}: {}".format(type(e).__name__, e)
+
+
+class ArchiveStore(object):
+    """Aggregate store (sqlite) of the ingested exports, the files are keyed by the content hash
+    """
+    def __init__(self, path):
+        """
+        :param path: the sqlite database file, ":memory:" for the test
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                hash TEXT PRIMARY KEY, path TEXT, host TEXT, scanTime TEXT, devices INTEGER, ingestedAt REAL);
+            CREATE TABLE IF NOT EXISTS devices (
+                hash TEXT, chain TEXT, portName TEXT, deviceName TEXT, sn TEXT, locInfo TEXT, deviceID TEXT,
+                driverKey INTEGER);
+            CREATE INDEX IF NOT EXISTS devicesChain ON devices (chain);
+            CREATE INDEX IF NOT EXISTS devicesSN ON devices (sn);
+        """)
+
+    def has(self, contentHash):
+        """Check the file of the content hash is ingested
+        """
+        cursor = self.connection.execute("SELECT 1 FROM files WHERE hash = ?", (contentHash,))
+        return cursor.fetchone() is not None
+
+    def add(self, contentHash, path, host, scanTime, devices, rows):
+        """Add the devices of one file, committed at once
+        :param contentHash: the content hash of the file
+        :param path: the file path
+        :param host: the host name of the scan
+        :param scanTime: the time of the scan
+        :param devices: the count of the devices
+        :param rows: the list of (port chain key, data dict), see parse_archive()
+        :return: None
+        """
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                    (contentHash, path, host, scanTime, devices, time.time()))
+            self.connection.executemany("INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                        [(contentHash, key) + tuple(data.get(field) for field in JSON_FIELDS)
+                                         for key, data in rows])
+
+    def count(self):
+        """Count the ingested files and devices
+        :return: (files, devices)
+        """
+        files, devices = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(devices), 0) FROM files").fetchone()
+        return files, devices
+
+    def close(self):
+        self.connection.close()
+
+
+class ArchiveIngester(object):
+    """Ingest the archived exports (XML reports of UsbTreeView.exe and the json exports) of a directory into the
+    ArchiveStore. The files are parsed by a process pool and streamed into the store once each is parsed,
+    the files of the same content hash as an ingested one are skipped.
+
+        ingester = ArchiveIngester(ArchiveStore("archive.db"), jobs=8)
+        ingester.ingest("/archive/rigs")
+    """
+    EXTENSIONS = (".xml", ".json")
+    #: the seconds between two progress reports
+    PROGRESS_INTERVAL = 2.0
+
+    def __init__(self, store, jobs=None, stream=None):
+        """
+        :param store: the ArchiveStore
+        :param jobs: the count of the worker processes, default is the CPU count, 1 to parse in this process
+        :param stream: the progress output stream, default is sys.stdout
+        """
+        self.store = store
+        self.jobs = jobs or os.cpu_count() or 1
+        self.stream = stream
+        #: the counters of the last ingest()
+        self.files = 0
+        self.skipped = 0
+        self.failed = 0
+        self.devices = 0
+        self._start = None
+        self._lastReport = None
+
+    def find_files(self, directory):
+        """Find the archived exports in the directory recursively, sorted by the path
+        :param directory: the directory
+        :return: the file paths generator
+        """
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                if name.lower().endswith(self.EXTENSIONS):
+                    yield os.path.join(root, name)
+
+    def ingest(self, directory):
+        """Ingest all archived exports in the directory
+        :param directory: the directory
+        :return: (ingested files, skipped files, failed files, devices)
+        """
+        self.files = self.skipped = self.failed = self.devices = 0
+        self._start = self._lastReport = time.monotonic()
+        if self.jobs <= 1:
+            for path, contentHash, data in self._new_files(directory):
+                self._store(path, contentHash, _parse_archive(path, data))
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                pending = {}
+                for path, contentHash, data in self._new_files(directory):
+                    # bounded in flight, the results are stored while the others are parsed
+                    if len(pending) >= self.jobs * 4:
+                        self._store_done(pending, wait(pending, return_when=FIRST_COMPLETED).done)
+                    # the content is read once and sent to the worker, it's not read again for parsing
+                    pending[executor.submit(_parse_archive, path, data)] = (path, contentHash)
+                while pending:
+                    self._store_done(pending, wait(pending, return_when=FIRST_COMPLETED).done)
+        self.report(final=True)
+        return self.files, self.skipped, self.failed, self.devices
+
+    def _new_files(self, directory):
+        seen = set()
+        for path in self.find_files(directory):
+            try:
+                contentHash, data = read_file(path)
+            except (IOError, OSError):
+                logger.exception("Fail to read {}".format(path))
+                self.failed += 1
+                continue
+            if contentHash in seen or self.store.has(contentHash):
+                self.skipped += 1
+                continue
+            seen.add(contentHash)
+            yield path, contentHash, data
+
+    def _store_done(self, pending, done):
+        for future in done:
+            path, contentHash = pending.pop(future)
+            self._store(path, contentHash, future.result())
+
+    def _store(self, path, contentHash, parsed):
+        result, error = parsed
+        if error:
+            logger.error("Fail to parse {}: {}".format(path, error))
+            self.failed += 1
+        elif result is None:
+            logger.info("Skip {}, it's not an export".format(path))
+            self.skipped += 1
+        else:
+            host, scanTime, devices, rows = result
+            self.store.add(contentHash, path, host, scanTime, devices, rows)
+            self.files += 1
+            self.devices += devices
+        if time.monotonic() - self._lastReport >= self.PROGRESS_INTERVAL:
+            self.report()
+
+    def report(self, final=False):
+        """Report the progress and the throughput
+        :param final: it's the summary of the finished ingest
+        :return: None
+        """
+        self._lastReport = time.monotonic()
+        elapsed = max(self._lastReport - self._start, 1e-6)
+        (self.stream or sys.stdout).write(
+            "{}{} files ingested, {} skipped, {} failed, {} devices in {:.1f}s: {:.1f} files/s, {:.1f} devices/s\n"
+            .format("Done: " if final else "", self.files, self.skipped, self.failed, self.devices, elapsed,
+                    self.files / elapsed, self.devices / elapsed))
@@ -0,0 +1,206 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import io
+import json
+import logging
+from configparser import ConfigParser
+
+logger = logging.getLogger("pyusb_path")
+
+
+class InventoryEntry(object):
+    """One expected device of the rig
+    """
+    def __init__(self, alias, chain=None, sn=None, ports=None, description=None):
+        """
+        :param alias: the alias name, like "console"
+        :param chain: the port chain key, like "1-7-5", "1-3-1:2" or "1-3-7-4:Speaker"
+        :param sn: the SN of the device
+        :param ports: the expected count of ports (table rows) of the device, like 4 for FTDI quad serial
+        :param description: the description
+        """
+        self.alias = alias
+        self.chain = chain
+        self.sn = sn
+        self.ports = int(ports) if ports is not None else None
+        self.description = description
+
+    @property
+    def chainKey(self):
+        """The port chain without ":Speaker", ":0" .etc, the key of the device in the snapshot
+        """
+        return self.chain.split(":")[0] if self.chain else None
+
+
+class InventoryResult(object):
+    """The validation result of one expected device
+    """
+    def __init__(self, entry, status, device=None, port=None, problems=None):
+        #: the InventoryEntry
+        self.entry = entry
+        #: RigInventory.STATUS_OK, STATUS_MISSING, STATUS_MOVED, STATUS_SN_MISMATCH or STATUS_PORT_COUNT
+        self.status = status
+        #: the found USBDevice
+        self.device = device
+        #: the resolved port name
+        self.port = port
+        #: the descriptions of the problems
+        self.problems = problems or []
+
+    @property
+    def ok(self):
+        return RigInventory.STATUS_OK == self.status
+
+
+class RigInventory(object):
+    """The rig inventory of the expected devices, "alias -> chain/SN", compiled into the alias index.
+    It's loaded from the json file:
+
+        {"console": {"chain": "1-7-5", "sn": "0001", "ports": 1}, "debugger": "1-7-6"}
+
+    or the INI file, one section for each alias:
+
+        [console]
+        chain = 1-7-5
+        sn = 0001
+        ports = 1
+    """
+    STATUS_OK = "ok"
+    STATUS_MISSING = "missing"
+    STATUS_MOVED = "moved"
+    STATUS_SN_MISMATCH = "sn mismatch"
+    STATUS_PORT_COUNT = "port count"
+
+    def __init__(self, entries=()):
+        """
+        :param entries: the InventoryEntry list
+        """
+        #: alias -> InventoryEntry
+        self.entries = {}
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry):
+        """Add the expected device
+        :param entry: the InventoryEntry
+        :return: None
+        """
+        if not entry.chain and not entry.sn:
+            raise ValueError("Inventory alias '{}' needs the chain or the SN".format(entry.alias))
+        self.entries[entry.alias] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, alias):
+        return alias in self.entries
+
+    @staticmethod
+    def load(path):
+        """Load the inventory file, json (.json) or INI (others)
+        :param path: the file path
+        :return: the RigInventory
+        """
+        with io.open(path, "r", encoding="utf-8") as fobj:
+            text = fobj.read()
+        if path.lower().endswith(".json"):
+            return RigInventory.from_dict(json.loads(text))
+        parser = ConfigParser()
+        parser.read_string(text)
+        return RigInventory.from_dict(dict((section, dict(parser.items(section))) for section in parser.sections()))
+
+    @staticmethod
+    def from_dict(data):
+        """Create the inventory from the dict of alias -> chain or dict of chain, sn, ports and description
+        :param data: the dict
+        :return: the RigInventory
+        """
+        inventory = RigInventory()
+        for alias, spec in data.items():
+            if isinstance(spec, str):
+                spec = {"chain": spec}
+            inventory.add(InventoryEntry(alias, chain=spec.get("chain"), sn=spec.get("sn"), ports=spec.get("ports"),
+                                         description=spec.get("description")))
+        return inventory
+
+    def validate(self, snapshot):
+        """Validate every expected device against the snapshot of a scan, in one pass of the aliases,
+        each of them is checked by the indexes of the snapshot
+        :param snapshot: the UsbSnapshot
+        :return: the list of InventoryResult, ordered by the alias
+        """
+        return [self.check(self.entries[alias], snapshot) for alias in sorted(self.entries)]
+
+    def check(self, entry, snapshot):
+        """Validate one expected device
+        :param entry: the InventoryEntry
+        :param snapshot: the UsbSnapshot
+        :return: the InventoryResult
+        """
+        atChain = snapshot.chainIndex.get(entry.chainKey) if entry.chain else None
+        bySN = snapshot.snIndex.get(entry.sn) if entry.sn else None
+        problems = []
+        if entry.sn and atChain is not None and atChain.sn != entry.sn:
+            if bySN is not None:
+                problems.append("SN {} is moved from {} to {}".format(entry.sn, entry.chainKey, bySN.portChain))
+                return InventoryResult(entry, self.STATUS_MOVED, bySN, self.get_port(entry, bySN), problems)
+            problems.append("SN at {} is {}, expected {}".format(entry.chainKey, atChain.sn, entry.sn))
+            return InventoryResult(entry, self.STATUS_SN_MISMATCH, atChain, None, problems)
+
+        device = atChain if atChain is not None else bySN
+        if device is None:
+            problems.append("{} is absent".format(entry.chain or "SN {}".format(entry.sn)))
+            return InventoryResult(entry, self.STATUS_MISSING, problems=problems)
+        port = self.get_port(entry, device)
+        if entry.chain and atChain is None:
+            problems.append("SN {} is moved from {} to {}".format(entry.sn, entry.chainKey, device.portChain))
+            return InventoryResult(entry, self.STATUS_MOVED, device, port, problems)
+        if entry.ports is not None and entry.ports != len(device.rows()):
+            problems.append("{} ports, expected {}".format(len(device.rows()), entry.ports))
+            return InventoryResult(entry, self.STATUS_PORT_COUNT, device, port, problems)
+        return InventoryResult(entry, self.STATUS_OK, device, port)
+
+    @staticmethod
+    def get_port(entry, device):
+        """Get the port name of the expected device, by the addition of the chain like ":Speaker" or ":2"
+        :param entry: the InventoryEntry
+        :param device: the found USBDevice
+        :return: the port name
+        """
+        if entry.chain and ":" in entry.chain:
+            return device.get_port("{}:{}".format(device.portChain, entry.chain.split(":", 1)[1]))
+        if len(device.rows()) > 1:
+            # multi-com ports or speaker/microphone, the alias needs the chain addition to pick one
+            return None
+        return device.get_port(device.portChain)
+
+    def compile(self, snapshot):
+        """Compile the alias index of the snapshot, alias -> port name of the found device
+        :param snapshot: the UsbSnapshot
+        :return: the dict of alias -> port name (None if the device is absent or it's not the expected one)
+        """
+        index = {}
+        for alias, entry in self.entries.items():
+            result = self.check(entry, snapshot)
+            index[alias] = result.port if result.status != self.STATUS_SN_MISMATCH else None
+        return index
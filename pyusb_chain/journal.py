@@ -0,0 +1,240 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import io
+import json
+import time
+import tempfile
+import logging
+import threading
+from array import array
+from pyusb_chain.columns import get_device_ids
+
+logger = logging.getLogger("pyusb_path")
+
+
+class HotplugEvent(object):
+    """One attach or detach event of the journal
+    """
+    __slots__ = ("timestamp", "kind", "chain", "sn")
+
+    def __init__(self, timestamp, kind, chain, sn):
+        #: the time of the event, from time.time()
+        self.timestamp = timestamp
+        #: HotplugJournal.ATTACH or HotplugJournal.DETACH
+        self.kind = kind
+        #: the port chain, like "2-1-7-3-2"
+        self.chain = chain
+        #: the SN of the device, "" if there is no SN
+        self.sn = sn
+
+    def __eq__(self, other):
+        return isinstance(other, HotplugEvent) and \
+            (self.timestamp, self.kind, self.chain, self.sn) == (other.timestamp, other.kind, other.chain, other.sn)
+
+    def __repr__(self):
+        return "HotplugEvent({}, {}, {}, {})".format(self.timestamp, HotplugJournal.KIND_NAMES[self.kind],
+                                                    self.chain, self.sn)
+
+
+class HotplugJournal(object):
+    """Fixed size ring buffer of the attach/detach events of the USB devices, the oldest events are overwritten,
+    so the memory doesn't grow over weeks of uptime. It's fed by the rescans (the difference of the devices of two
+    scans), or by record() from a hotplug source.
+
+        tool.scan()
+        ...
+        tool.scan()
+        drops = tool.journal.count("2-1-7-3-2", since=time.time() - 3600)
+        events = tool.journal.history(chain="2-1-7-3-2", since=time.time() - 3600)
+    """
+    ATTACH = 1
+    DETACH = 2
+    KIND_NAMES = {ATTACH: "attach", DETACH: "detach"}
+
+    def __init__(self, capacity=4096):
+        """
+        :param capacity: the max count of the events
+        """
+        self.capacity = capacity
+        #: the columns of the ring buffer, the chains and SNs are only referenced by the slots
+        self.times = array("d", [0.0]) * capacity
+        self.kinds = array("b", [0]) * capacity
+        self.chains = [None] * capacity
+        self.sns = [None] * capacity
+        #: the slot of the next event, and the count of the events in the buffer
+        self.head = 0
+        self.size = 0
+        #: port chain -> [attach count, detach count] of the events in the buffer
+        self.counters = {}
+        #: (port chain, SN) -> (vid, pid) of the devices of the last scan, None before the first scan
+        self._present = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def record(self, kind, chain, sn=None, timestamp=None):
+        """Record one event, the oldest one is overwritten if the buffer is full
+        :param kind: ATTACH or DETACH
+        :param chain: the port chain
+        :param sn: the SN of the device
+        :param timestamp: the time of the event, default is now
+        :return: None
+        """
+        with self._lock:
+            self._record(kind, chain, sn or "", time.time() if timestamp is None else timestamp)
+
+    def _record(self, kind, chain, sn, timestamp):
+        slot = self.head
+        if self.size == self.capacity:
+            self._count(self.chains[slot], self.kinds[slot], -1)
+        else:
+            self.size += 1
+        self.times[slot] = timestamp
+        self.kinds[slot] = kind
+        self.chains[slot] = chain
+        self.sns[slot] = sn
+        self._count(chain, kind, 1)
+        self.head = (slot + 1) % self.capacity
+
+    def _count(self, chain, kind, delta):
+        counter = self.counters.setdefault(chain, [0, 0])
+        counter[kind - 1] += delta
+        if not counter[0] and not counter[1]:
+            del self.counters[chain]
+
+    def update(self, devices, scope=None, timestamp=None):
+        """Record the attached and detached devices by comparing with the devices of the last update,
+        the first update only sets the baseline
+        :param devices: the scanned USB devices
+        :param scope: the ScanScope of the scan, the devices out of it are not compared
+        :param timestamp: the time of the scan, default is now
+        :return: the count of the recorded events
+        """
+        current = {}
+        for device in devices:
+            if device.portChain:
+                current[(device.portChain, device.sn or "")] = get_device_ids(device)
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            present = self._present
+            if present is None:
+                self._present = current
+                return 0
+            if scope is not None and not scope.is_empty():
+                compared = dict((key, ids) for key, ids in present.items()
+                                if scope.match_chain(key[0]) and scope.match_ids(*ids))
+                merged = dict((key, ids) for key, ids in present.items() if key not in compared)
+                merged.update(current)
+            else:
+                compared = present
+                merged = current
+            events = 0
+            for chain, sn in sorted(key for key in compared if key not in current):
+                self._record(self.DETACH, chain, sn, timestamp)
+                events += 1
+            for chain, sn in sorted(key for key in current if key not in compared):
+                self._record(self.ATTACH, chain, sn, timestamp)
+                events += 1
+            self._present = merged
+            return events
+
+    def history(self, chain=None, sn=None, since=None, kind=None):
+        """Get the events in the buffer, from the oldest to the newest
+        :param chain: only the events of the port chain, like "2-1-7-3-2"
+        :param sn: only the events of the SN
+        :param since: only the events at or after the time, like time.time() - 3600
+        :param kind: only ATTACH or DETACH events
+        :return: the list of HotplugEvent
+        """
+        with self._lock:
+            start = (self.head - self.size) % self.capacity
+            events = []
+            for i in range(self.size):
+                slot = (start + i) % self.capacity
+                if since is not None and self.times[slot] < since:
+                    continue
+                if chain is not None and self.chains[slot] != chain:
+                    continue
+                if sn is not None and self.sns[slot] != sn:
+                    continue
+                if kind is not None and self.kinds[slot] != kind:
+                    continue
+                events.append(HotplugEvent(self.times[slot], self.kinds[slot], self.chains[slot], self.sns[slot]))
+            return events
+
+    def count(self, chain, kind=DETACH, since=None):
+        """Count the events of the port chain, like how many times it dropped in the last hour
+        :param chain: the port chain
+        :param kind: ATTACH or DETACH, default is DETACH
+        :param since: only the events at or after the time, None for all events in the buffer (from the counters)
+        :return: the count
+        """
+        if since is None:
+            with self._lock:
+                return self.counters.get(chain, [0, 0])[kind - 1]
+        return len(self.history(chain=chain, since=since, kind=kind))
+
+    def save(self, path):
+        """Save the events and the devices of the last update to the json file, to keep the journal across
+        the command line runs. It's written to a temp file of the same directory and then replaced, so a concurrent
+        run never loads a partial journal.
+        :param path: the file path
+        :return: None
+        """
+        with self._lock:
+            present = None
+            if self._present is not None:
+                present = [[chain, sn, vid, pid] for (chain, sn), (vid, pid) in self._present.items()]
+        data = {"capacity": self.capacity,
+                "events": [[e.timestamp, e.kind, e.chain, e.sn] for e in self.history()],
+                "present": present}
+        fd, tempPath = tempfile.mkstemp(prefix=".{}.".format(os.path.basename(path)), suffix=".tmp",
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with io.open(fd, "w", encoding="utf-8") as fobj:
+                fobj.write(json.dumps(data))
+            os.replace(tempPath, path)
+        except BaseException:
+            os.unlink(tempPath)
+            raise
+
+    def load(self, path):
+        """Load the events and the devices of the last update from the json file, see save()
+        :param path: the file path
+        :return: True if it's loaded
+        """
+        try:
+            with io.open(path, "r", encoding="utf-8") as fobj:
+                data = json.load(fobj)
+        except (IOError, OSError, ValueError):
+            logger.debug("No journal is loaded from {}".format(path))
+            return False
+        with self._lock:
+            for timestamp, kind, chain, sn in data.get("events", []):
+                self._record(kind, chain, sn, timestamp)
+            present = data.get("present")
+            if present is not None:
+                self._present = dict(((chain, sn), (vid, pid)) for chain, sn, vid, pid in present)
+        return True
@@ -0,0 +1,189 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import re
+import logging
+from pyusb_chain.utility import get_sysfs_chain
+
+logger = logging.getLogger("pyusb_path")
+
+
+class AlsaCardInfo(object):
+    """Information of an USB audio card (Linux), it has the same attributes as pyserial ListPortInfo
+    (description, location, hwid, vid, pid, serial_number, device) which are used by the USB device classes,
+    with the names of the first playback and capture PCMs.
+    """
+    def __init__(self, card, cardID, description):
+        #: the ALSA card index and id, like 1 and "Device"
+        self.card = card
+        self.cardID = cardID
+        self.description = description
+        #: the USB interface name in sysfs, like "1-3.7.4:1.0"
+        self.location = None
+        self.hwid = None
+        self.vid = None
+        self.pid = None
+        self.serial_number = None
+        #: the tty devices of the same USB device, separated by ',' (set for the audio + VCOM composite device)
+        self.device = None
+        #: like "Speakers (hw:CARD=Device,DEV=0)" and "Microphone (hw:CARD=Device,DEV=0)"
+        self.playbackName = None
+        self.recordName = None
+
+    def get_chain(self):
+        """Get the port chain of the USB device, like "1-3-7-4"
+        :return: the port chain
+        """
+        if not self.location:
+            return None
+        return self.location.split(":")[0].replace(".", "-")
+
+
+class LinuxAudioScanner(object):
+    """Discover the USB audio cards by /proc/asound and /sys/class/sound (Linux),
+    the roots are injectable to scan a fake tree in tests.
+    """
+    CARD_REG = re.compile(r"^\s*(\d+)\s+\[(.+?)\s*\]\s*:\s*(\S+)\s+-\s+(.*?)\s*$")
+    PCM_REG = re.compile(r"^(\d+)-(\d+)\s*:")
+
+    def __init__(self, sysfsRoot="/sys", procRoot="/proc"):
+        self.sysfsRoot = sysfsRoot
+        self.procRoot = procRoot
+
+    def scan(self, deadline=None, timedOut=None, scope=None):
+        """Scan all USB audio cards in one pass of /proc/asound/cards, /proc/asound/pcm and /sys/class/sound
+        :param deadline: the Deadline to stop scanning, the cards not scanned are recorded as timed out
+        :param timedOut: the list to record the timed out cards, like "audio:card1"
+        :param scope: the ScanScope, the cards out of it are pruned before reading the USB device attributes
+        :return: the AlsaCardInfo list of USB audio cards
+        """
+        cards = self.read_cards()
+        if not cards:
+            return []
+        pcms = self.read_pcms()
+        soundClass = os.path.join(self.sysfsRoot, "class", "sound")
+
+        infoList = []
+        for index in sorted(cards):
+            if deadline and deadline.expired():
+                if timedOut is not None:
+                    timedOut.append("audio:card{}".format(index))
+                continue
+            cardID, description = cards[index]
+            interfacePath = self.get_usb_interface_path(os.path.join(soundClass, "card{}".format(index), "device"))
+            if not interfacePath:
+                continue
+            if scope and not scope.match_chain(get_sysfs_chain(interfacePath)):
+                continue
+            info = AlsaCardInfo(index, cardID, description)
+            self.read_usb_device(info, interfacePath)
+            if scope and not scope.match_ids(info.vid, info.pid):
+                continue
+            playback, capture = pcms.get(index, (None, None))
+            if playback is not None:
+                info.playbackName = "Speakers (hw:CARD={},DEV={})".format(cardID, playback)
+            if capture is not None:
+                info.recordName = "Microphone (hw:CARD={},DEV={})".format(cardID, capture)
+            infoList.append(info)
+        return infoList
+
+    def read_cards(self):
+        """Read /proc/asound/cards
+        :return: dict of card index -> (card id, card name)
+        """
+        cards = {}
+        for line in self._read_lines(os.path.join(self.procRoot, "asound", "cards")):
+            matched = self.CARD_REG.match(line)
+            if matched:
+                cards[int(matched.group(1))] = (matched.group(2), matched.group(4))
+        return cards
+
+    def read_pcms(self):
+        """Read /proc/asound/pcm, like "01-00: USB Audio : USB Audio : playback 1 : capture 1"
+        :return: dict of card index -> (first playback device, first capture device), None if there is not
+        """
+        pcms = {}
+        for line in self._read_lines(os.path.join(self.procRoot, "asound", "pcm")):
+            matched = self.PCM_REG.match(line)
+            if not matched:
+                continue
+            card = int(matched.group(1))
+            dev = int(matched.group(2))
+            playback, capture = pcms.get(card, (None, None))
+            if playback is None and "playback" in line:
+                playback = dev
+            if capture is None and "capture" in line:
+                capture = dev
+            pcms[card] = (playback, capture)
+        return pcms
+
+    @staticmethod
+    def get_usb_interface_path(deviceLink):
+        """Get the USB interface directory from the sound card device link
+        :param deviceLink: like /sys/class/sound/card1/device
+        :return: the USB interface directory, like /sys/devices/.../1-3.7.4/1-3.7.4:1.0, None if it's not an USB card
+        """
+        if not os.path.exists(deviceLink):
+            return None
+        interfacePath = os.path.realpath(deviceLink)
+        usbPath = os.path.dirname(interfacePath)
+        if not os.path.exists(os.path.join(usbPath, "idVendor")):
+            return None
+        return interfacePath
+
+    def read_usb_device(self, info, interfacePath):
+        """Read the USB device attributes to the card information
+        :param info: the AlsaCardInfo
+        :param interfacePath: the USB interface directory of the card
+        :return: None
+        """
+        usbPath = os.path.dirname(interfacePath)
+        info.location = os.path.basename(interfacePath)
+        vid = self._read_attribute(usbPath, "idVendor")
+        pid = self._read_attribute(usbPath, "idProduct")
+        info.vid = int(vid, 16) if vid else None
+        info.pid = int(pid, 16) if pid else None
+        info.serial_number = self._read_attribute(usbPath, "serial")
+        product = self._read_attribute(usbPath, "product")
+        if product:
+            info.description = product
+        info.hwid = "USB VID:PID={}:{}{} LOCATION={}".format(
+            (vid or "").upper(), (pid or "").upper(),
+            " SER={}".format(info.serial_number) if info.serial_number else "", info.location)
+
+    @staticmethod
+    def _read_attribute(path, name):
+        try:
+            with open(os.path.join(path, name)) as f:
+                return f.read().strip()
+        except (IOError, OSError):
+            return None
+
+    @staticmethod
+    def _read_lines(path):
+        try:
+            with open(path) as f:
+                return f.readlines()
+        except (IOError, OSError):
+            logger.debug("Fail to read {}".format(path))
+            return []
@@ -0,0 +1,101 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import logging
+from pyusb_chain.utility import get_sysfs_chain
+
+logger = logging.getLogger("pyusb_path")
+
+
+class LinuxSerialScanner(object):
+    """List the USB serial ports (Linux) by walking /sys/class/tty, the ports out of the scan scope are pruned
+    by their sysfs device link, before pyserial reads any attribute of them.
+    The roots are injectable to scan a fake tree in tests.
+    """
+    def __init__(self, sysfsRoot="/sys", devRoot="/dev", portInfoFactory=None):
+        """
+        :param sysfsRoot: the sysfs root
+        :param devRoot: the device root
+        :param portInfoFactory: create the port information from the device path, default is pyserial SysFS
+        """
+        self.sysfsRoot = sysfsRoot
+        self.devRoot = devRoot
+        self.portInfoFactory = portInfoFactory
+
+    def scan(self, scope=None, deadline=None, timedOut=None):
+        """Scan the USB serial ports
+        :param scope: the ScanScope, None for all ports
+        :param deadline: the Deadline to stop scanning, the ports not scanned are recorded as timed out
+        :param timedOut: the list to record the timed out ports, like "serial:/dev/ttyUSB0"
+        :return: the port information list, like pyserial ListPortInfo, sorted by the device name
+        """
+        ports = []
+        for _, device in self.list_ttys(scope):
+            if deadline and deadline.expired():
+                if timedOut is not None:
+                    timedOut.append("serial:{}".format(device))
+                continue
+            port = self.get_port(device, scope)
+            if port is not None:
+                ports.append(port)
+        return ports
+
+    def list_ttys(self, scope=None):
+        """List the ttys of the USB devices by their sysfs device links, without reading any attribute of them
+        :param scope: the ScanScope to prune the ttys out of the subtree, None for all ttys
+        :return: the list of (port chain, device path), like ("1-7-5", "/dev/ttyUSB0"), sorted by the device name
+        """
+        ttyClass = os.path.join(self.sysfsRoot, "class", "tty")
+        try:
+            names = sorted(os.listdir(ttyClass))
+        except OSError:
+            logger.debug("Fail to list {}".format(ttyClass))
+            return []
+
+        ttys = []
+        for name in names:
+            deviceLink = os.path.join(ttyClass, name, "device")
+            if not os.path.exists(deviceLink):
+                continue  # virtual terminals
+            chain = get_sysfs_chain(os.path.realpath(deviceLink))
+            if not chain or (scope and not scope.match_chain(chain)):
+                continue
+            ttys.append((chain, os.path.join(self.devRoot, name)))
+        return ttys
+
+    def get_port(self, device, scope=None):
+        """Read the port information of the tty
+        :param device: the device path, like "/dev/ttyUSB0"
+        :param scope: the ScanScope to skip the port out of the VID/PID set, None for all ports
+        :return: the port information, like pyserial ListPortInfo, None if it's not a USB serial or out of the scope
+        """
+        factory = self.portInfoFactory
+        if factory is None:
+            from serial.tools.list_ports_linux import SysFS
+            factory = SysFS
+        port = factory(device)
+        if not port.pid:
+            return None
+        if scope and not scope.match_ids(port.vid, port.pid):
+            return None
+        return port
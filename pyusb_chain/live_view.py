@@ -0,0 +1,217 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import sys
+import time
+import logging
+from pyusb_chain.table import TableRenderer
+from pyusb_chain.watcher import TopologyWatcher
+from pyusb_chain.scan_scope import ScanScope
+from pyusb_chain.columns import get_device_ids
+
+logger = logging.getLogger("pyusb_path")
+
+CHAIN_TOKEN_REG = re.compile(r"(\d+)")
+#: the console mode flag of Windows 10+ to process the ANSI escape sequences
+ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
+STD_OUTPUT_HANDLE = -11
+
+
+def chain_sort_key(key):
+    """Natural sort key of the port chain key, "1-3-10" is after "1-3-9"
+    :param key: the port chain key, like "1-3-7-4:Speaker"
+    :return: the sort key
+    """
+    return [(0, int(token), "") if token.isdigit() else (1, 0, token)
+            for token in CHAIN_TOKEN_REG.split(u"{}".format(key)) if token]
+
+
+def enable_virtual_terminal():
+    """Enable the ANSI escape sequences of the Windows console (Windows 10+), the other terminals support them
+    :return: True if they're supported
+    """
+    if "win32" != sys.platform:
+        return True
+    try:
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.GetStdHandle(STD_OUTPUT_HANDLE)
+        mode = wintypes.DWORD()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            # not a console, like a pipe
+            return False
+        if mode.value & ENABLE_VIRTUAL_TERMINAL_PROCESSING:
+            return True
+        return bool(kernel32.SetConsoleMode(handle, mode.value | ENABLE_VIRTUAL_TERMINAL_PROCESSING))
+    except (AttributeError, OSError):
+        return False
+
+
+class LiveView(object):
+    """Live table of the USB devices in the terminal, it rescans only once the topology is changed
+    (see TopologyWatcher), and redraws only the lines changed by ANSI cursor movement.
+    The attached rows are highlighted in green, the changed rows in yellow, the detached rows are kept in red,
+    for highlightSeconds.
+
+        LiveView(tool, ["Port Chain Key", "Port Name", "Device Name"]).run(interval=1.0)
+    """
+    ATTACHED = "attached"
+    DETACHED = "detached"
+    CHANGED = "changed"
+    COLORS = {ATTACHED: "\033[32m", DETACHED: "\033[31m", CHANGED: "\033[33m"}
+    RESET = "\033[0m"
+    CLEAR_SCREEN = "\033[H\033[2J"
+    CLEAR_LINE = "\033[K"
+
+    def __init__(self, tool, headers, allInfo=False, filters=None, stream=None, highlightSeconds=5.0, timeout=None,
+                 under=None, vids=None, pids=None):
+        """
+        :param tool: the UsbTreeViewTool
+        :param headers: the column headers, see USBDevicesChain.print_table()
+        :param allInfo: add SN and Driver Key columns
+        :param filters: the keywords to filter the devices, see UsbTreeViewTool.filter()
+        :param stream: the output stream, default is sys.stdout
+        :param highlightSeconds: the seconds to highlight the attached, detached and changed rows
+        :param timeout: the deadline of each scan in seconds, see UsbTreeViewTool.scan()
+        :param under: only scan and list the subtree of the port chain, see UsbTreeViewTool.scan()
+        :param vids: only scan and list the devices of the vendor IDs, see UsbTreeViewTool.scan()
+        :param pids: only scan and list the devices of the product IDs, see UsbTreeViewTool.scan()
+        """
+        self.tool = tool
+        self.headers = headers
+        self.allInfo = allInfo
+        self.filters = filters
+        self.stream = stream
+        self.highlightSeconds = highlightSeconds
+        self.scope = ScanScope(under, vids, pids)
+        self.watcher = TopologyWatcher(tool, timeout=timeout, under=under, vids=vids, pids=pids)
+        #: port chain key -> the row of the last scan
+        self._rows = None
+        #: port chain key -> the row of the detached device, kept while it's highlighted
+        self._detached = {}
+        #: port chain key -> (state, time.monotonic() to stop highlighting)
+        self._marks = {}
+        #: the time of the last change, shown in the status line
+        self._changedAt = None
+        #: the displayed lines and the column widths
+        self._lines = None
+        self._widths = None
+
+    def refresh(self, now=None):
+        """Rescan if the topology is changed, and redraw the changed lines
+        :param now: the time.monotonic() of this refresh, for the test
+        :return: the count of the redrawn lines
+        """
+        now = time.monotonic() if now is None else now
+        if self.watcher.poll() is not None or self._rows is None:
+            self._update(now)
+        for key, (state, until) in list(self._marks.items()):
+            if until <= now:
+                del self._marks[key]
+                self._detached.pop(key, None)
+        return self._draw(*self._render())
+
+    def run(self, interval=1.0, iterations=None):
+        """Refresh the view periodically, until it's interrupted (Ctrl+C)
+        :param interval: the seconds between two refreshes
+        :param iterations: the count of refreshes, None for endless
+        :return: None
+        """
+        if self.stream is None and not enable_virtual_terminal():
+            logger.warning("The console doesn't support the ANSI escape sequences, the view may be garbled")
+        count = 0
+        while iterations is None or count < iterations:
+            start = time.monotonic()
+            self.refresh(start)
+            count += 1
+            if iterations is None or count < iterations:
+                time.sleep(max(0.0, interval - (time.monotonic() - start)))
+
+    def _update(self, now):
+        rows = {}
+        for device in self.tool.filter(self.filters):
+            # the devices out of the scope are kept in the snapshot by the scoped scans
+            if not self.scope.is_empty() and (not self.scope.match_chain(device.portChain) or
+                                              not self.scope.match_ids(*get_device_ids(device))):
+                continue
+            for row in device.rows(self.allInfo):
+                rows[u"{}".format(row[0])] = row
+        if self._rows is not None:
+            until = now + self.highlightSeconds
+            for key in rows:
+                if key not in self._rows:
+                    self._marks[key] = (self.ATTACHED, until)
+                    self._detached.pop(key, None)
+                elif rows[key] != self._rows[key]:
+                    self._marks[key] = (self.CHANGED, until)
+            for key in self._rows:
+                if key not in rows:
+                    self._marks[key] = (self.DETACHED, until)
+                    self._detached[key] = self._rows[key]
+        self._rows = rows
+        self._changedAt = time.strftime("%H:%M:%S")
+
+    def _render(self):
+        rows = dict(self._detached)
+        rows.update(self._rows)
+        keys = sorted(rows, key=chain_sort_key)
+        renderer = TableRenderer(self.headers)
+        widths, numeric = renderer.measure([rows[key] for key in keys])
+        states = [self._marks.get(key, (None, 0))[0] for key in keys]
+        lines = [("{} devices, {} attached, {} detached, changed at {}".format(
+                      len(self._rows), states.count(self.ATTACHED), states.count(self.DETACHED), self._changedAt),
+                  None),
+                 (renderer.format_line(self.headers, widths, numeric), None),
+                 (renderer.SEPARATOR.join("-" * width for width in widths), None)]
+        for key, state in zip(keys, states):
+            lines.append((renderer.format_line(rows[key], widths, numeric), state))
+        return lines, widths
+
+    def _draw(self, lines, widths):
+        stream = self.stream or sys.stdout
+        output = []
+        if self._lines is None or widths != self._widths:
+            output.append(self.CLEAR_SCREEN)
+            old = []
+        else:
+            old = self._lines
+        redrawn = 0
+        for index, line in enumerate(lines):
+            if index < len(old) and old[index] == line:
+                continue
+            text, state = line
+            if state:
+                text = self.COLORS[state] + text + self.RESET
+            output.append("\033[{};1H{}{}".format(index + 1, text, self.CLEAR_LINE))
+            redrawn += 1
+        for index in range(len(lines), len(old)):
+            output.append("\033[{};1H{}".format(index + 1, self.CLEAR_LINE))
+            redrawn += 1
+        if output:
+            output.append("\033[{};1H".format(len(lines) + 1))
+            stream.write("".join(output))
+            stream.flush()
+        self._lines = lines
+        self._widths = widths
+        return redrawn
@@ -0,0 +1,221 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import re
+import heapq
+
+#: the index prefix of Windows audio endpoint names, like "4- " in "Speakers (4- USB Audio Device)"
+INDEX_PREFIX_REG = re.compile(r"(^|\()\s*\d+\s*-\s*")
+WHITESPACE_REG = re.compile(r"\s+")
+
+
+def normalize_port_name(name):
+    """Normalise the port name to be matched after the audio endpoint is renamed by Windows,
+    the index prefix, case and whitespace are removed.
+    "Speakers (4- USB Audio Device)" -> "speakers(usbaudiodevice)"
+    :param name: the port name
+    :return: the normalised name
+    """
+    name = INDEX_PREFIX_REG.sub(r"\1", name)
+    return WHITESPACE_REG.sub("", name).lower()
+
+
+def get_trigrams(normalized):
+    """Get the trigrams of the normalised name, padded to match the short names and the boundaries
+    :param normalized: the normalised name
+    :return: the set of trigrams
+    """
+    padded = "^^{}$".format(normalized)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class PortNameIndex(object):
+    """Index of the port names to search the renamed ports, by the normalised names and then the trigrams.
+    The posting lists of the common trigrams (like "usb" and "aud" shared by nearly all audio endpoints) are never
+    visited: the entries are grouped by their common trigrams and sizes, and the entries of a group score the same
+    unless they share a rare trigram with the searched name. The rare posting lists are visited from the shortest,
+    the longer ones are skipped once the entries only in them can't rank in the limit. So a lookup visits the short
+    posting lists and the first entries of each group, instead of all ports.
+    """
+    #: the candidates with less similarity (Dice coefficient of the trigrams) are dropped
+    MIN_SCORE = 0.5
+    #: the trigram in more than the share of the entries is common, its posting list is not visited
+    MAX_SHARE = 0.1
+
+    def __init__(self, ports=()):
+        """
+        :param ports: the iterable of (port name, USBDevice)
+        """
+        #: normalised name -> [(port name, USBDevice)]
+        self.normalized = {}
+        #: trigram -> [entry id]
+        self.trigrams = {}
+        #: entry id -> (port name, USBDevice, trigrams)
+        self.entries = []
+        #: the groups of the entries by their common trigrams and sizes, see get_groups, rebuilt after adding
+        self._groups = None
+        #: the count of the entries and the groups visited by the last search, it doesn't grow with all ports
+        self.visited = 0
+        for port, device in ports:
+            self.add(port, device)
+
+    def add(self, port, device):
+        """Add the port name of the device
+        :param port: the port name
+        :param device: the USBDevice
+        :return: None
+        """
+        normalized = normalize_port_name(port)
+        self.normalized.setdefault(normalized, []).append((port, device))
+        trigrams = get_trigrams(normalized)
+        entryId = len(self.entries)
+        self.entries.append((port, device, frozenset(trigrams)))
+        for trigram in trigrams:
+            self.trigrams.setdefault(trigram, []).append(entryId)
+        self._groups = None
+
+    def get_groups(self):
+        """Group the entries by their common trigrams and sizes, the entries of a group sharing no rare trigram with
+        the searched name have the same score
+        :return: (the set of common trigrams, [(common trigrams of the entries, entry size, [entry id])],
+                  [group index of each entry])
+        """
+        groups = self._groups
+        if groups is None:
+            maxPostings = max(1, self.MAX_SHARE * len(self.entries))
+            common = frozenset(trigram for trigram, entryIds in self.trigrams.items() if len(entryIds) > maxPostings)
+            indexes = {}
+            members = []
+            entryGroups = []
+            for entryId, (_, _, trigrams) in enumerate(self.entries):
+                key = (trigrams & common, len(trigrams))
+                index = indexes.get(key)
+                if index is None:
+                    index = indexes[key] = len(members)
+                    members.append((key[0], key[1], []))
+                members[index][2].append(entryId)
+                entryGroups.append(index)
+            groups = self._groups = (common, members, entryGroups)
+        return groups
+
+    def search(self, port, limit=5, minScore=None):
+        """Search the ports similar to the port name
+        :param port: the port name, like "Speakers (5- USB Audio Device)"
+        :param limit: the max count of the candidates, None for all
+        :param minScore: the min similarity (0 ~ 1.0) of the candidates, default is MIN_SCORE
+        :return: the ranked list of (score, port name, USBDevice), the score of the normalised name match is 1.0
+        """
+        if not port:
+            return []
+        normalized = normalize_port_name(port)
+        exact = self.normalized.get(normalized)
+        if exact:
+            return [(1.0, name, device) for name, device in exact][:limit]
+
+        trigrams = get_trigrams(normalized)
+        length = len(trigrams)
+        minScore = self.MIN_SCORE if minScore is None else minScore
+        common, groups, entryGroups = self.get_groups()
+        sharedCommon = trigrams & common
+        # (shared trigrams, entry size) of each group, its entries sharing no rare trigram score the same
+        shares = [(len(sharedCommon & groupTrigrams), size) for groupTrigrams, size, _ in groups]
+        # the first entries of the groups score at least their bases, the limit is reached at the threshold
+        threshold = minScore
+        if limit is not None:
+            scores = heapq.nlargest(limit, (2.0 * shared / (length + size)
+                                            for (shared, size), (_, _, members) in zip(shares, groups) if shared
+                                            for _ in range(min(limit, len(members)))))
+            if len(scores) == limit:
+                threshold = max(threshold, scores[-1])
+
+        # count the rare trigrams shared by each entry, from the shortest posting list, the entries only in the rest
+        # lists share at most one rare trigram of each
+        rare = sorted((trigram for trigram in trigrams - common if trigram in self.trigrams),
+                      key=lambda trigram: len(self.trigrams[trigram]))
+        counts = {}
+        skipped = 0
+        # the min heap of the exact scores of the best entries of each visited list, any of the limit entries
+        # score at least the smallest one
+        scored = set()
+        best = []
+        for index, trigram in enumerate(rare):
+            remaining = len(rare) - index
+            if max(2.0 * (shared + remaining) / (length + size) for shared, size in shares) < threshold:
+                skipped = remaining
+                break
+            postings = self.trigrams[trigram]
+            for entryId in postings:
+                counts[entryId] = counts.get(entryId, 0) + 1
+            if limit is None:
+                continue
+            # the counted entries may share the trigrams of the rest lists too, they're scored exactly
+            for entryId in heapq.nlargest(limit, postings, key=lambda entryId: 2.0 * (
+                    shares[entryGroups[entryId]][0] + counts[entryId]) / (length + shares[entryGroups[entryId]][1])):
+                if entryId in scored:
+                    continue
+                scored.add(entryId)
+                score = self.get_score(trigrams, entryId)
+                if len(best) < limit:
+                    heapq.heappush(best, score)
+                elif score > best[0]:
+                    heapq.heapreplace(best, score)
+            if len(best) == limit:
+                threshold = max(threshold, best[0])
+
+        candidates = []
+        for entryId, count in counts.items():
+            shared, size = shares[entryGroups[entryId]]
+            # the entry may share the trigrams of the skipped lists too, it can't rank under the threshold
+            if 2.0 * (shared + count + skipped) / (length + size) < threshold:
+                continue
+            score = self.get_score(trigrams, entryId) if skipped else 2.0 * (shared + count) / (length + size)
+            if score >= minScore:
+                candidates.append((score, entryId))
+        visited = len(counts) + len(groups)
+
+        # the other entries of a group share no rare trigram of the visited lists, the first ones are enough for
+        # the limit, they're scored exactly as they may share the trigrams of the skipped lists
+        for (shared, size), (_, _, members) in zip(shares, groups):
+            if not shared or 2.0 * shared / (length + size) < minScore:
+                continue
+            added = 0
+            for entryId in members:
+                if limit is not None and added >= limit:
+                    break
+                if entryId in counts:
+                    continue
+                candidates.append((self.get_score(trigrams, entryId), entryId))
+                added += 1
+            visited += added
+        self.visited = visited
+        # the same score is ranked by the scanning order
+        candidates.sort(key=lambda x: (-x[0], x[1]))
+        return [(score,) + self.entries[entryId][:2] for score, entryId in candidates[:limit]]
+
+    def get_score(self, trigrams, entryId):
+        """Get the similarity of the entry, the Dice coefficient of the trigrams
+        :param trigrams: the trigrams of the searched name
+        :param entryId: the entry id
+        :return: the score (0 ~ 1.0)
+        """
+        entryTrigrams = self.entries[entryId][2]
+        return 2.0 * len(trigrams & entryTrigrams) / (len(trigrams) + len(entryTrigrams))
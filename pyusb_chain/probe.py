@@ -0,0 +1,153 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pyusb_chain.utility import call_with_timeout
+
+logger = logging.getLogger("pyusb_path")
+
+
+class ProbeResult(object):
+    """The health of one serial port found by the probe
+    """
+    STATUS_OK = "ok"
+    STATUS_FAILED = "failed"
+    STATUS_TIMEOUT = "timeout"
+    STATUS_LOOPBACK = "loopback failed"
+
+    def __init__(self, chain, port, status, latency=None, error=None):
+        #: the port chain key, like "1-7-5" or "1-3-1:2"
+        self.chain = chain
+        #: the port name, like "COM16" or "/dev/ttyUSB0"
+        self.port = port
+        #: STATUS_OK, STATUS_FAILED, STATUS_TIMEOUT or STATUS_LOOPBACK
+        self.status = status
+        #: the seconds to open and configure the port, None if it's not opened
+        self.latency = latency
+        #: the description of the failure
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.STATUS_OK == self.status
+
+    def __repr__(self):
+        return "ProbeResult({}, {}, {})".format(self.chain, self.port, self.status)
+
+
+def get_serial_ports(usbDevices):
+    """Get the serial ports of the devices, like the COMPortDevice and AudioCOMPortDevice
+    :param usbDevices: the USB devices
+    :return: the list of (port chain key, port name)
+    """
+    ports = []
+    keys = set()
+    for device in usbDevices:
+        for port in getattr(device, "comPorts", None) or []:
+            key = device.get_key(port=port)
+            if key and key not in keys:
+                keys.add(key)
+                ports.append((key, port))
+    return ports
+
+
+class PortProber(object):
+    """Open, configure and optionally loopback test the serial ports concurrently by a bounded thread pool.
+    Each port is limited by its own timeout, the wedged one is abandoned and reported as timed out, so it doesn't
+    hold the others.
+
+        results = PortProber(timeout=2, workers=16, baudrate=115200).probe([("1-7-5", "COM16")])
+    """
+    #: the payload of the loopback test
+    LOOPBACK_PAYLOAD = b"pyusb-chain probe\r\n"
+
+    def __init__(self, timeout=2.0, workers=16, loopback=False, serialFactory=None, **settings):
+        """
+        :param timeout: the seconds of each port to open, configure and loopback, None for no limit
+        :param workers: the max count of the ports probed at the same time
+        :param loopback: write the payload and expect to read it back (the TX and RX are wired)
+        :param serialFactory: create the opened handle by (port, **settings), default is serial.Serial
+        :param settings: the serial settings, like baudrate=115200
+        """
+        self.timeout = timeout
+        self.workers = workers
+        self.loopback = loopback
+        self.serialFactory = serialFactory
+        self.settings = settings
+
+    def probe(self, ports):
+        """Probe the ports concurrently
+        :param ports: the list of (port chain key, port name), see get_serial_ports()
+        :return: the list of ProbeResult in the same order
+        """
+        if not ports:
+            return []
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(ports))))
+        try:
+            return list(executor.map(lambda item: self.probe_port(*item), ports))
+        finally:
+            executor.shutdown(wait=False)
+
+    def probe_port(self, chain, port):
+        """Probe one port within the timeout
+        :param chain: the port chain key
+        :param port: the port name
+        :return: the ProbeResult
+        """
+        start = time.monotonic()
+        try:
+            finished, result = call_with_timeout(lambda: self._probe(chain, port, start), self.timeout)
+        except Exception as e:
+            return ProbeResult(chain, port, ProbeResult.STATUS_FAILED, error=str(e) or e.__class__.__name__)
+        if not finished:
+            logger.warning("Probe of {} ({}) timed out in {} seconds".format(port, chain, self.timeout))
+            return ProbeResult(chain, port, ProbeResult.STATUS_TIMEOUT,
+                               error="not finished in {} seconds".format(self.timeout))
+        return result
+
+    def _probe(self, chain, port, start):
+        factory = self.serialFactory
+        if factory is None:
+            from serial import Serial
+            factory = Serial
+        settings = dict(self.settings)
+        if self.timeout is not None:
+            # the loopback read and write share the timeout of the port with the opening
+            settings.setdefault("timeout", self.timeout / 2.0)
+            settings.setdefault("write_timeout", self.timeout / 2.0)
+        handle = factory(port, **settings)
+        try:
+            latency = time.monotonic() - start
+            if not self.loopback:
+                return ProbeResult(chain, port, ProbeResult.STATUS_OK, latency)
+            handle.reset_input_buffer()
+            handle.write(self.LOOPBACK_PAYLOAD)
+            handle.flush()
+            echo = handle.read(len(self.LOOPBACK_PAYLOAD))
+            if echo != self.LOOPBACK_PAYLOAD:
+                return ProbeResult(chain, port, ProbeResult.STATUS_LOOPBACK, latency,
+                                   error="read {!r}".format(echo))
+            return ProbeResult(chain, port, ProbeResult.STATUS_OK, latency)
+        finally:
+            handle.close()
@@ -0,0 +1,286 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""pytest plugin of pyusb-chain, registered by the entry point "pytest11".
+
+    def test_console(usb_tool):
+        port = usb_tool.get_port_from_chain("1-7-5")
+
+    @pytest.mark.usb_chain("1-7-5", "1-7-6")
+    def test_two_boards(usb_ports):
+        console, debugger = usb_ports["1-7-5"], usb_ports["1-7-6"]
+
+    @pytest.mark.usb_power_cycle
+    def test_power_off(usb_port):
+        ...  # the devices are rescanned after it
+
+The tool is scanned once per session at the first use, the xdist workers share one scan by a file locked snapshot.
+Only the tests with the markers or the fixtures are touched. pytest 7+ is recommended (install "pyusb-chain[pytest]"),
+the older ones without the stash keep the values in the attributes of the config and the test items.
+"""
+import os
+import shlex
+import pickle
+import logging
+import pytest
+from pyusb_chain.usb_tree_view_tool import UsbTreeViewTool
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("pyusb_path")
+
+SNAPSHOT_FILE_NAME = "pyusb_chain_snapshot.pickle"
+
+
+class FileLock(object):
+    """Exclusive lock of a file among the processes, blocking until it's acquired
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fobj = None
+
+    def __enter__(self):
+        self.fobj = open(self.path, "a+b")
+        if fcntl:
+            fcntl.flock(self.fobj.fileno(), fcntl.LOCK_EX)
+        else:
+            self.fobj.seek(0)
+            msvcrt.locking(self.fobj.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *args):
+        if fcntl:
+            fcntl.flock(self.fobj.fileno(), fcntl.LOCK_UN)
+        else:
+            self.fobj.seek(0)
+            msvcrt.locking(self.fobj.fileno(), msvcrt.LK_UNLCK, 1)
+        self.fobj.close()
+        self.fobj = None
+
+
+class UsbChainSession(object):
+    """The tool shared by the tests of the session, scanned at the first use, and rescanned only after the test
+    marked with usb_power_cycle. With the shared directory (xdist), the devices of the scan are saved to a file
+    locked snapshot, the first worker scans and the others load it.
+    """
+    def __init__(self, exportCommand=None, timeout=None, shareDir=None):
+        """
+        :param exportCommand: the command to export the XML report instead of UsbTreeView.exe, see UsbTreeViewTool
+        :param timeout: the deadline of each scan in seconds
+        :param shareDir: the directory of the snapshot shared by the xdist workers, None to scan in this process
+        """
+        self.exportCommand = exportCommand
+        self.timeout = timeout
+        self.shareDir = shareDir
+        self.tool = None
+        #: the generation (count of rescans) and the modified time of the loaded shared snapshot
+        self.generation = None
+        self._loadedMtime = None
+
+    @property
+    def snapshotFile(self):
+        return os.path.join(self.shareDir, SNAPSHOT_FILE_NAME)
+
+    def get_tool(self):
+        """Get the tool, scan it at the first call, or reload it if the shared snapshot is rescanned by others
+        :return: the UsbTreeViewTool
+        """
+        if self.tool is None:
+            self.tool = UsbTreeViewTool(exportCommand=self.exportCommand)
+            self.tool.quiet = True
+            if not self.shareDir:
+                self.tool.scan(timeout=self.timeout)
+                return self.tool
+        if self.shareDir and (self.generation is None or self._get_mtime() != self._loadedMtime):
+            with FileLock(self.snapshotFile + ".lock"):
+                if not self._load():
+                    self._scan_shared(0)
+        return self.tool
+
+    def rescan(self):
+        """Rescan after the hardware is power cycled, the shared snapshot is replaced for the other workers
+        :return: None
+        """
+        tool = self.get_tool()
+        if not self.shareDir:
+            tool.scan(timeout=self.timeout)
+            return
+        with FileLock(self.snapshotFile + ".lock"):
+            self._load()
+            self._scan_shared((self.generation or 0) + 1)
+
+    def resolve(self, chains):
+        """Resolve the port names of the chains
+        :param chains: the port chains, like ["1-7-5", "1-3-7-4:Speaker"]
+        :return: (dict of chain -> port name, the absent chains)
+        """
+        tool = self.get_tool()
+        ports = {}
+        absent = []
+        for chain in chains:
+            port = tool.get_port_from_chain(chain)
+            if port:
+                ports[chain] = port
+            else:
+                absent.append(chain)
+        return ports, absent
+
+    def _get_mtime(self):
+        # the snapshot is replaced by a new file, the inode is changed as well
+        try:
+            stat = os.stat(self.snapshotFile)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self):
+        try:
+            with open(self.snapshotFile, "rb") as fobj:
+                data = pickle.load(fobj)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return False
+        if data["generation"] != self.generation:
+            self.tool.publish(data["devices"])
+            self.generation = data["generation"]
+        self._loadedMtime = self._get_mtime()
+        return True
+
+    def _scan_shared(self, generation):
+        result = self.tool.scan(timeout=self.timeout)
+        path = self.snapshotFile
+        with open(path + ".tmp", "wb") as fobj:
+            pickle.dump({"generation": generation, "devices": list(result.devices)}, fobj)
+        os.replace(path + ".tmp", path)
+        self.generation = generation
+        self._loadedMtime = self._get_mtime()
+
+
+if hasattr(pytest, "StashKey"):
+    SESSION_KEY = pytest.StashKey()
+    PORTS_KEY = pytest.StashKey()
+else:
+    # pytest < 7 has no stash, the keys are the attribute names
+    SESSION_KEY = "_pyusbChainSession"
+    PORTS_KEY = "_pyusbChainPorts"
+
+
+def get_stash(node, key, default=None):
+    """Get the value of the stash of the config or the test item
+    :param node: the config or the test item
+    :param key: the StashKey, or the attribute name of pytest < 7
+    :param default: the value if it's not set
+    :return: the value
+    """
+    if isinstance(key, str):
+        return getattr(node, key, default)
+    return node.stash.get(key, default)
+
+
+def set_stash(node, key, value):
+    """Set the value of the stash of the config or the test item, see get_stash()
+    :return: None
+    """
+    if isinstance(key, str):
+        setattr(node, key, value)
+    else:
+        node.stash[key] = value
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("pyusb-chain")
+    group.addoption("--usb-export-command", action="store", dest="usbExportCommand",
+                    help="command to export the XML report instead of UsbTreeView.exe, like 'python stub.py'")
+    group.addoption("--usb-scan-timeout", action="store", type=float, dest="usbScanTimeout",
+                    help="deadline of each USB scan in seconds")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "usb_chain(*chains): resolve the ports of the USB port chains, "
+                                       "skip the test if any device is absent")
+    config.addinivalue_line("markers", "usb_power_cycle: the test power cycles the USB devices, "
+                                       "they are rescanned after it")
+
+
+def get_session(config, tmp_path_factory):
+    """Get the UsbChainSession of the pytest session
+    """
+    session = get_stash(config, SESSION_KEY)
+    if session is None:
+        exportCommand = config.getoption("usbExportCommand")
+        shareDir = None
+        if os.environ.get("PYTEST_XDIST_WORKER"):
+            # the base temp of each worker is under the same directory
+            shareDir = str(tmp_path_factory.getbasetemp().parent)
+        session = UsbChainSession(exportCommand=shlex.split(exportCommand) if exportCommand else None,
+                                  timeout=config.getoption("usbScanTimeout"), shareDir=shareDir)
+        set_stash(config, SESSION_KEY, session)
+    return session
+
+
+@pytest.fixture(scope="session")
+def usb_tool(request, tmp_path_factory):
+    """The UsbTreeViewTool scanned once for the session
+    """
+    return get_session(request.config, tmp_path_factory).get_tool()
+
+
+def pytest_collection_modifyitems(items):
+    # the markers are resolved only for the marked tests, before their other fixtures
+    for item in items:
+        if item.get_closest_marker("usb_chain") or item.get_closest_marker("usb_power_cycle"):
+            if "_usb_chain_markers" not in item.fixturenames:
+                item.fixturenames.insert(0, "_usb_chain_markers")
+
+
+@pytest.fixture
+def _usb_chain_markers(request, tmp_path_factory):
+    chains = [chain for marker in request.node.iter_markers("usb_chain") for chain in marker.args]
+    powerCycle = request.node.get_closest_marker("usb_power_cycle") is not None
+    if not chains and not powerCycle:
+        yield
+        return
+    session = get_session(request.config, tmp_path_factory)
+    ports, absent = session.resolve(chains)
+    if absent:
+        pytest.skip("USB device is absent: {}".format(", ".join(absent)))
+    set_stash(request.node, PORTS_KEY, ports)
+    yield
+    if powerCycle:
+        session.rescan()
+
+
+@pytest.fixture
+def usb_ports(request, _usb_chain_markers):
+    """The port names of the chains of the usb_chain markers, dict of chain -> port name
+    """
+    return get_stash(request.node, PORTS_KEY, {})
+
+
+@pytest.fixture
+def usb_port(request, _usb_chain_markers):
+    """The port name of the first chain of the usb_chain markers
+    """
+    chains = [chain for marker in request.node.iter_markers("usb_chain") for chain in marker.args]
+    return get_stash(request.node, PORTS_KEY, {}).get(chains[0]) if chains else None
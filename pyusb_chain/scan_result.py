@@ -0,0 +1,49 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+class ScanResult(object):
+    """The result of one scan, the scanned devices with the backends or devices which timed out.
+    The result is partial if any backend or device timed out, then complete is False.
+    """
+    def __init__(self, devices=None, timedOut=None):
+        #: the scanned USB devices
+        self.devices = devices if devices is not None else []
+
+        #: the backends (like "usbtreeview", "serial") or devices (like "usbtreeview:1-7-5") which timed out
+        self.timedOut = timedOut if timedOut is not None else []
+
+        #: the topology fingerprint of the scan, None if it's not available
+        self.fingerprint = None
+
+        #: the topology is not changed since the last scan, the devices are reused without parsing
+        self.cached = False
+
+    @property
+    def complete(self):
+        """All backends and devices are scanned before the deadline
+        """
+        return not self.timedOut
+
+    def __repr__(self):
+        return "ScanResult(devices={}, complete={}, timedOut={})".format(len(self.devices), self.complete,
+                                                                         self.timedOut)
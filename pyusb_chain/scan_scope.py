@@ -0,0 +1,113 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+class ScanScope(object):
+    """Scope of a scan, restricted to the subtree of a port chain and/or the VID/PID set.
+    The devices (and sysfs directories in Linux) out of the scope are skipped before any parsing.
+    """
+    def __init__(self, under=None, vids=None, pids=None):
+        """
+        :param under: the port chain of the subtree, like "1-7" (or sysfs name "1-7.5"), the chain itself is included
+        :param vids: the vendor IDs, like ["0x10C4", "0D28", 0x15A2]
+        :param pids: the product IDs, like ["0xEA60"]
+        """
+        self.under = under.replace(".", "-").strip() if under else None
+        self.vids = frozenset(ScanScope.to_id(vid) for vid in vids) if vids else None
+        self.pids = frozenset(ScanScope.to_id(pid) for pid in pids) if pids else None
+
+    @staticmethod
+    def to_id(value):
+        """Convert the VID/PID to integer
+        :param value: like "0x10C4", "10c4" or 4292
+        :return: the integer ID, None if it's invalid
+        """
+        if value is None:
+            return None
+        if isinstance(value, str):
+            try:
+                return int(value.strip(), 16)
+            except ValueError:
+                return None
+        return int(value)
+
+    @staticmethod
+    def common_chain(chains):
+        """Get the deepest port chain which all chains are under, to scan only the subtree of them
+        :param chains: the port chains, like ["1-7-5", "1-7-7-4:1"]
+        :return: the common port chain, like "1-7", None if they're on the different buses
+        """
+        common = None
+        for chain in chains:
+            segments = chain.split(":")[0].replace(".", "-").split("-")
+            if common is None:
+                common = segments
+                continue
+            length = 0
+            while length < min(len(common), len(segments)) and common[length] == segments[length]:
+                length += 1
+            common = common[:length]
+        return "-".join(common) if common else None
+
+    def is_empty(self):
+        """No restriction, all devices are in the scope
+        """
+        return not self.under and self.vids is None and self.pids is None
+
+    def key(self):
+        """The hashable key of the scope, the scans of the same scope are coalesced
+        """
+        return self.under, self.vids, self.pids
+
+    def match_chain(self, chain):
+        """Check the port chain is in the subtree
+        :param chain: like "1-7-5", "1-7-5:Speaker" or sysfs name "1-7.5"
+        :return: True if it's in the subtree
+        """
+        if not self.under:
+            return True
+        if not chain:
+            return False
+        chain = chain.split(":")[0].replace(".", "-")
+        return chain == self.under or chain.startswith(self.under + "-")
+
+    def may_contain(self, chain):
+        """Check the subtree may be under the hub (or bus) of the port chain, it's used to prune the walk
+        :param chain: the port chain of the hub, like "1" or "1-7"
+        :return: True if the hub should be walked
+        """
+        if not self.under or not chain:
+            return True
+        chain = chain.replace(".", "-")
+        return self.match_chain(chain) or self.under.startswith(chain + "-")
+
+    def match_ids(self, vid, pid):
+        """Check the VID and PID are in the scope
+        :param vid: the vendor ID, like "0x10C4" or 4292
+        :param pid: the product ID
+        :return: True if they are in the scope
+        """
+        if self.vids is not None and ScanScope.to_id(vid) not in self.vids:
+            return False
+        if self.pids is not None and ScanScope.to_id(pid) not in self.pids:
+            return False
+        return True
@@ -0,0 +1,249 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("pyusb_path")
+
+
+class PooledPort(object):
+    """The pooled pyserial handle of one port chain
+    """
+    def __init__(self, chain, port, handle, settings):
+        #: the port chain, like "1-7-5"
+        self.chain = chain
+        #: the port name the handle is opened with, like "COM16" or "/dev/ttyUSB0"
+        self.port = port
+        #: the pyserial handle
+        self.handle = handle
+        #: the serial settings of the handle, like {"baudrate": 115200}
+        self.settings = settings
+        #: the count of the holders, the handle is idle if it's 0
+        self.users = 0
+        #: the time.monotonic() of the last release
+        self.lastUsed = time.monotonic()
+
+
+class SerialPortPool(object):
+    """Pool of the opened pyserial handles keyed by the port chain, the handle is reused by the next acquire()
+    without paying the open/configure latency again. Once the device behind the chain re-enumerates under a new
+    tty/COM name (found in the snapshot of UsbTreeViewTool), or the handle is dead, it's reopened transparently.
+    The idle handles are closed after idleTimeout, and at most maxIdle of them are kept. The concurrent holders of
+    a chain share the handle, so its settings are only changed while nobody holds it.
+
+        pool = SerialPortPool(tool, baudrate=115200, timeout=1)
+        with pool.connection("1-7-5") as ser:
+            ser.write(b"version\\r\\n")
+    """
+    def __init__(self, tool, idleTimeout=300.0, maxIdle=None, rescan=True, serialFactory=None, **settings):
+        """
+        :param tool: the UsbTreeViewTool to get the port of the chain
+        :param idleTimeout: close the handles idle for the seconds, None to keep them
+        :param maxIdle: the max count of the idle handles, the least recently used ones are closed, None for no limit
+        :param rescan: rescan by the tool once the port of the chain is not found or fails to open
+        :param serialFactory: create the opened handle by (port, **settings), default is serial.Serial
+        :param settings: the default serial settings, like baudrate=115200, timeout=1
+        """
+        self.tool = tool
+        self.idleTimeout = idleTimeout
+        self.maxIdle = maxIdle
+        self.rescan = rescan
+        self.serialFactory = serialFactory
+        self.settings = settings
+        #: port chain -> the serial settings of the chain, see configure()
+        self.chainSettings = {}
+        #: port chain -> PooledPort
+        self._ports = {}
+        #: the replaced PooledPort still held by the callers, closed once the last one releases it
+        self._retired = []
+        self._lock = threading.RLock()
+
+    def configure(self, chain, **settings):
+        """Set the serial settings of the chain, they override the default settings of the pool
+        :param chain: the port chain
+        :param settings: like baudrate=9600
+        :return: None
+        """
+        self.chainSettings[chain] = settings
+
+    def acquire(self, chain, **settings):
+        """Get the opened handle of the chain, the pooled one is reused if it's alive and the port is not changed
+        :param chain: the port chain, like "1-7-5" or "1-3-1:2"
+        :param settings: the serial settings of this call, applied to the pooled handle if they are different
+        :return: the pyserial handle, None if the port of the chain is not found or fails to open
+        :raise ValueError: the handle is held by the other callers with the different settings
+        """
+        merged = dict(self.settings)
+        merged.update(self.chainSettings.get(chain, {}))
+        merged.update(settings)
+        with self._lock:
+            handle = self._acquire(chain, merged)
+        if handle is None and self.rescan:
+            # scan without the lock, the callers of the other chains are not blocked by it
+            self.tool.scan()
+            with self._lock:
+                # check the pool again, the chain may be opened by another caller during the scan
+                handle = self._acquire(chain, merged)
+        if handle is None:
+            logger.warning("Cannot open the port of chain: {}!".format(chain))
+        return handle
+
+    def release(self, chain, handle=None):
+        """Return the handle of the chain to the pool, it's kept open for the next acquire()
+        :param chain: the port chain
+        :param handle: the handle got by acquire(), None for the pooled handle of the chain
+        :return: None
+        """
+        with self._lock:
+            pooled = self._ports.get(chain)
+            if handle is not None and (pooled is None or pooled.handle is not handle):
+                # the handle is replaced after it's acquired, close it once the last holder releases it
+                retired = [x for x in self._retired if x.handle is handle]
+                pooled = None
+                if retired:
+                    retired[0].users -= 1
+                    if not retired[0].users:
+                        self._retired.remove(retired[0])
+                        self._close(retired[0])
+            if pooled and pooled.users > 0:
+                pooled.users -= 1
+                pooled.lastUsed = time.monotonic()
+            self.evict_idle()
+
+    @contextmanager
+    def connection(self, chain, **settings):
+        """Acquire the handle of the chain, and release it at the end
+        :param chain: the port chain
+        :param settings: the serial settings, see acquire()
+        :return: the pyserial handle, None if it fails to open
+        """
+        handle = self.acquire(chain, **settings)
+        try:
+            yield handle
+        finally:
+            if handle is not None:
+                self.release(chain, handle)
+
+    def evict_idle(self):
+        """Close the handles idle for idleTimeout, and the least recently used ones over maxIdle
+        :return: the count of the closed handles
+        """
+        with self._lock:
+            now = time.monotonic()
+            idle = sorted((pooled for pooled in self._ports.values() if not pooled.users),
+                          key=lambda x: x.lastUsed)
+            evicted = []
+            if self.idleTimeout is not None:
+                evicted = [pooled for pooled in idle if now - pooled.lastUsed >= self.idleTimeout]
+                idle = idle[len(evicted):]
+            if self.maxIdle is not None and len(idle) > self.maxIdle:
+                evicted.extend(idle[:len(idle) - self.maxIdle])
+            for pooled in evicted:
+                self._close(pooled)
+            return len(evicted)
+
+    def close(self):
+        """Close all handles
+        :return: None
+        """
+        with self._lock:
+            for pooled in list(self._ports.values()) + self._retired:
+                self._close(pooled)
+            self._retired = []
+
+    def __len__(self):
+        return len(self._ports)
+
+    @staticmethod
+    def is_alive(pooled):
+        """Check the pooled handle is still usable, the device node is there (Linux) and the driver answers
+        :param pooled: the PooledPort
+        :return: True if it's alive
+        """
+        handle = pooled.handle
+        if not handle.is_open:
+            return False
+        if os.path.isabs(pooled.port) and not os.path.exists(pooled.port):
+            return False
+        try:
+            handle.in_waiting
+        except (IOError, OSError, ValueError) as e:
+            # serial.SerialException is an IOError
+            logger.debug("Dead port {}: {}".format(pooled.port, e))
+            return False
+        return True
+
+    def _acquire(self, chain, settings):
+        self.evict_idle()
+        pooled = self._ports.get(chain)
+        port = self.tool.get_port_from_chain(chain)
+        if pooled and (pooled.port != port or not self.is_alive(pooled)):
+            logger.info("Reopen the port of {}: {} -> {}".format(chain, pooled.port, port))
+            self._ports.pop(chain)
+            if pooled.users:
+                # the other holders still use it, it's closed by their release()
+                self._retired.append(pooled)
+            else:
+                self._close(pooled)
+            pooled = None
+
+        if pooled:
+            if pooled.settings != settings:
+                if pooled.users:
+                    # the holders share the handle, changing it under them would garble their transfers
+                    raise ValueError("The port of chain {} is held by {} caller(s) with the settings {}".format(
+                        chain, pooled.users, pooled.settings))
+                pooled.handle.apply_settings(settings)
+                pooled.settings = settings
+        else:
+            handle = self._open(port, settings)
+            if handle is None:
+                return None
+            pooled = PooledPort(chain, port, handle, settings)
+            self._ports[chain] = pooled
+        pooled.users += 1
+        return pooled.handle
+
+    def _open(self, port, settings):
+        if not port:
+            return None
+        factory = self.serialFactory
+        if factory is None:
+            from serial import Serial
+            factory = Serial
+        try:
+            return factory(port, **settings)
+        except Exception:
+            logger.exception("Fail to open {}".format(port))
+            return None
+
+    def _close(self, pooled):
+        if self._ports.get(pooled.chain) is pooled:
+            self._ports.pop(pooled.chain)
+        try:
+            pooled.handle.close()
+        except Exception:
+            logger.exception("Fail to close {}".format(pooled.port))
@@ -0,0 +1,165 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import time
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from pyusb_chain.devices.usb_device import USBDevice
+from pyusb_chain.devices.comport_device import COMPortDevice
+from pyusb_chain.devices.audio_device import AudioDevice
+from pyusb_chain.devices.audio_comport_device import AudioCOMPortDevice
+from pyusb_chain.columns import DeviceColumns
+from pyusb_chain.port_name_index import PortNameIndex
+
+
+class UsbSnapshot(object):
+    """Immutable snapshot of one scan, the scanned USB devices and the indexes to search them.
+    A new snapshot is built for each scan and published by replacing the reference in UsbTreeViewTool,
+    so the readers always get a consistent view without locking, even a rescan is running in another thread.
+    """
+    __slots__ = ("devices", "chainIndex", "snIndex", "portIndex", "keyIndex", "nameIndex", "timestamp", "_cache",
+                 "_cacheLock")
+    #: the max count of the cached results of the filters, the least recently used ones are dropped,
+    #: the results without any filter are always kept
+    CACHE_SIZE = 16
+
+    def __init__(self, devices=()):
+        """
+        :param devices: the scanned USB devices, they should not be changed after the snapshot is built
+        """
+        chainIndex = {}
+        snIndex = {}
+        portIndex = {}
+        keyIndex = {}
+        nameIndex = PortNameIndex()
+        for device in devices:
+            if device.portChain:
+                chainIndex.setdefault(device.portChain, device)
+                if isinstance(device, COMPortDevice) and device.comPorts and len(device.comPorts) > 1:
+                    for index, port in enumerate(device.comPorts):
+                        keyIndex.setdefault("{}:{}".format(device.portChain, index), port)
+            if device.sn:
+                snIndex.setdefault(device.sn, device)
+            for port in UsbSnapshot.get_port_names(device):
+                if port:
+                    portIndex.setdefault(port, device)
+                    nameIndex.add(port, device)
+        # the snapshot never changes, the trigram groups are built once instead of by the first search
+        nameIndex.get_groups()
+
+        #: the scanned USB devices (tuple)
+        object.__setattr__(self, "devices", tuple(devices))
+        #: port chain (without ":Speaker", ":0" .etc.) -> USBDevice
+        object.__setattr__(self, "chainIndex", MappingProxyType(chainIndex))
+        #: SN -> USBDevice
+        object.__setattr__(self, "snIndex", MappingProxyType(snIndex))
+        #: port name, like "COM17", "Speakers (4- USB Audio Device)" -> USBDevice
+        object.__setattr__(self, "portIndex", MappingProxyType(portIndex))
+        #: port chain key of the multi COM ports device, like "1-3-1:2" -> port name, like "COM11" or "/dev/ttyUSB2"
+        object.__setattr__(self, "keyIndex", MappingProxyType(keyIndex))
+        #: the normalised and trigram index of the port names, to search the renamed ports
+        object.__setattr__(self, "nameIndex", nameIndex)
+        #: the time when the snapshot is built, from time.time()
+        object.__setattr__(self, "timestamp", time.time())
+        #: the filtered devices and the serialised json by the filters, the snapshot never changes
+        object.__setattr__(self, "_cache", OrderedDict())
+        #: the lock of the cache, the snapshot is shared by the reader threads
+        object.__setattr__(self, "_cacheLock", threading.Lock())
+
+    def __setattr__(self, key, value):
+        raise AttributeError("UsbSnapshot is immutable")
+
+    def __len__(self):
+        return len(self.devices)
+
+    def filter(self, filters=None):
+        """Filter the devices by keywords, the result is cached for the same filters
+        :param filters: keywords to be search (not case sensitive), use ',' to separate multi-keys,
+                        see UsbTreeViewTool.filter()
+        :return: the tuple of the devices
+        """
+        key = ("filter", filters or None)
+        devices = self._get_cached(key)
+        if devices is None:
+            keywords = [f.lower() for f in filters.split(",")] if filters else None
+            devices = tuple(device for device in self.devices
+                            if not keywords or any(f in device.search_text() for f in keywords))
+            self._set_cached(key, devices)
+        return devices
+
+    def to_json(self, filters=None):
+        """Serialise the devices to json, the text is cached for the same filters
+        :param filters: keywords to filter the devices, see filter()
+        :return: the json text
+        """
+        key = ("json", filters or None)
+        text = self._get_cached(key)
+        if text is None:
+            data = {}
+            for device in self.filter(filters):
+                data.update(device.json_data())
+            text = json.dumps(data, indent=4)
+            self._set_cached(key, text)
+        return text
+
+    def _get_cached(self, key):
+        with self._cacheLock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _set_cached(self, key, value):
+        with self._cacheLock:
+            self._cache[key] = value
+            # the least recently used results of the filters are dropped, the ones without filter are at most two
+            filtered = [k for k in self._cache if k[1] is not None]
+            for k in filtered[:max(0, len(filtered) - self.CACHE_SIZE)]:
+                del self._cache[k]
+
+    def to_columns(self, host=None, useNumpy=None):
+        """Export the devices to the columnar table, see DeviceColumns
+        :param host: the host name of the scan
+        :param useNumpy: use the NumPy query layer, None to use it if it's installed
+        :return: the DeviceColumns
+        """
+        columns = DeviceColumns(useNumpy=useNumpy)
+        columns.append(self, host=host)
+        return columns
+
+    @staticmethod
+    def get_port_names(device):
+        """Get the port names which could be used to search the device
+        :param device: the USBDevice
+        :return: the port names list
+        """
+        if isinstance(device, AudioCOMPortDevice):
+            return [device.audioPlaybackName, device.audioRecordName] + list(device.comPorts or [])
+        elif isinstance(device, AudioDevice):
+            return [device.audioPlaybackName, device.audioRecordName]
+        elif isinstance(device, COMPortDevice):
+            return list(device.comPorts or [])
+        elif isinstance(device, USBDevice):
+            return [device.deviceID]
+        return []
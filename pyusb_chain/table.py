@@ -0,0 +1,93 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+from itertools import islice, chain
+
+
+class TableRenderer(object):
+    """Lightweight fixed-width table renderer, the same layout as the "simple" format of tabulate:
+    the header line, the dashed line, and the rows. The numeric columns are right aligned, others left aligned.
+    Rows are written to the stream directly once the column widths are known, the widths are computed from all
+    rows by default, or from the first lookAhead rows to start printing sooner (a longer cell after that
+    is not truncated, it only shifts the rest of its row).
+    """
+    SEPARATOR = "  "
+
+    def __init__(self, headers, stream=None, lookAhead=None):
+        """
+        :param headers: the column headers
+        :param stream: the output stream, default is sys.stdout
+        :param lookAhead: the number of rows to compute the column widths, None for all rows
+        """
+        self.headers = list(headers)
+        self.stream = stream
+        self.lookAhead = lookAhead
+
+    def render(self, rows):
+        """Render the table
+        :param rows: iterable of the rows, each row is a list of cells (None is shown as empty)
+        :return: None
+        """
+        stream = self.stream or sys.stdout
+        rows = iter(rows)
+        if self.lookAhead is None:
+            head = list(rows)
+        else:
+            head = list(islice(rows, self.lookAhead))
+        widths, numeric = self.measure(head)
+
+        stream.write(self.format_line(self.headers, widths, numeric) + "\n")
+        stream.write(self.SEPARATOR.join("-" * width for width in widths) + "\n")
+        for row in chain(head, rows):
+            stream.write(self.format_line(row, widths, numeric) + "\n")
+
+    def measure(self, rows):
+        """Compute the column widths and the numeric columns
+        :param rows: the rows list
+        :return: (widths list, numeric flags list)
+        """
+        widths = [len(header) + 2 for header in self.headers]
+        numeric = [True] * len(self.headers)
+        hasValue = [False] * len(self.headers)
+        for row in rows:
+            for index, cell in enumerate(row[:len(self.headers)]):
+                if cell is None or "" == cell:
+                    continue
+                hasValue[index] = True
+                if not isinstance(cell, (int, float)) or isinstance(cell, bool):
+                    numeric[index] = False
+                widths[index] = max(widths[index], len(u"{}".format(cell)))
+        numeric = [isNumeric and used for isNumeric, used in zip(numeric, hasValue)]
+        return widths, numeric
+
+    @staticmethod
+    def format_line(cells, widths, numeric):
+        texts = []
+        for index, width in enumerate(widths):
+            cell = cells[index] if index < len(cells) else None
+            text = u"" if cell is None else u"{}".format(cell)
+            if numeric[index]:
+                texts.append(text.rjust(width))
+            else:
+                texts.append(text.ljust(width))
+        return TableRenderer.SEPARATOR.join(texts).rstrip()
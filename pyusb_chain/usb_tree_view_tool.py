@@ -24,10 +24,14 @@ import os
 import uuid
 import logging
 import re
+import time
+import socket
+import tempfile
+import warnings
+import threading
 import subprocess
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from sys import platform
-if "win32" != platform:
-    from serial.tools import list_ports
 import xml.etree.ElementTree as ET
 from pyusb_chain.devices.usb_device import USBDevice
 from pyusb_chain.devices.comport_device import COMPortDevice
@@ -35,7 +39,20 @@ from pyusb_chain.devices.audio_device import AudioDevice
 from pyusb_chain.devices.audio_comport_device import AudioCOMPortDevice
 from pyusb_chain.devices.altera_device import AlteraUSBBlaster
 from pyusb_chain.devices.dsc_fsl_mc56_board import DSCFSLMC56Board
-from pyusb_chain.utility import get_values
+from pyusb_chain.backends import CompositeScanner, UsbTreeViewBackend, LinuxSerialBackend, LinuxAudioBackend
+from pyusb_chain.columns import get_device_ids
+from pyusb_chain.descriptors import DescriptorReader
+from pyusb_chain.exporter import UsbTreeViewExporter
+from pyusb_chain.fingerprint import sysfs_fingerprint
+from pyusb_chain.inventory import RigInventory
+from pyusb_chain.journal import HotplugJournal
+from pyusb_chain.linux_audio import LinuxAudioScanner
+from pyusb_chain.linux_serial import LinuxSerialScanner
+from pyusb_chain.probe import PortProber, get_serial_ports
+from pyusb_chain.scan_result import ScanResult
+from pyusb_chain.scan_scope import ScanScope
+from pyusb_chain.snapshot import UsbSnapshot
+from pyusb_chain.utility import get_values, Deadline, call_with_timeout
 
 logger = logging.getLogger("pyusb_path")
 
@@ -48,17 +65,157 @@ class UsbTreeViewTool(object):
 
     VID_DSC_FSL_MC56 = "0x15A2"
     PID_DSC_FSL_MC56 = "0x005E"
-
-    def __init__(self):
+    #: to find the DSC FSL boards in the Device ID without parsing
+    DEVICE_ID_DSC_FSL_MC56 = "VID_15A2&PID_005E"
+
+    #: backend to export and parse the XML report of UsbTreeView.exe
+    BACKEND_USBTREEVIEW = "usbtreeview"
+    #: backend to list the USB serial ports by pyserial
+    BACKEND_SERIAL = "serial"
+    #: backend to discover the USB audio cards by /proc/asound and sysfs in Linux
+    BACKEND_AUDIO = "audio"
+    #: the scan in flight which is joined but not finished before the timeout
+    INFLIGHT_SCAN = "inflight"
+
+    def __init__(self, exportCommand=None):
+        """
+        :param exportCommand: the command to export the XML report instead of UsbTreeView.exe, like a stub script
+                              ["python", "stub_usbtreeview.py"], it's used in all platforms once it's set
+        """
         self.currentPath = os.path.dirname(os.path.abspath(__file__))
 
-        #: Store the scanned all connected USB devices (not including USB hubs)
-        self.usbDevices = []
+        #: The snapshot of the last scan, it's replaced (never changed) by each scan, see self.usbDevices
+        self._snapshot = UsbSnapshot()
+        #: serializes the writers of the snapshot, the scoped scan merges its devices into the current one
+        self._publishLock = threading.RLock()
         self.root = None
 
+        #: The exporter backend to get the XML report, None to use pyserial in Linux
+        self.exporter = None
+
         if "win32" == platform:
             #: The UsbTreeView.exe location
             self.tool = os.path.join(self.currentPath, "UsbTreeView.exe")
+            self.exporter = UsbTreeViewExporter(self.tool)
+        if exportCommand:
+            self.exporter = UsbTreeViewExporter(exportCommand)
+
+        #: The scanners of USB serial ports and audio cards in Linux, set the roots of them to scan a fake tree
+        self.serialScanner = None
+        self.audioScanner = None
+        if "win32" != platform:
+            self.serialScanner = LinuxSerialScanner()
+            self.audioScanner = LinuxAudioScanner()
+
+        #: single-flight state of scan(): the futures in flight by the scope key,
+        #: and (time.monotonic(), scope key, future) of the last one
+        self._scanLock = threading.Lock()
+        self._inflight = {}
+        self._lastScan = None
+
+        #: skip parsing if the topology fingerprint is the same as the last complete scan (of the same scope)
+        self.skipUnchanged = True
+        #: (scope key, fingerprint, ScanResult, UsbSnapshot) of the last complete scan
+        self._lastFingerprint = None
+
+        #: time budget in seconds of each backend, like {"usbtreeview": 10}, it never exceeds the scan timeout
+        self.backendBudgets = {}
+
+        #: the backends run concurrently by each scan, only the available ones are run: the XML report if the exporter
+        #: is set, otherwise the USB serial ports and audio cards, see register_backend
+        self.scanner = CompositeScanner([UsbTreeViewBackend(self), LinuxSerialBackend(self), LinuxAudioBackend(self)])
+
+        #: don't print the scanning message, like in the live view
+        self.quiet = False
+
+        #: the bounded journal of the attach/detach events, fed by the complete rescans
+        self.journal = HotplugJournal()
+
+        #: the reader of the sysfs descriptors (Linux) cached by busnum/devnum, see USBDevice.interfaces
+        self.descriptorReader = None
+
+        #: the RigInventory of the expected devices, see load_inventory
+        self.inventory = None
+        #: (snapshot, alias index) compiled from the inventory, rebuilt once for each new snapshot
+        self._aliasIndex = None
+
+    @property
+    def snapshot(self):
+        """The snapshot of the last scan, get it once to search in a consistent view while rescanning
+        """
+        return self._snapshot
+
+    @property
+    def usbDevices(self):
+        """Store the scanned all connected USB devices (not including USB hubs)
+        """
+        return self._snapshot.devices
+
+    def publish(self, devices):
+        """Build the new snapshot of the scanned devices, and publish it by replacing the reference,
+        the readers see either the old snapshot or the new one, never the half built one.
+        :param devices: the scanned USB devices
+        :return: the new UsbSnapshot
+        """
+        snapshot = UsbSnapshot(devices)
+        with self._publishLock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def publish_scope(self, devices, scope=None):
+        """Publish the devices of the scoped scan by replacing the devices in the scope of the current snapshot,
+        the devices out of the scope are kept, so a scan of the subtree never drops the other devices
+        :param devices: the scanned USB devices in the scope
+        :param scope: the ScanScope of the scan, None (or the empty one) to replace all devices like publish()
+        :return: the new UsbSnapshot
+        """
+        if scope is None or scope.is_empty():
+            return self.publish(devices)
+        # the rescanned devices take the places of the old ones of the same port chain, the new ones take the place
+        # of the first device in the scope
+        chainDevices = {}
+        for device in devices:
+            chainDevices.setdefault(device.portChain, []).append(device)
+        with self._publishLock:
+            merged = []
+            position = None
+            for device in self._snapshot.devices:
+                if not scope.match_chain(device.portChain) or not scope.match_ids(*get_device_ids(device)):
+                    merged.append(device)
+                    continue
+                if position is None:
+                    position = len(merged)
+                if device.portChain:
+                    merged.extend(chainDevices.pop(device.portChain, []))
+            added = [device for device in devices if device.portChain in chainDevices]
+            if position is None:
+                position = len(merged)
+            return self.publish(merged[:position] + added + merged[position:])
+
+    def to_columns(self, host=None, useNumpy=None):
+        """Export the devices of the last scan to the columnar table, see DeviceColumns
+        :param host: the host name of the scan, default is the current host
+        :param useNumpy: use the NumPy query layer, None to use it if it's installed
+        :return: the DeviceColumns
+        """
+        return self._snapshot.to_columns(host=host or socket.gethostname(), useNumpy=useNumpy)
+
+    def register_backend(self, backend):
+        """Register the custom scanner backend, it's run concurrently with the others in each scan, and its devices
+        are merged by the port chain, see ScannerBackend
+        :param backend: the ScannerBackend, the registered one of the same name is replaced
+        :return: None
+        """
+        self.scanner.register(backend)
+
+    def fingerprint(self):
+        """Compute the cheap topology fingerprint without exporting or parsing, it's only available in Linux by sysfs,
+        for the XML report of UsbTreeView.exe, the fingerprint is the hash of the exported report, see scan()
+        :return: the fingerprint, None if it's not available
+        """
+        if self.exporter or not self.serialScanner:
+            return None
+        return sysfs_fingerprint(self.serialScanner.sysfsRoot)
 
     def start_gui(self):
         """Start the UsbTreeView.exe directly
@@ -70,86 +227,278 @@ class UsbTreeViewTool(object):
 
     def export_xml(self):
         """Use UsbTreeView.exe command line to export the XML format of all USB devices information in current PC.
+        Deprecated, use self.exporter.export() which removes the report when it has been consumed.
+        The report is exported into the temp directory of the exporter (not the current working directory),
+        the caller owns the file and should remove it.
         :return: the exported file name
         """
-        if "win32" != platform:
+        warnings.warn("export_xml() is deprecated, use exporter.export() instead", DeprecationWarning, stacklevel=2)
+        if not self.exporter:
             return
         randomUUID = uuid.uuid4()
-        exportFile = "export_{}.xml".format(randomUUID)
+        exportFile = os.path.join(self.exporter.get_temp_root() or tempfile.gettempdir(),
+                                  "export_{}.xml".format(randomUUID))
         # export xml file
-        cmd = "\"{}\" /X={}".format(self.tool, exportFile)
-        os.system(cmd)
+        if not self.exporter.run(exportFile):
+            return
         return exportFile
 
-    def scan(self):
-        """First export the XML file, then parse the all scanned USB devices.
-        The information will store in self.usbDevices.
-        :return: None
+    def scan(self, timeout=None, max_age=None, under=None, vids=None, pids=None):
+        """First export the XML report into a private temp directory, then parse the all scanned USB devices.
+        The information will be published as a new snapshot, see self.snapshot and self.usbDevices. The scoped scan
+        only replaces the devices in its scope, the other devices of the current snapshot are kept.
+        The concurrent calls are coalesced, the callers arrive while a scan is in flight wait for it and share
+        its result, only one UsbTreeView.exe is running at the same time.
+        :param timeout: the overall deadline in seconds, None to wait until all devices are scanned.
+                        Each backend is also limited by its time budget in self.backendBudgets.
+        :param max_age: accept the result of the last scan finished in max_age milliseconds, instead of a new scan
+        :param under: only scan the subtree of the port chain, like "1-7"
+        :param vids: only scan the devices of the vendor IDs, like ["0x10C4"]
+        :param pids: only scan the devices of the product IDs, like ["0xEA60"]
+        :return: the ScanResult, it's partial (complete is False) if any backend or device timed out
         """
-        print("Scanning all USB devices...")
-        exportFile = None
+        scope = ScanScope(under, vids, pids)
+        future, leader = self._join_scan(max_age, scope)
+        if leader:
+            self._run_scan(future, timeout, scope)
         try:
-            if "win32" == platform:
-                exportFile = self.export_xml()
-                self.parse(exportFile)
-            else:
-                self.parse_linux()
-        finally:
-            # remove temp export file
-            if "win32" == platform:
-                if os.path.exists(exportFile):
-                    os.remove(exportFile)
-
-    def parse(self, exportFile):
-        """Parse the XML file that exported by UsbTreeView.exe
-        :param exportFile: the XML file that exported by UsbTreeView.exe
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.warning("Scan in flight is not finished in {} seconds".format(timeout))
+            return ScanResult(list(self.usbDevices), timedOut=[self.INFLIGHT_SCAN])
+
+    def scan_async(self, timeout=None, max_age=None, under=None, vids=None, pids=None):
+        """Scan in a background thread, the current snapshot is still available until the new one is published.
+        The call joins the scan in flight if there is, see scan(). For coroutines, use asyncio.wrap_future() to await.
+        :param timeout: the overall deadline in seconds, see scan()
+        :param max_age: accept the result of the last scan finished in max_age milliseconds, see scan()
+        :param under: only scan the subtree of the port chain, see scan()
+        :param vids: only scan the devices of the vendor IDs, see scan()
+        :param pids: only scan the devices of the product IDs, see scan()
+        :return: the concurrent.futures.Future of the ScanResult
+        """
+        scope = ScanScope(under, vids, pids)
+        future, leader = self._join_scan(max_age, scope)
+        if leader:
+            thread = threading.Thread(target=self._run_scan, args=(future, timeout, scope),
+                                      name="pyusb_chain_scan")
+            thread.daemon = True
+            thread.start()
+        return future
+
+    def _join_scan(self, max_age=None, scope=None, lead=True):
+        """Get the future of the scan (of the same scope) to wait for: the last finished one within max_age,
+        the one in flight, or a new one which should be run by the caller (the leader)
+        :param lead: register the new scan in flight, otherwise the future is None if there's no scan to join
+        :return: (future, leader)
+        """
+        key = scope.key() if scope else None
+        with self._scanLock:
+            if max_age is not None and self._lastScan:
+                finishedAt, lastKey, future = self._lastScan
+                if lastKey == key and (time.monotonic() - finishedAt) * 1000 <= max_age:
+                    return future, False
+            if key in self._inflight:
+                return self._inflight[key], False
+            if not lead:
+                return None, True
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._inflight[key] = future
+            return future, True
+
+    def _run_scan(self, future, timeout, scope=None):
+        try:
+            result = self._scan(timeout, scope)
+        except BaseException as e:
+            self._complete_scan(future, scope, error=e)
+            return
+        self._complete_scan(future, scope, result)
+
+    def _complete_scan(self, future, scope, result=None, error=None):
+        """Finish the scan in flight, the callers joined it get the result (or the error)
+        :param future: the Future of the scan
+        :param scope: the ScanScope of the scan
+        :param result: the ScanResult
+        :param error: the exception raised by the scan, the result is ignored if it's set
         :return: None
         """
-        if "win32" != platform:
+        key = scope.key() if scope else None
+        with self._scanLock:
+            self._inflight.pop(key, None)
+            if error is None:
+                self._lastScan = (time.monotonic(), key, future)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def _scan(self, timeout, scope=None):
+        if scope is not None and scope.is_empty():
+            scope = None
+        result = ScanResult()
+        result.devices = list(self._iter_scan(Deadline(timeout), result, scope))
+        return self._finish_scan(result, scope)
+
+    def _iter_scan(self, deadline, result, scope=None, lazy=False):
+        """Run the backends and get the devices as a stream, the same pipeline of scan() and iter_devices().
+        The devices of the last complete scan are yielded if the topology fingerprint is not changed.
+        :param deadline: the overall Deadline
+        :param result: the ScanResult to record the timed out items, the fingerprint and cached,
+                       the devices are not added to it
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :param lazy: the caller may stop at any device, see CompositeScanner.iter_scan()
+        :return: the generator of the devices
+        """
+        if not self.quiet:
+            print("Scanning all USB devices...")
+        fingerprint = self.fingerprint() if self.scanner.fingerprinted() else None
+        last = self._lastFingerprint
+        if self.skipUnchanged and fingerprint and last and last[0] == (scope.key() if scope else None) \
+                and last[1] == fingerprint:
+            result.fingerprint = fingerprint
+            result.cached = True
+            for device in last[2].devices:
+                yield device
             return
-
-        self.load(exportFile)
-        if not self.root:
+        for device in self.scanner.iter_scan(deadline, scope, self.backendBudgets, result, lazy):
+            yield device
+        if not result.fingerprint:
+            result.fingerprint = fingerprint
+
+    def _finish_scan(self, result, scope=None):
+        """Publish the devices of the scan as a new snapshot (the scoped one is merged into the current snapshot,
+        see publish_scope), the complete scan updates the journal and the fingerprint to skip the unchanged next one
+        :param result: the ScanResult of all devices of _iter_scan()
+        :param scope: the ScanScope of the scan
+        :return: the ScanResult
+        """
+        if result.cached:
+            cached = self._get_unchanged(scope, result.fingerprint)
+            if cached:
+                return cached
+            result.cached = False
+        if not result.complete:
+            # the fingerprint of the partial scan never matches the next one, to scan the missed devices again
+            result.fingerprint = None
+            logger.warning("Scan timed out, partial result without: {}".format(", ".join(result.timedOut)))
+        snapshot = self.publish_scope(result.devices, scope)
+        if result.complete:
+            self.journal.update(result.devices, scope=scope)
+            if scope is None and self.descriptorReader is not None:
+                # drop the cached descriptors of the devices missing from the full scan
+                self.descriptorReader.prune()
+        if result.complete and result.fingerprint:
+            self._lastFingerprint = (scope.key() if scope else None, result.fingerprint, result, snapshot)
+        return result
+
+    def _get_unchanged(self, scope, fingerprint):
+        """Get the result of the last complete scan if the topology fingerprint is not changed,
+        the snapshot of it is published again (the devices of the scoped one are merged into the current snapshot)
+        :return: the cached ScanResult, None if it's changed
+        """
+        last = self._lastFingerprint
+        if not self.skipUnchanged or not fingerprint or not last:
+            return None
+        key, lastFingerprint, lastResult, snapshot = last
+        if key != (scope.key() if scope else None) or lastFingerprint != fingerprint:
+            return None
+        logger.debug("USB topology is not changed: {}".format(fingerprint))
+        if key is None:
+            with self._publishLock:
+                self._snapshot = snapshot
+        else:
+            self.publish_scope(lastResult.devices, scope)
+        result = ScanResult(lastResult.devices)
+        result.fingerprint = fingerprint
+        result.cached = True
+        return result
+
+    def parse(self, exportFile, deadline=None, scope=None):
+        """Parse the XML file that exported by UsbTreeView.exe, and publish the devices as a new snapshot
+        (the devices of the scope are merged into the current snapshot, see publish_scope)
+        :param exportFile: the XML file (or the opened file object) that exported by UsbTreeView.exe
+        :param deadline: the Deadline to stop parsing, the devices not parsed are recorded as timed out
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :return: the ScanResult
+        """
+        result = ScanResult()
+        self._parse_xml(exportFile, deadline, result, scope)
+        self.publish_scope(result.devices, scope)
+        return result
+
+    def _parse_xml(self, exportFile, deadline, result, scope=None):
+        root = self.load(exportFile)
+        if not root:
             logger.error("loading failure to get empty root")
             return
 
+        nodes = ((tag.get('text'), tag[0].text if len(tag) else None) for tag in root.iter('node'))
+        result.devices.extend(self._iter_xml_devices(nodes, deadline, result, scope))
+
+    @staticmethod
+    def iter_xml_nodes(exportFile):
+        """Parse the XML report incrementally, get each node as soon as its information text is parsed,
+        before the nested nodes of it
+        :param exportFile: the XML file (or the opened file object) that exported by UsbTreeView.exe
+        :return: the generator of (node text, information text)
+        """
+        stack = []
+        for event, elem in ET.iterparse(exportFile, events=("start", "end")):
+            if "start" == event:
+                stack.append(elem)
+                continue
+            stack.pop()
+            if "text" == elem.tag and stack and "node" == stack[-1].tag and stack[-1][0] is elem:
+                yield stack[-1].get('text'), elem.text
+
+    def _iter_xml_devices(self, nodes, deadline, result, scope=None, deferRanked=False):
+        """Classify and parse the devices of the nodes lazily, in the order of the nodes
+        :param nodes: the (node text, information text) iterable
+        :param deadline: the Deadline to stop parsing, the devices not parsed are recorded as timed out
+        :param result: the ScanResult to record the timed out devices
+        :param scope: the ScanScope to skip the devices out of it, None for all devices
+        :param deferRanked: the Altera blasters and DSC boards are numbered by all of them, get them at the end
+                            with the final names instead of in the order of the nodes
+        :return: the generator of the parsed devices
+        """
         alteraDevices = []
         DSCFSLDevices = []
-        for tag in self.root.iter('node'):
-            name = tag.get('text')
+        deferred = []
+        for name, info in nodes:
             if ":" in name:
                 usbHubReg = re.compile(r"Generic .* Hub")
                 if usbHubReg.search(name):
                     continue
-                info = tag[0].text
+                chain = name.split(":")[0].strip("[] ")
+                # the Altera blasters and DSC boards out of the scope are still parsed to number them in the tree
+                inScope = scope is None or scope.match_chain(chain)
+                ranked = "Altera USB-Blaster" in name or self.DEVICE_ID_DSC_FSL_MC56 in info
+                if not inScope and not ranked:
+                    continue
+                if deadline and deadline.expired():
+                    if inScope:
+                        result.timedOut.append("{}:{}".format(self.BACKEND_USBTREEVIEW, chain))
+                    continue
 
                 vendorID, productID = self.get_vid_pid(info)
+                if inScope and scope is not None and not scope.match_ids(vendorID, productID):
+                    inScope = False
+                    if not ranked:
+                        continue
 
-                usbSerialDeviceReg = re.compile(r"COM\d")
-                usbAudioDeviceReg = re.compile("Audio")
-                usbAudioDeviceInfoReg = re.compile("Class\s*:\s*AudioEndpoint")
-                usbAlteraUSBBlasterReq = re.compile("Altera USB-Blaster")
-
-                if self.VID_DSC_FSL_MC56 == vendorID and self.PID_DSC_FSL_MC56 == productID:
-                    usbDevice = DSCFSLMC56Board(name, info)
+                usbDevice = self.classify_node(name, info, vendorID, productID)
+                if isinstance(usbDevice, DSCFSLMC56Board):
                     DSCFSLDevices.append(usbDevice)
-                elif usbSerialDeviceReg.search(name):
-                    if usbAudioDeviceReg.search(name) or usbAudioDeviceInfoReg.search(info):
-                        usbDevice = AudioCOMPortDevice(name, info)
-                    else:
-                        usbDevice = COMPortDevice(name, info)
-                elif usbAudioDeviceReg.search(name) or usbAudioDeviceInfoReg.search(info):
-                    if usbSerialDeviceReg.search(name):
-                        usbDevice = AudioCOMPortDevice(name, info)
-                    else:
-                        usbDevice = AudioDevice(name, info)
-                elif usbAlteraUSBBlasterReq.search(name):
-                    usbDevice = AlteraUSBBlaster(name, info)
+                elif isinstance(usbDevice, AlteraUSBBlaster):
                     alteraDevices.append(usbDevice)
-                else:
-                    usbDevice = USBDevice(name, info)
                 usbDevice.parse()
-                self.usbDevices.append(usbDevice)
+                if not inScope:
+                    continue
+                if deferRanked and isinstance(usbDevice, (DSCFSLMC56Board, AlteraUSBBlaster)):
+                    deferred.append(usbDevice)
+                else:
+                    yield usbDevice
 
         # reorder the alter CPLD downloaders
         if alteraDevices:
@@ -168,8 +517,39 @@ class UsbTreeViewTool(object):
                 device.deviceName = "{} - [{}]".format(device.deviceName, device.downloadSN)
                 index = index + 1
 
+        for device in deferred:
+            yield device
+
+    def classify_node(self, name, info, vendorID=None, productID=None):
+        """Create the device object of the XML node by its name and information, not parsed yet
+        :param name: the node text, like "[1-7-5] : Silicon Labs CP210x USB to UART Bridge (COM16)"
+        :param info: the information text of the node
+        :param vendorID: the vendor ID of the information, like "0x15A2"
+        :param productID: the product ID of the information, like "0x005E"
+        :return: the USBDevice, COMPortDevice, AudioDevice .etc
+        """
+        usbSerialDeviceReg = re.compile(r"COM\d")
+        usbAudioDeviceReg = re.compile("Audio")
+        usbAudioDeviceInfoReg = re.compile(r"Class\s*:\s*AudioEndpoint")
+        usbAlteraUSBBlasterReq = re.compile("Altera USB-Blaster")
+
+        if self.VID_DSC_FSL_MC56 == vendorID and self.PID_DSC_FSL_MC56 == productID:
+            return DSCFSLMC56Board(name, info)
+        elif usbSerialDeviceReg.search(name):
+            if usbAudioDeviceReg.search(name) or usbAudioDeviceInfoReg.search(info):
+                return AudioCOMPortDevice(name, info)
+            return COMPortDevice(name, info)
+        elif usbAudioDeviceReg.search(name) or usbAudioDeviceInfoReg.search(info):
+            if usbSerialDeviceReg.search(name):
+                return AudioCOMPortDevice(name, info)
+            return AudioDevice(name, info)
+        elif usbAlteraUSBBlasterReq.search(name):
+            return AlteraUSBBlaster(name, info)
+        return USBDevice(name, info)
+
     def load(self, exportFile):
         self.root = ET.parse(exportFile).getroot()
+        return self.root
 
     @staticmethod
     def get_vid_pid(info):
@@ -184,18 +564,208 @@ class UsbTreeViewTool(object):
 
         return vendorID, productID
 
-    def parse_linux(self):
-        """Parse the USB serial by pyserial, note that it only support VCOM usb devices
-            :return: None
+    def parse_linux(self, deadline=None, scope=None):
+        """Parse the USB serial by pyserial and the USB audio cards by /proc/asound and sysfs,
+        and publish the devices as a new snapshot (the devices of the scope are merged, see publish_scope)
+            :param deadline: the Deadline to stop listing and parsing, the ports not parsed are recorded as timed out
+            :param scope: the ScanScope to prune the sysfs directories out of it, None for all devices
+            :return: the ScanResult
         """
-        if "win32" == platform:
+        result = CompositeScanner([LinuxSerialBackend(self), LinuxAudioBackend(self)]).scan(deadline, scope)
+        self.publish_scope(result.devices, scope)
+        return result
+
+    def _iter_serial(self, deadline, result, scope=None, lazy=False):
+        """List the ttys and read them device by device (each read may block on a wedged device), the ttys of the
+        same USB device are grouped to one COMPortDevice
+        :param deadline: the Deadline of the serial backend, None for no deadline
+        :param result: the ScanResult to record the timed out ports
+        :param scope: the ScanScope to prune the ttys out of it, None for all ports
+        :param lazy: yield the ports of each sysfs device once they're read, otherwise all ports are grouped
+                     by their locations at the end
+        :return: the generator of the COMPortDevice
+        """
+        if not self.serialScanner:
             return
-        ports = list_ports.comports()
+        scanner = self.serialScanner
+        deadline = deadline or Deadline()
+        finished, ttys = call_with_timeout(lambda: scanner.list_ttys(scope), deadline.remaining())
+        if not finished:
+            result.timedOut.append(self.BACKEND_SERIAL)
+            return
+        chainTtys = {}
+        chains = []
+        for chain, device in ttys:
+            if chain not in chainTtys:
+                chainTtys[chain] = []
+                chains.append(chain)
+            chainTtys[chain].append(device)
+
+        reader = self.get_descriptor_reader(scanner.sysfsRoot)
+        ports = []
+        for chain in chains:
+            if lazy:
+                ports = []
+            for device in chainTtys[chain]:
+                if deadline.expired():
+                    result.timedOut.append("{}:{}".format(self.BACKEND_SERIAL, device))
+                    continue
+                finished, port = call_with_timeout(lambda: scanner.get_port(device, scope), deadline.remaining())
+                if not finished:
+                    result.timedOut.append("{}:{}".format(self.BACKEND_SERIAL, device))
+                elif port is not None:
+                    ports.append(port)
+            if lazy:
+                for group in self.group_serial_ports(ports):
+                    yield self._make_serial_device(group, reader)
+        if not lazy:
+            for group in self.group_serial_ports(ports):
+                yield self._make_serial_device(group, reader)
+
+    def _iter_audio(self, deadline, result, scope=None):
+        """Discover the USB audio cards, see LinuxAudioBackend to merge them with the VCOMs of the same USB devices
+        :param deadline: the Deadline of the audio backend, None for no deadline
+        :param result: the ScanResult to record the timed out cards
+        :param scope: the ScanScope to prune the cards out of it, None for all cards
+        :return: the generator of the AudioDevice
+        """
+        if not self.audioScanner:
+            return
+        timedOut = []
+        finished, cards = call_with_timeout(lambda: self.audioScanner.scan(deadline, timedOut, scope),
+                                            deadline.remaining() if deadline else None)
+        if not finished:
+            result.timedOut.append(self.BACKEND_AUDIO)
+            return
+        result.timedOut.extend(timedOut)
+        reader = self.get_descriptor_reader(self.audioScanner.sysfsRoot)
+        for card in cards:
+            yield self._make_audio_device(card, reader)
+
+    @staticmethod
+    def _make_serial_device(group, reader):
+        usbDevice = COMPortDevice(group[0].description, group[0])
+        usbDevice.parse()
+        if len(group) > 1:
+            # the ports of a multi-interface device, like i.MX MPU boards, are keyed by "chain:index"
+            usbDevice.comPorts = [port.device for port in group]
+        if usbDevice.portChain:
+            usbDevice.descriptors = reader.get(usbDevice.portChain)
+        return usbDevice
+
+    @staticmethod
+    def _make_audio_device(card, reader):
+        usbDevice = AudioDevice(card.description, card)
+        usbDevice.parse()
+        if usbDevice.portChain:
+            usbDevice.descriptors = reader.get(usbDevice.portChain)
+        return usbDevice
+
+    @staticmethod
+    def group_serial_ports(ports):
+        """Group the serial ports of the same USB device (the ttys of its interfaces) in one pass, the ports of each
+        group are ordered by the bInterfaceNumber, like the Windows COM ports of the same device
+        :param ports: the port information list, like pyserial ListPortInfo with location "1-3.1:1.2"
+        :return: the list of the port groups, in the order of the first port of each group
+        """
+        groups = []
+        chainGroups = {}
         for port in ports:
-            if port.pid:
-                usbDevice = COMPortDevice(port.description, port)
-                usbDevice.parse()
-                self.usbDevices.append(usbDevice)
+            chain, _, interface = (port.location or "").partition(":")
+            try:
+                number = int(interface.split(".")[-1]) if interface else 0
+            except ValueError:
+                number = 0
+            group = chainGroups.get(chain) if chain else None
+            if group is None:
+                group = []
+                groups.append(group)
+                if chain:
+                    chainGroups[chain] = group
+            group.append((number, port))
+        return [[port for _, port in sorted(group, key=lambda item: (item[0], item[1].device))] for group in groups]
+
+    def iter_devices(self, filter=None, timeout=None, under=None, vids=None, pids=None):
+        """Scan the devices lazily, each device is yielded as soon as it's enumerated, classified, parsed and matched,
+        so the caller can stop at the first wanted one without waiting for the others (the XML report is parsed
+        incrementally, the ttys are read device by device in Linux). It runs the same backends as scan(), and joins
+        the scan in flight of the same scope if there is. The lazy scan itself is never joined by the others, as its
+        caller may hold it for long: the complete iteration is published as a new snapshot like scan(),
+        the stopped one is not.
+        The Altera blasters and DSC boards are yielded at the end, as they're numbered by all of them.
+        :param filter: the keywords like filter() (not case sensitive, ',' to separate multi-keys),
+                       or the function to check the device, like lambda device: device.sn == "DEC3D6"
+        :param timeout: the overall deadline in seconds, the devices not parsed before it are skipped
+        :param under: only scan the subtree of the port chain, see scan()
+        :param vids: only scan the devices of the vendor IDs, see scan()
+        :param pids: only scan the devices of the product IDs, see scan()
+        :return: the generator of the matched devices
+        """
+        if filter is None:
+            match = None
+        elif callable(filter):
+            match = filter
+        else:
+            keywords = [f.lower() for f in filter.split(",")]
+
+            def match(device):
+                return any(f in device.search_text() for f in keywords)
+        scope = ScanScope(under, vids, pids)
+        future, leader = self._join_scan(scope=scope, lead=False)
+        if not leader:
+            try:
+                result = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                logger.warning("Scan in flight is not finished in {} seconds".format(timeout))
+                return
+            for device in result.devices:
+                if match is None or match(device):
+                    yield device
+            return
+
+        scanScope = None if scope.is_empty() else scope
+        result = ScanResult()
+        scanned = []
+        devices = self._iter_scan(Deadline(timeout), result, scanScope, lazy=True)
+        try:
+            for device in devices:
+                scanned.append(device)
+                if match is None or match(device):
+                    yield device
+        finally:
+            # the backends are stopped if the caller stops early
+            devices.close()
+        result.devices = scanned
+        self._finish_scan(result, scanScope)
+
+    def find_first(self, filter=None, timeout=None, under=None, vids=None, pids=None):
+        """Find the first matched device, the scan is stopped once it's found, see iter_devices()
+        :param filter: the keywords or the function to check the device, see iter_devices()
+        :param timeout: the overall deadline in seconds
+        :param under: only scan the subtree of the port chain, see scan()
+        :param vids: only scan the devices of the vendor IDs, see scan()
+        :param pids: only scan the devices of the product IDs, see scan()
+        :return: the UsbDevice (None if it's not found)
+        """
+        devices = self.iter_devices(filter, timeout=timeout, under=under, vids=vids, pids=pids)
+        try:
+            for device in devices:
+                return device
+        finally:
+            # clean up the exported report
+            devices.close()
+        logger.warning("Cannot find USB device by: {}!".format(filter))
+        return None
+
+    def get_descriptor_reader(self, sysfsRoot="/sys"):
+        """Get the reader of the sysfs descriptors, the cached descriptors are kept while the sysfs root is the same
+        :param sysfsRoot: the sysfs root of the scanner
+        :return: the DescriptorReader
+        """
+        reader = self.descriptorReader
+        if reader is None or reader.sysfsRoot != sysfsRoot:
+            reader = self.descriptorReader = DescriptorReader(sysfsRoot)
+        return reader
 
     def get_from_sn(self, sn):
         """Get the usb device by the SN if the devcie has the SN.
@@ -206,9 +776,9 @@ class UsbTreeViewTool(object):
             return None
 
         snKey = sn.split(":")[0]
-        for device in self.usbDevices:
-            if snKey == device.sn:
-                return device
+        device = self._snapshot.snIndex.get(snKey)
+        if device:
+            return device
         logger.warning("Cannot get USB device from sn: {}!".format(sn))
         return None
 
@@ -222,44 +792,56 @@ class UsbTreeViewTool(object):
             return None
 
         chainKey = chain.split(":")[0]
-        for device in self.usbDevices:
-            if chainKey == device.portChain:
-                return device
+        device = self._snapshot.chainIndex.get(chainKey)
+        if device:
+            return device
         logger.warning("Cannot get USB device from chain: {}!".format(chain))
         return None
 
-    def get_from_port(self, port):
+    def get_from_port(self, port, fuzzy=False):
         """Get the usb device by the port.
         :param port: the port name to search, like "COM17", "Speakers (4- USB Audio Device)"
+        :param fuzzy: search the best candidate if the port name is not matched exactly, like the audio endpoint is
+                      renamed to "Speakers (5- USB Audio Device)" after replug, see get_port_candidates
         :return: the UsbDevice (None if it's not found)
         """
         if not port:
             return None
 
-        for device in self.usbDevices:
-            if isinstance(device, AudioCOMPortDevice):
-                if port == device.audioPlaybackName or port == device.audioRecordName or port in device.comPorts:
-                    return device
-            elif isinstance(device, AudioDevice):
-                if port == device.audioPlaybackName or port == device.audioRecordName:
-                    return device
-            elif isinstance(device, COMPortDevice):
-                if port in device.comPorts:
-                    return device
-            elif isinstance(device, USBDevice):
-                if port == device.deviceID:
-                    return device
-
+        device = self._snapshot.portIndex.get(port)
+        if device:
+            return device
+        if fuzzy:
+            candidates = self.get_port_candidates(port, limit=1)
+            if candidates:
+                return candidates[0][2]
         logger.warning("Cannot get USB device from port: {}!".format(port))
         return None
 
-    def get_chain_from_port(self, port):
+    def get_port_candidates(self, port, limit=5):
+        """Get the ranked candidates of the port name, matched by the normalised name (without the index prefix like
+        "4- ", case and whitespace), and then by the trigrams for the approximate names.
+        :param port: the port name to search, like "Speakers (5- USB Audio Device)"
+        :param limit: the max count of the candidates, None for all
+        :return: the list of (score, port name, UsbDevice), the best is the first, score is 1.0 for the same
+                 normalised name
+        """
+        return self._snapshot.nameIndex.search(port, limit=limit)
+
+    def get_chain_from_port(self, port, fuzzy=False):
         """Get the chain from the port name.
         :param port: the port name to search, like "COM17", "Speakers (4- USB Audio Device)"
+        :param fuzzy: search the best candidate if the port name is not matched exactly, see get_port_candidates
         :return: the chain, like 1-2-3, or 1-5-4:Speaker, 1-5-4:Microphone for audio device,
                  if there are more than 1 com ports associated to the same chain, use index like: 1-3-5:0
         """
-        device = self.get_from_port(port)
+        device = self._snapshot.portIndex.get(port) if port else None
+        if not device and fuzzy:
+            candidates = self.get_port_candidates(port, limit=1)
+            if candidates:
+                _, port, device = candidates[0]
+        if not device:
+            device = self.get_from_port(port)
         if device:
             return device.get_key(port=port)
         return None
@@ -270,11 +852,71 @@ class UsbTreeViewTool(object):
                       if there are more than 1 com ports associated to the same chain, use index like: 1-3-5:0
         :return: the port name, like "COM17", "Speakers (4- USB Audio Device)"
         """
+        port = self._snapshot.keyIndex.get(chain) if chain else None
+        if port:
+            return port
         device = self.get_from_chain(chain)
         if device:
             return device.get_port(chain)
         return None
 
+    def load_inventory(self, path):
+        """Load the rig inventory file of the expected devices, see RigInventory
+        :param path: the json or INI file path
+        :return: the RigInventory
+        """
+        self.inventory = RigInventory.load(path)
+        self._aliasIndex = None
+        return self.inventory
+
+    def validate_inventory(self, inventory=None):
+        """Validate every expected device of the inventory (its chain, SN and port count) against the last scan
+        :param inventory: the RigInventory, the loaded one by default
+        :return: the list of InventoryResult, ordered by the alias
+        """
+        inventory = inventory or self.inventory
+        if inventory is None:
+            logger.warning("No rig inventory is loaded!")
+            return []
+        return inventory.validate(self._snapshot)
+
+    def resolve_alias(self, name):
+        """Get the port name of the alias in the inventory, like "console" -> "COM17", the device is searched by
+        the SN of the alias at first, then by the chain
+        :param name: the alias name
+        :return: the port name (None if it's not found)
+        """
+        if self.inventory is None:
+            logger.warning("No rig inventory is loaded!")
+            return None
+
+        snapshot = self._snapshot
+        cached = self._aliasIndex
+        if cached is None or cached[0] is not snapshot:
+            cached = (snapshot, self.inventory.compile(snapshot))
+            self._aliasIndex = cached
+        port = cached[1].get(name)
+        if port:
+            return port
+        logger.warning("Cannot get port from alias: {}!".format(name))
+        return None
+
+    def probe(self, timeout=2.0, workers=16, loopback=False, filters=None, serialFactory=None, **settings):
+        """Check the serial ports of the last scan are usable: open, configure and optionally loopback test them
+        concurrently, each port is limited by the timeout, see PortProber
+        :param timeout: the seconds of each port, None for no limit
+        :param workers: the max count of the ports probed at the same time
+        :param loopback: write the payload and expect to read it back (the TX and RX are wired)
+        :param filters: keywords to filter the devices, see filter()
+        :param serialFactory: create the opened handle by (port, **settings), default is serial.Serial
+        :param settings: the serial settings, like baudrate=115200
+        :return: the list of ProbeResult, ordered as the devices
+        """
+        devices = self._snapshot.filter(filters) if filters else self._snapshot.devices
+        prober = PortProber(timeout=timeout, workers=workers, loopback=loopback, serialFactory=serialFactory,
+                            **settings)
+        return prober.probe(get_serial_ports(devices))
+
     def filter(self, filters):
         """Filter the usb devices by keywords.
         :param filters: keywords to be search (not case sensitive), use ',' to separate multi-keys.
@@ -282,23 +924,12 @@ class UsbTreeViewTool(object):
                         (port chain, device name, sn, .etc), it will be included in the return list
         :return: the usb devices list
         """
-        devices = []
-        for device in self.usbDevices:
-            dataHash = device.export_data()
-            if filters and not UsbTreeViewTool.__include(dataHash, filters):
-                continue
-            devices.append(device)
-        return devices
+        return list(self._snapshot.filter(filters))
 
-    @staticmethod
-    def __include(data, filters):
-        line = ""
-        for item in data:
-            if item:
-                line = line + "{}".format(item)
-
-        filterList = filters.split(",")
-        for f in filterList:
-            if f.lower() in line.lower():
-                return True
-        return False
+    def to_json(self, filters=None):
+        """Serialise the usb devices to json, the text is cached in the snapshot, the repeated calls of the same scan
+        skip the rebuilding
+        :param filters: keywords to filter the devices, see filter()
+        :return: the json text
+        """
+        return self._snapshot.to_json(filters)
@@ -21,7 +21,9 @@
 # SOFTWARE.
 
 import re
+import time
 import logging
+import threading
 logger = logging.getLogger("pyusb_path")
 
 
@@ -51,3 +53,127 @@ def get_values(text, reg, excludeWrappers=None):
     except Exception:
         logger.exception("invalid parse to get value: {}".format(reg))
     return values
+
+
+CHILD_DEVICE_REG = re.compile(r"^Child Device\s+(\d+)\s*:\s*(.*)$")
+
+
+def get_child_devices(info):
+    """Split the information of USB device into the Child Device records in one pass (linear time), like
+
+         Child Device 1        : Speakers (USB Audio Device) (Audio Endpoint)
+          Device ID            : SWD\\MMDEVAPI\\{0.0.0.00000000}.{6DAF8193-C0DF-4390-AD1C-9442293C0408}
+          Class                : AudioEndpoint
+
+    :param info: the information text of the USB device
+    :return: the records list, each one is a dict with "Name" and the fields of the child device, like "Class"
+    """
+    records = []
+    if not info:
+        return records
+
+    record = None
+    for line in info.splitlines():
+        line = line.strip()
+        if line.startswith("Child Device"):
+            matched = CHILD_DEVICE_REG.match(line)
+            if matched:
+                record = {"Index": int(matched.group(1)), "Name": matched.group(2).strip()}
+                records.append(record)
+                continue
+        if record is not None and ":" in line:
+            key, value = line.split(":", 1)
+            record.setdefault(key.strip(), value.strip())
+    return records
+
+
+SYSFS_USB_DEVICE_REG = re.compile(r"^(\d+-[\d.]+)(:\d+\.\d+)?$")
+
+
+def get_sysfs_chain(path):
+    """Get the port chain of the USB device from the sysfs path of the device or its interface or tty
+    :param path: the real sysfs path, like /sys/devices/pci0000:00/0000:00:14.0/usb1/1-7/1-7.5/1-7.5:1.0/ttyUSB0
+    :return: the port chain, like "1-7-5", None if it's not an USB device
+    """
+    for name in reversed(path.replace("\\", "/").split("/")):
+        matched = SYSFS_USB_DEVICE_REG.match(name)
+        if matched:
+            return matched.group(1).replace(".", "-")
+    return None
+
+
+def is_tree_view_info(info):
+    """Check the device information is the text block from UsbTreeView.exe XML report,
+    otherwise it's the port information object from pyserial (Linux)
+    :param info: the device information
+    :return: True if it's the text from XML report
+    """
+    return isinstance(info, str)
+
+
+class Deadline(object):
+    """Deadline of a scan, to limit the overall time and the time budget of each backend
+    """
+    def __init__(self, timeout=None, expiry=None):
+        """
+        :param timeout: seconds from now, None means no deadline
+        :param expiry: the absolute expiry time of time.monotonic(), it's used instead of timeout if it's set
+        """
+        if expiry is None and timeout is not None:
+            expiry = time.monotonic() + timeout
+        self.expiry = expiry
+
+    def remaining(self):
+        """Get the remaining seconds before the deadline
+        :return: the remaining seconds (0 if it's expired), None if there is no deadline
+        """
+        if self.expiry is None:
+            return None
+        return max(0.0, self.expiry - time.monotonic())
+
+    def expired(self):
+        """Check whether the deadline is passed
+        :return: True if it's expired
+        """
+        return self.expiry is not None and time.monotonic() >= self.expiry
+
+    def budget(self, seconds=None):
+        """Get a sub deadline for a backend, it never exceeds the overall deadline
+        :param seconds: the time budget in seconds, None means the remaining of the overall deadline
+        :return: the Deadline of the budget
+        """
+        if seconds is None:
+            return Deadline(expiry=self.expiry)
+        expiry = time.monotonic() + seconds
+        if self.expiry is not None:
+            expiry = min(expiry, self.expiry)
+        return Deadline(expiry=expiry)
+
+
+def call_with_timeout(func, timeout=None):
+    """Call the function in a daemon thread and wait at most timeout seconds, it's used for the calls which may block
+    forever, like reading sysfs or tty of a wedged device. The blocked thread is abandoned if it times out.
+    :param func: the function to call without arguments
+    :param timeout: seconds to wait, None to wait until it's finished
+    :return: (finished, return value of the function), the exception of the function is raised again
+    """
+    if timeout is None:
+        return True, func()
+
+    outcome = {}
+
+    def target():
+        try:
+            outcome["value"] = func()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, name="pyusb_chain_call")
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        return False, None
+    if "error" in outcome:
+        raise outcome["error"]
+    return True, outcome.get("value")
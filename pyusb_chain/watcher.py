@@ -0,0 +1,104 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger("pyusb_path")
+
+
+class TopologyWatcher(object):
+    """Polling watcher of USB topology, built on the fingerprint of UsbTreeViewTool.
+    It only pays for a full scan when the fingerprint is changed (Linux), for the XML report (Windows),
+    the report is exported each time but only parsed when it's changed.
+
+        watcher = TopologyWatcher(tool, interval=1.0, callback=lambda result: print(result))
+        watcher.start()
+        ...
+        watcher.stop()
+    """
+    def __init__(self, tool, interval=1.0, callback=None, timeout=None, under=None, vids=None, pids=None):
+        """
+        :param tool: the UsbTreeViewTool
+        :param interval: seconds between two polls
+        :param callback: called with the ScanResult once the topology is changed
+        :param timeout: the deadline of each scan in seconds, see UsbTreeViewTool.scan()
+        :param under: only scan the subtree of the port chain, see UsbTreeViewTool.scan()
+        :param vids: only scan the devices of the vendor IDs, see UsbTreeViewTool.scan()
+        :param pids: only scan the devices of the product IDs, see UsbTreeViewTool.scan()
+        """
+        self.tool = tool
+        self.interval = interval
+        self.callback = callback
+        self.timeout = timeout
+        self.under = under
+        self.vids = vids
+        self.pids = pids
+        self.lastFingerprint = None
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """Check the topology once, and scan if it's changed
+        :return: the ScanResult if it's changed, otherwise None
+        """
+        fingerprint = self.tool.fingerprint()
+        if fingerprint is not None and fingerprint == self.lastFingerprint:
+            return None
+        result = self.tool.scan(timeout=self.timeout, under=self.under, vids=self.vids, pids=self.pids)
+        if result.cached and result.fingerprint == self.lastFingerprint:
+            return None
+        # the partial scan is not recorded, the next poll scans again even the topology is not changed
+        self.lastFingerprint = result.fingerprint if result.complete else None
+        if self.callback:
+            self.callback(result)
+        return result
+
+    def start(self):
+        """Start polling in a background thread
+        :return: None
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._run, name="pyusb_chain_watcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling and wait for the background thread
+        :return: None
+        """
+        self._stopEvent.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopEvent.is_set():
+            start = time.monotonic()
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Fail to poll the USB topology")
+            self._stopEvent.wait(max(0.0, self.interval - (time.monotonic() - start)))
@@ -27,12 +27,9 @@ from setuptools import setup, find_packages
 version = '0.2.7'
 
 if "win32" == platform:
-    install_requires = [
-        'tabulate'
-    ]
+    install_requires = []
 else:
     install_requires = [
-        'tabulate',
         'pyserial'
     ]
 
@@ -58,19 +55,28 @@ setup(
     author="Bill Yuan",
     author_email="bill.yuan@qq.com",
     license="MIT License",
+    python_requires='>=3.4',
     install_requires=install_requires,
+    extras_require={
+        'numpy': ['numpy'],
+        # the pytest plugin uses pytest.StashKey of pytest 7+, the attributes of the older ones
+        'pytest': ['pytest>=3.9'],
+    },
     packages=find_packages(),
     include_package_data=True,
     entry_points={
         'console_scripts': [
             'pyusb-chain = pyusb_chain.__main__:main',
-        ]
+        ],
+        'pytest11': [
+            'pyusb_chain = pyusb_chain.pytest_plugin [pytest]',
+        ],
     },
     classifiers=[
         'Development Status :: 4 - Beta',
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2.7",
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "Programming Language :: Python :: 3.4",
         "Programming Language :: Python :: 3.5",
         "Programming Language :: Python :: 3.6",
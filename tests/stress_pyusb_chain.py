@@ -0,0 +1,402 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Scaling and memory stress harness for very large hub farms.
+
+It builds the synthetic XML report (UsbTreeView.exe) and the fake sysfs tree (Linux) of N devices, runs each phase
+and records the wall time, the peak RSS and the tracemalloc peak with top allocations. It fails if a phase is over
+its budget, or if a phase is superlinear: the time (or traced memory) per operation of the largest size is more than
+LINEAR_FACTOR times of the smallest size. An operation is a device for the phases over all devices, and a lookup for
+the phases of a fixed count of lookups (fuzzy), so their cost per lookup should be nearly constant.
+
+    python stress_pyusb_chain.py [--sizes=1000,5000,20000] [--repeat=1] [--no-trace] [--json=<file>]
+"""
+import os
+import io
+import sys
+import gc
+import json
+import time
+import shutil
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+from xml.sax.saxutils import escape, quoteattr
+try:
+    import resource
+except ImportError:
+    resource = None
+
+CUR_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(CUR_PATH, ".."))
+from pyusb_chain.__main__ import USBDevicesChain
+from pyusb_chain.usb_tree_view_tool import UsbTreeViewTool
+from pyusb_chain.linux_serial import LinuxSerialScanner
+from pyusb_chain.linux_audio import LinuxAudioScanner
+from pyusb_chain.table import TableRenderer
+
+SIZES = (1000, 5000, 20000)
+
+#: budget of each phase in seconds per 1000 operations (devices, or lookups of the fuzzy phase)
+BUDGETS = {
+    "parse": 1.0,
+    "scan": 1.0,
+    "rescan": 0.2,
+    "filter": 0.5,
+    "lookup": 0.2,
+    "fuzzy": 2.0,
+    "json": 0.3,
+    "columns": 0.3,
+}
+
+#: the max ratio of the time (or traced memory) per operation, between the largest and the smallest sizes
+LINEAR_FACTOR = 3.0
+
+#: the count of the approximate lookups of the fuzzy phase, each one visits the trigram posting lists
+FUZZY_LOOKUPS = 100
+
+#: the phases shorter than it at the smallest size are not checked for superlinearity, they are timer noise
+MIN_CHECKED_SECONDS = 0.005
+
+#: each hub has 7 ports, 3 tiers of hubs under each bus
+HUB_PORTS = 7
+
+COM_INFO = u"\r\nConnection Status        : 0x01 (Device is connected)\r\nPort Chain               : {chain}\r\n" \
+    u"Vendor ID                : 0x10C4 (Silicon Laboratories, Inc.)\r\nProduct ID               : 0xEA60\r\n" \
+    u"Device Description       : Silicon Labs CP210x USB to UART Bridge\r\n" \
+    u"Device ID                : USB\\VID_10C4&PID_EA60\\{sn}\r\n" \
+    u"Driver KeyName           : {{4d36e978-e325-11ce-bfc1-08002be10318}}\\{key:04d} (GUID_DEVCLASS_PORTS)\r\n" \
+    u"Class                    : Ports\r\nLocation Info            : Port_#{port:04d}.Hub_#{hub:04d}\r\n" \
+    u"COM-Port                 : COM{index} (\\Device\\Silabser0)\r\n" \
+    u"iSerialNumber            : 0x03 (String Descriptor 3)\r\n Language 0x0409         : \"{sn}\"\r\n"
+
+AUDIO_INFO = u"\r\nConnection Status        : 0x01 (Device is connected)\r\nPort Chain               : {chain}\r\n" \
+    u"Vendor ID                : 0x0D8C (C-MEDIA ELECTRONICS INC.)\r\nProduct ID               : 0x0014\r\n" \
+    u"Device Description       : USB Composite Device\r\n" \
+    u"Device ID                : USB\\VID_0D8C&PID_0014\\{sn}\r\n" \
+    u"Driver KeyName           : {{36fc9e60-c465-11cf-8056-444553540000}}\\{key:04d} (GUID_DEVCLASS_USB)\r\n" \
+    u"Class                    : USB\r\nLocation Info            : Port_#{port:04d}.Hub_#{hub:04d}\r\n" \
+    u" Child Device 1          : Speakers (USB Audio Device {index}) (Audio Endpoint)\r\n" \
+    u"  Device ID              : SWD\\MMDEVAPI\\{{0.0.0.00000000}}.{{{index}-0}}\r\n" \
+    u"  Class                  : AudioEndpoint\r\n" \
+    u" Child Device 2          : Microphone (USB Audio Device {index}) (Audio Endpoint)\r\n" \
+    u"  Device ID              : SWD\\MMDEVAPI\\{{0.0.1.00000000}}.{{{index}-1}}\r\n" \
+    u"  Class                  : AudioEndpoint\r\n"
+
+
+def get_chain(index):
+    """The unique port chain of the synthetic device, like "1-7-5-3"
+    """
+    ports = []
+    for _ in range(3):
+        ports.append(index % HUB_PORTS + 1)
+        index //= HUB_PORTS
+    return "-".join(str(value) for value in [index + 1] + ports[::-1])
+
+
+def make_export(path, count):
+    """Write the synthetic XML report of UsbTreeView.exe, 3 of 4 devices are VCOM, the others are audio devices
+    :param path: the XML file
+    :param count: the count of devices
+    :return: the list of (port chain, port name)
+    """
+    ports = []
+    with open(path, "w", encoding="utf-8") as fobj:
+        fobj.write(u"<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<UsbTreeViewReport>\n<node text=\"STRESS\">\n")
+        for index in range(count):
+            chain = get_chain(index)
+            values = dict(chain=chain, sn="SN{:08d}".format(index), key=index % 10000, index=index,
+                          port=index % HUB_PORTS + 1, hub=index // HUB_PORTS + 1)
+            if index % 4 == 3:
+                name = u"[{}] : USB Composite Device - USB Audio Device {}".format(chain, index)
+                info = AUDIO_INFO.format(**values)
+                ports.append((chain + ":Speaker", "Speakers (USB Audio Device {})".format(index)))
+            else:
+                name = u"[{}] : Silicon Labs CP210x USB to UART Bridge (COM{})".format(chain, index)
+                info = COM_INFO.format(**values)
+                ports.append((chain, "COM{}".format(index)))
+            fobj.write(u"<node text={}><text>{}</text></node>\n".format(quoteattr(name), escape(info)))
+        fobj.write(u"</node>\n</UsbTreeViewReport>\n")
+    return ports
+
+
+class FakePortInfo(object):
+    """Stand in of pyserial ListPortInfo, read from the fake sysfs tree
+    """
+    def __init__(self, device, location, serialNumber):
+        self.device = device
+        self.location = location
+        self.description = "CP2102 USB to UART Bridge Controller"
+        self.hwid = "USB VID:PID=10C4:EA60 SER={} LOCATION={}".format(serialNumber, location)
+        self.vid = 0x10c4
+        self.pid = 0xea60
+        self.serial_number = serialNumber
+
+
+def make_sysfs(root, count):
+    """Build the fake sysfs tree of the USB serial ports (Linux)
+    :param root: the root directory
+    :param count: the count of devices
+    :return: the LinuxSerialScanner of the tree, and the list of (port chain, port name)
+    """
+    sysfsRoot = os.path.join(root, "sys")
+    ttyClass = os.path.join(sysfsRoot, "class", "tty")
+    usbDevices = os.path.join(sysfsRoot, "bus", "usb", "devices")
+    os.makedirs(ttyClass)
+    os.makedirs(usbDevices)
+    ports = []
+    for index in range(count):
+        chain = get_chain(index)
+        bus, tiers = chain.split("-", 1)
+        sysfsName = "{}-{}".format(bus, tiers.replace("-", "."))
+        device = os.path.join(sysfsRoot, "devices", "usb{}".format(bus), sysfsName)
+        interface = os.path.join(device, "{}:1.0".format(sysfsName))
+        name = "ttyUSB{}".format(index)
+        os.makedirs(os.path.join(interface, name))
+        for attribute, value in (("busnum", bus), ("devnum", index % 127 + 1), ("serial", "SN{:08d}".format(index))):
+            with open(os.path.join(device, attribute), "w") as fobj:
+                fobj.write("{}\n".format(value))
+        os.symlink(device, os.path.join(usbDevices, sysfsName))
+        os.mkdir(os.path.join(ttyClass, name))
+        os.symlink(interface, os.path.join(ttyClass, name, "device"))
+        ports.append((chain, "/dev/{}".format(name)))
+
+    def factory(devicePath):
+        interface = os.path.realpath(os.path.join(ttyClass, os.path.basename(devicePath), "device"))
+        with open(os.path.join(os.path.dirname(interface), "serial")) as fobj:
+            serialNumber = fobj.read().strip()
+        return FakePortInfo(devicePath, os.path.basename(interface), serialNumber)
+
+    return LinuxSerialScanner(sysfsRoot=sysfsRoot, devRoot="/dev", portInfoFactory=factory), ports
+
+
+def get_peak_rss():
+    """The peak RSS of the process in MB, None if it's not available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes in macOS, KB in Linux
+    return peak / (1024.0 * 1024) if "darwin" == sys.platform else peak / 1024.0
+
+
+class StressRun(object):
+    """Build the synthetic trees of one size, and run the phases on them
+    """
+    def __init__(self, count, workDir):
+        self.count = count
+        self.workDir = workDir
+        self.xmlFile = os.path.join(workDir, "export.xml")
+        self.xmlPorts = make_export(self.xmlFile, count)
+        self.scanner, self.sysfsPorts = make_sysfs(os.path.join(workDir, "linux"), count)
+        self.xmlTool = UsbTreeViewTool()
+        self.linuxTool = UsbTreeViewTool()
+        self.linuxTool.exporter = None
+        self.linuxTool.serialScanner = self.scanner
+        self.linuxTool.audioScanner = LinuxAudioScanner(sysfsRoot=os.path.join(workDir, "linux", "sys"),
+                                                        procRoot=os.path.join(workDir, "linux", "proc"))
+        self.phases = [("parse", self.parse), ("scan", self.scan), ("rescan", self.rescan),
+                       ("filter", self.filter), ("lookup", self.lookup), ("fuzzy", self.fuzzy),
+                       ("json", self.json), ("columns", self.columns)]
+        #: the operations of the phases not over all devices
+        self.operations = {"fuzzy": len(self.get_fuzzy_indexes())}
+        #: the untimed preparation of the phases
+        self.setups = {"json": self.setup_json}
+
+    def parse(self):
+        result = self.xmlTool.parse(self.xmlFile)
+        assert len(result.devices) == self.count
+
+    def scan(self):
+        self.linuxTool.skipUnchanged = False
+        result = self.linuxTool.scan()
+        assert len(result.devices) == self.count
+
+    def rescan(self):
+        self.linuxTool.skipUnchanged = True
+        self.linuxTool.scan()
+        result = self.linuxTool.scan()
+        assert result.cached
+
+    def filter(self):
+        assert len(self.xmlTool.filter("USB Audio Device")) == self.count // 4
+        self.xmlTool.filter("SN00000001,COM7")
+
+    def lookup(self):
+        tool = self.xmlTool
+        for chain, port in self.xmlPorts:
+            assert tool.get_port_from_chain(chain) == port
+            assert tool.get_chain_from_port(port) == chain
+        tool = self.linuxTool
+        for chain, port in self.sysfsPorts:
+            assert tool.get_port_from_chain(chain) == port
+
+    def get_fuzzy_indexes(self):
+        step = max(1, self.count // FUZZY_LOOKUPS)
+        return range(3, self.count, step)[:FUZZY_LOOKUPS]
+
+    def fuzzy(self):
+        for index in self.get_fuzzy_indexes():
+            self.xmlTool.get_port_candidates("speaker usb audio devce {}".format(index), limit=3)
+
+    def setup_json(self):
+        # a new snapshot of the same devices, its json text is not cached yet
+        self.xmlTool.publish(self.xmlTool.usbDevices)
+
+    def json(self):
+        # the same path as "pyusb-chain --export"
+        cwd = os.getcwd()
+        os.chdir(self.workDir)
+        try:
+            with redirect_stdout(io.StringIO()):
+                USBDevicesChain.export_json(self.xmlTool.usbDevices, text=self.xmlTool.to_json())
+        finally:
+            os.chdir(cwd)
+        assert os.path.getsize(os.path.join(self.workDir, USBDevicesChain.EXPORT_JSON_NAME)) > self.count
+
+    def columns(self):
+        columns = self.xmlTool.to_columns(host="stress")
+        columns.group_count("segment0", columns.filter(vid=0x10C4))
+
+    def run(self, repeat=1, trace=True):
+        """Run all phases
+        :param repeat: run each phase for times, the shortest time is recorded
+        :param trace: run each phase once more with tracemalloc for the peak and top allocations
+        :return: dict of phase -> measurement dict
+        """
+        measurements = {}
+        for name, phase in self.phases:
+            setup = self.setups.get(name)
+            seconds = None
+            for _ in range(repeat):
+                if setup:
+                    setup()
+                gc.collect()
+                start = time.perf_counter()
+                phase()
+                elapsed = time.perf_counter() - start
+                seconds = elapsed if seconds is None else min(seconds, elapsed)
+            measurement = {"seconds": seconds, "operations": self.operations.get(name, self.count),
+                           "peakRSS": get_peak_rss(), "tracedPeak": None, "top": []}
+            if trace:
+                if setup:
+                    setup()
+                gc.collect()
+                tracemalloc.start()
+                phase()
+                measurement["tracedPeak"] = tracemalloc.get_traced_memory()[1]
+                stats = tracemalloc.take_snapshot().statistics("lineno")[:3]
+                tracemalloc.stop()
+                measurement["top"] = ["{}:{} {:.1f} KB".format(os.path.basename(stat.traceback[0].filename),
+                                                               stat.traceback[0].lineno, stat.size / 1024.0)
+                                      for stat in stats]
+            measurements[name] = measurement
+        return measurements
+
+
+def check(results, timing=True):
+    """Check the budgets and the superlinearity, per operation of each phase
+    :param results: dict of size -> dict of phase -> measurement
+    :param timing: check the time budgets and the time per operation, False to check the memory only
+    :return: the list of failures
+    """
+    failures = []
+    sizes = sorted(results)
+    for size in sizes:
+        for name, measurement in results[size].items():
+            budget = BUDGETS[name] * measurement["operations"] / 1000.0
+            if timing and measurement["seconds"] > budget:
+                failures.append("{} of {} devices: {:.3f}s is over budget {:.3f}s".format(
+                    name, size, measurement["seconds"], budget))
+    if len(sizes) < 2:
+        return failures
+
+    small, large = sizes[0], sizes[-1]
+    for name in results[small]:
+        first, last = results[small][name], results[large][name]
+        ratio = (last["seconds"] / last["operations"]) / (first["seconds"] / first["operations"])
+        if timing and first["seconds"] >= MIN_CHECKED_SECONDS and ratio > LINEAR_FACTOR:
+            failures.append("{} is superlinear: time per operation of {} devices is {:.1f}x of {} devices".format(
+                name, large, ratio, small))
+        if first["tracedPeak"] and last["tracedPeak"]:
+            ratio = (last["tracedPeak"] / float(last["operations"])) / \
+                (first["tracedPeak"] / float(first["operations"]))
+            if ratio > LINEAR_FACTOR:
+                failures.append("{} is superlinear: memory per operation of {} devices is {:.1f}x of {} devices"
+                                .format(name, large, ratio, small))
+    return failures
+
+
+def run(sizes=SIZES, repeat=1, trace=True, stream=None, timing=True):
+    """Run the harness for the sizes and print the table
+    :param sizes: the counts of devices
+    :param repeat: run each phase for times, see StressRun.run()
+    :param trace: record the tracemalloc peak and top allocations
+    :param stream: the output stream, default is sys.stdout
+    :param timing: check the time budgets, see check()
+    :return: (results, failures)
+    """
+    results = {}
+    rows = []
+    for size in sizes:
+        workDir = tempfile.mkdtemp(prefix="pyusb_chain_stress_")
+        try:
+            results[size] = StressRun(size, workDir).run(repeat=repeat, trace=trace)
+        finally:
+            shutil.rmtree(workDir, ignore_errors=True)
+        for name, measurement in results[size].items():
+            tracedPeak = measurement["tracedPeak"]
+            rows.append([size, name, measurement["operations"], round(measurement["seconds"], 4),
+                         round(BUDGETS[name] * measurement["operations"] / 1000.0, 3),
+                         measurement["peakRSS"] and round(measurement["peakRSS"], 1),
+                         tracedPeak and round(tracedPeak / (1024.0 * 1024), 2), "; ".join(measurement["top"])])
+    TableRenderer(["Devices", "Phase", "Operations", "Seconds", "Budget", "Peak RSS MB", "Traced MB",
+                   "Top Allocations"], stream=stream).render(rows)
+    failures = check(results, timing)
+    for failure in failures:
+        (stream or sys.stdout).write("FAIL: {}\n".format(failure))
+    return results, failures
+
+
+def main(argv):
+    sizes = SIZES
+    repeat = 1
+    trace = True
+    jsonFile = None
+    for arg in argv:
+        if arg.startswith("--sizes="):
+            sizes = [int(size) for size in arg[len("--sizes="):].split(",")]
+        elif arg.startswith("--repeat="):
+            repeat = int(arg[len("--repeat="):])
+        elif arg == "--no-trace":
+            trace = False
+        elif arg.startswith("--json="):
+            jsonFile = arg[len("--json="):]
+    results, failures = run(sizes, repeat, trace)
+    if jsonFile:
+        with open(jsonFile, "w") as fobj:
+            json.dump({"results": results, "failures": failures}, fobj, indent=4)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,52 @@
+# MIT License
+#
+# Copyright (c) 2021 Bill.Yuan
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Stub of UsbTreeView.exe for tests, it "exports" the XML report by copying a recorded one.
+
+    python stub_usbtreeview.py [--report=<xml>] [--sleep=<seconds>] [--count=<dir>] /X=<file>
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+
+CUR_PATH = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv):
+    report = os.path.join(CUR_PATH, "export_test.xml")
+    for arg in argv:
+        if arg.startswith("--report="):
+            report = arg[len("--report="):]
+        elif arg.startswith("--sleep="):
+            time.sleep(float(arg[len("--sleep="):]))
+        elif arg.startswith("--count="):
+            # record each run by an empty file
+            open(os.path.join(arg[len("--count="):], str(uuid.uuid4())), "w").close()
+        elif arg.upper().startswith("/X="):
+            shutil.copyfile(report, arg[len("/X="):])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -23,15 +23,37 @@
 import json
 
 import pytest
+import struct
 import sys
 import os
 import io
+import time
+import threading
 from sys import platform
 
 sys.path.append("..")
 from pyusb_chain.__main__ import USBDevicesChain
 from pyusb_chain.usb_tree_view_tool import UsbTreeViewTool
-from pyusb_chain.utility import get_values
+from pyusb_chain.table import TableRenderer
+from pyusb_chain.linux_audio import LinuxAudioScanner
+from pyusb_chain.linux_serial import LinuxSerialScanner
+from pyusb_chain.scan_scope import ScanScope
+from pyusb_chain.columns import DeviceColumns, HAS_NUMPY
+from pyusb_chain.port_name_index import normalize_port_name, get_trigrams, PortNameIndex
+from pyusb_chain.journal import HotplugJournal, HotplugEvent
+from pyusb_chain.inventory import RigInventory
+from pyusb_chain.backends import ScannerBackend
+from pyusb_chain.descriptors import UsbDescriptors, get_sysfs_name, CLASS_CDC, CLASS_CDC_DATA, CLASS_AUDIO
+from pyusb_chain.ingest import ArchiveIngester, ArchiveStore
+from pyusb_chain.serial_pool import SerialPortPool
+from pyusb_chain.live_view import LiveView, chain_sort_key, enable_virtual_terminal
+from pyusb_chain.fingerprint import sysfs_fingerprint, xml_fingerprint, HashingReader
+from pyusb_chain.watcher import TopologyWatcher
+from pyusb_chain.devices.comport_device import COMPortDevice
+from pyusb_chain.devices.audio_device import AudioDevice
+from pyusb_chain.devices.audio_comport_device import AudioCOMPortDevice
+from pyusb_chain.utility import get_values, get_child_devices, Deadline, call_with_timeout, CHILD_DEVICE_REG
+from tests import stress_pyusb_chain
 
 CUR_PATH = os.path.dirname(os.path.abspath(__file__))
 
@@ -53,7 +75,8 @@ def test_commandline():
 @pytest.mark.skipif('win32' != platform, reason="requires the windows os")
 def test_export_xml():
     tool = UsbTreeViewTool()
-    exportedFile = tool.export_xml()
+    with pytest.deprecated_call():
+        exportedFile = tool.export_xml()
     assert os.path.exists(exportedFile) == True
     with io.open(exportedFile, 'r', encoding='utf8') as f:
         lines = f.readlines()
@@ -86,9 +109,6 @@ def test_filter_data():
         tool.parse_linux()
         devices = tool.filter("tty")
         assert len(devices) > 1
-        # for linux, so far, only support VCOM
-        devices = tool.filter("Audio")
-        assert len(devices) == 0
 
 
 def test_export_json():
@@ -469,3 +489,1401 @@ def test_usb_tree_view_tool_covert():
     assert tool.get_port_from_chain("1-24-1:Speaker") == "Speakers (4- USB AUDIO+CDC DEMO)"
     assert tool.get_chain_from_port("Microphone (4- USB AUDIO+CDC DEMO)") == "1-24-1:Microphone"
     assert tool.get_port_from_chain("1-24-1:Microphone") == "Microphone (4- USB AUDIO+CDC DEMO)"
+
+
+STUB_EXPORTER = [sys.executable, os.path.join(CUR_PATH, "stub_usbtreeview.py")]
+
+
+def test_exporter_stub_scan(tmp_path):
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER)
+    tool.exporter.tempRoot = str(tmp_path)
+    tool.scan()
+    assert len(tool.usbDevices) == 15
+    assert tool.get_port_from_chain("1-7-5") == "COM16"
+    # the private temp directory is removed after parsing
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_exporter_failure_cleanup(tmp_path):
+    tool = UsbTreeViewTool(exportCommand=[sys.executable, "-c", "pass"])
+    tool.exporter.tempRoot = str(tmp_path)
+    tool.scan()
+    assert len(tool.usbDevices) == 0
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_scan_timeout_hung_exporter(tmp_path):
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER + ["--sleep=30"])
+    tool.exporter.tempRoot = str(tmp_path)
+    start = time.time()
+    result = tool.scan(timeout=0.5)
+    assert time.time() - start < 10
+    assert not result.complete
+    assert UsbTreeViewTool.BACKEND_USBTREEVIEW in result.timedOut
+    assert len(result.devices) == 0
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_scan_timeout_partial_devices():
+    tool = UsbTreeViewTool()
+    result = tool.parse(os.path.join(CUR_PATH, "export_test.xml"), deadline=Deadline(0))
+    assert not result.complete
+    assert "usbtreeview:1-7-5" in result.timedOut
+    assert len(result.devices) == 0
+
+    result = tool.parse(os.path.join(CUR_PATH, "export_test.xml"), deadline=Deadline(60))
+    assert result.complete
+    assert len(result.devices) == 15
+
+
+def test_call_with_timeout():
+    finished, value = call_with_timeout(lambda: time.sleep(5), 0.1)
+    assert not finished
+    finished, value = call_with_timeout(lambda: 42, 1)
+    assert finished
+    assert value == 42
+
+
+def test_snapshot_swap_concurrent_readers():
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER)
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    snapshot = tool.snapshot
+    assert len(snapshot) == 15
+    assert snapshot.chainIndex["1-7-5"].get_com_port() == "COM16"
+    with pytest.raises(AttributeError):
+        snapshot.devices = ()
+
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            snapshot = tool.snapshot
+            if len(snapshot.devices) != 15 or snapshot.portIndex.get("COM16") is None:
+                errors.append(len(snapshot.devices))
+            if tool.get_port_from_chain("1-3-1:3") != "COM12":
+                errors.append("1-3-1:3")
+
+    readers = [threading.Thread(target=reader) for _ in range(8)]
+    for thread in readers:
+        thread.start()
+    try:
+        futures = [tool.scan_async() for _ in range(3)]
+        for future in futures:
+            assert future.result(timeout=60).complete
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join()
+    assert errors == []
+    assert tool.snapshot is not snapshot
+    assert len(tool.usbDevices) == 15
+
+
+def test_scan_single_flight(tmp_path):
+    counter = tmp_path / "runs"
+    counter.mkdir()
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER + ["--sleep=0.5", "--count={}".format(counter)])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tool.scan())) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # all callers share the result of one exporter run
+    assert len(os.listdir(str(counter))) == 1
+    assert len(results) == 6
+    assert all(result is results[0] for result in results)
+
+    # accept the last result within max_age milliseconds
+    assert tool.scan(max_age=60000) is results[0]
+    assert len(os.listdir(str(counter))) == 1
+    assert tool.scan(max_age=0) is not results[0]
+    assert len(os.listdir(str(counter))) == 2
+
+
+def make_fake_audio_tree(root):
+    """Fake /proc/asound and /sys/class/sound with an USB audio card, an USB microphone and a PCI card
+    """
+    asound = root / "proc" / "asound"
+    asound.mkdir(parents=True)
+    (asound / "cards").write_text(
+        u" 0 [PCH            ]: HDA-Intel - HDA Intel PCH\n"
+        u"                      HDA Intel PCH at 0xf7f10000 irq 32\n"
+        u" 1 [Device         ]: USB-Audio - USB Audio Device\n"
+        u"                      C-Media Electronics Inc. USB Audio Device at usb-0000:00:14.0-3.7.4, full speed\n"
+        u" 2 [DEMO           ]: USB-Audio - USB AUDIO+CDC DEMO\n"
+        u"                      NXP USB AUDIO+CDC DEMO at usb-0000:00:14.0-24.1, high speed\n")
+    (asound / "pcm").write_text(
+        u"00-00: ALC3246 Analog : ALC3246 Analog : playback 1 : capture 1\n"
+        u"01-00: USB Audio : USB Audio : playback 1 : capture 1\n"
+        u"02-00: USB Audio : USB Audio : capture 1\n")
+    sound = root / "sys" / "class" / "sound"
+    sound.mkdir(parents=True)
+    devices = root / "sys" / "devices" / "pci0000:00" / "0000:00:14.0" / "usb1"
+    pci = root / "sys" / "devices" / "pci0000:00" / "0000:00:1f.3"
+    pci.mkdir(parents=True)
+    (sound / "card0").mkdir()
+    os.symlink(str(pci), str(sound / "card0" / "device"))
+    for card, name, vid, pid, product in [(1, "1-3.7.4", "0d8c", "0014", "USB Audio Device"),
+                                          (2, "1-24.1", "1fc9", "00a6", "USB AUDIO+CDC DEMO")]:
+        usb = devices / name
+        interface = usb / "{}:1.0".format(name)
+        interface.mkdir(parents=True)
+        (usb / "idVendor").write_text(vid + u"\n")
+        (usb / "idProduct").write_text(pid + u"\n")
+        (usb / "product").write_text(product + u"\n")
+        (sound / "card{}".format(card)).mkdir()
+        os.symlink(str(interface), str(sound / "card{}".format(card) / "device"))
+    return root
+
+
+class FakeSerialPort(object):
+    """Stand in of pyserial ListPortInfo
+    """
+    def __init__(self, device, location, description="USB AUDIO+CDC DEMO"):
+        self.device = device
+        self.location = location
+        self.description = description
+        self.hwid = "USB VID:PID=1FC9:00A6 LOCATION={}".format(location)
+        self.vid = 0x1fc9
+        self.pid = 0xa6
+        self.serial_number = None
+
+
+def make_audio_vcom_port(device):
+    """Port information of the fake tty tree, only ttyACM0 is the VCOM of the audio card 2
+    """
+    port = FakeSerialPort(device, "1-24.1:1.2")
+    if "ttyACM0" != os.path.basename(device):
+        port.pid = None
+    return port
+
+
+def test_linux_audio_fake_tree(tmp_path):
+    root = make_fake_audio_tree(tmp_path)
+    scanner = LinuxAudioScanner(sysfsRoot=str(root / "sys"), procRoot=str(root / "proc"))
+    cards = scanner.scan()
+    assert [card.card for card in cards] == [1, 2]
+    assert cards[0].get_chain() == "1-3-7-4"
+    assert cards[0].playbackName == "Speakers (hw:CARD=Device,DEV=0)"
+    assert cards[0].recordName == "Microphone (hw:CARD=Device,DEV=0)"
+    assert cards[1].playbackName is None
+    assert cards[1].recordName == "Microphone (hw:CARD=DEMO,DEV=0)"
+
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.audioScanner = scanner
+    # the VCOM of the same USB device as card 2 is merged to one AudioCOMPortDevice
+    ttyRoot = make_fake_tty_tree(tmp_path / "tty")
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(ttyRoot / "sys"), portInfoFactory=make_audio_vcom_port)
+    tool.scan()
+    assert len(tool.usbDevices) == 2
+    assert isinstance(tool.get_from_chain("1-24-1"), AudioCOMPortDevice)
+    assert tool.get_chain_from_port("Speakers (hw:CARD=Device,DEV=0)") == "1-3-7-4:Speaker"
+    assert tool.get_chain_from_port("Microphone (hw:CARD=Device,DEV=0)") == "1-3-7-4:Microphone"
+    assert tool.get_port_from_chain("1-3-7-4:Speaker") == "Speakers (hw:CARD=Device,DEV=0)"
+    assert tool.get_port_from_chain("1-3-7-4:Microphone") == "Microphone (hw:CARD=Device,DEV=0)"
+    assert tool.get_chain_from_port("Microphone (hw:CARD=DEMO,DEV=0)") == "1-24-1:Microphone"
+    assert tool.get_chain_from_port("/dev/ttyACM0") == "1-24-1:/dev/ttyACM0"
+    assert tool.get_port_from_chain("1-24-1:/dev/ttyACM0") == "/dev/ttyACM0"
+    assert len(tool.filter("Audio")) == 2
+
+
+def test_audio_child_devices_more_than_9():
+    info = "\r\nDevice ID : USB\\VID_1FC9&PID_00A6\\1\r\n"
+    for index in range(1, 13):
+        info += " Child Device {} : HID-compliant device {}\r\n  Device ID : HID\\{}\r\n  Class : HIDClass\r\n".format(
+            index, index, index)
+    info += "   Child Device 13 : Speakers (5- USB Audio Device) (Audio Endpoint)\r\n" \
+            "    Device ID : SWD\\MMDEVAPI\\1\r\n    Class : AudioEndpoint\r\n" \
+            "   Child Device 14 : Microphone (5- USB Audio Device) (Audio Endpoint)\r\n" \
+            "    Device ID : SWD\\MMDEVAPI\\2\r\n    Class : AudioEndpoint\r\n"
+    children = get_child_devices(info)
+    assert len(children) == 14
+    assert children[13]["Index"] == 14
+    assert children[13]["Class"] == "AudioEndpoint"
+
+    device = AudioDevice("[1-3-7-5] : USB Audio Device", info)
+    device.parse()
+    assert device.audioPlaybackName == "Speakers (5- USB Audio Device)"
+    assert device.audioRecordName == "Microphone (5- USB Audio Device)"
+
+
+def test_audio_child_devices_pathological_benchmark(monkeypatch):
+    # composite device with many child interfaces, long lines and whitespace runs without any Class field
+    child = " Child Device {} : " + "x" * 200 + "\r\n" + "  \t  \r\n" * 50 + "  Device Path : " + "\\" * 500 + "\r\n"
+    info = "".join(child.format(index) for index in range(2000))
+    info += " Child Device 2000 : Speakers (USB Audio Device) (Audio Endpoint)\r\n  Class : AudioEndpoint\r\n"
+    calls = []
+
+    class CountingReg(object):
+        def match(self, line):
+            calls.append(line)
+            return CHILD_DEVICE_REG.match(line)
+
+    monkeypatch.setattr("pyusb_chain.utility.CHILD_DEVICE_REG", CountingReg())
+    device = AudioDevice("[1-3-7-5] : USB Audio Device", info)
+    device.parse()
+    assert device.audioPlaybackName == "Speakers (USB Audio Device)"
+    # one pass, the regex is matched only once for each Child Device line, not for the whitespace runs
+    assert len(calls) == 2001
+
+
+def test_table_renderer():
+    tool = UsbTreeViewTool()
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    stream = io.StringIO()
+    USBDevicesChain.print_table(tool.usbDevices, allInfo=True, stream=stream)
+    lines = stream.getvalue().splitlines()
+    assert lines[0].split() == ["Port", "Chain", "Key", "Port", "Name", "Device", "Name", "SN", "Driver", "Key"]
+    assert set(lines[1]) == {"-", " "}
+    assert len(lines) == 2 + 25
+    assert lines[2].startswith("1-3-1:0             COM9  ")
+    # numeric column is right aligned
+    assert lines[2].endswith("            13")
+
+    tabulate = pytest.importorskip("tabulate")
+    rows = []
+    for device in tool.usbDevices:
+        rows.extend(device.export_data(True))
+    headers = ["Port Chain Key", "Port Name", "Device Name", "SN", "Driver Key"]
+    assert stream.getvalue().rstrip("\n") == tabulate.tabulate(rows, headers=headers)
+
+
+def test_table_renderer_look_ahead():
+    stream = io.StringIO()
+    TableRenderer(["Key", "Name"], stream=stream, lookAhead=1).render(iter([["1-1", "a"], ["1-2-3-4", "b"]]))
+    assert stream.getvalue() == "Key    Name\n-----  ------\n1-1    a\n1-2-3-4  b\n"
+
+
+def test_scan_scope_xml():
+    exportXMLFile = os.path.join(CUR_PATH, "export_test.xml")
+    tool = UsbTreeViewTool()
+    tool.parse(exportXMLFile, scope=ScanScope(under="1-7"))
+    chains = [device.portChain for device in tool.usbDevices]
+    assert chains == ["1-7-3", "1-7-5", "1-7-6", "1-7-7-1", "1-7-7-4"]
+
+    result = tool.parse(exportXMLFile, scope=ScanScope(vids=["0x10C4"], pids=["EA60"]))
+    assert [device.get_com_port() for device in result.devices] == ["COM16", "COM20"]
+    # the scoped scan only replaces the devices in its scope, in their places
+    assert [device.portChain for device in tool.usbDevices] == chains
+    assert tool.get_from_chain("1-7-5") is result.devices[0]
+
+    # the DSC boards are numbered in the whole tree
+    result = tool.parse(exportXMLFile, scope=ScanScope(under="1-9-3-4"))
+    assert len(result.devices) == 1
+    assert "[USB2]" in result.devices[0].deviceName
+    assert [device.portChain for device in tool.usbDevices] == chains + [result.devices[0].portChain]
+
+    scope = ScanScope(under="1-7.7")
+    assert scope.match_chain("1-7-7")
+    assert scope.match_chain("1-7-7-4:1")
+    assert not scope.match_chain("1-7-70")
+    assert scope.may_contain("1-7")
+    assert not scope.may_contain("1-3")
+
+
+def make_fake_tty_tree(root):
+    """Fake /sys/class/tty with USB serial ports under 1-7 and 2-1, a platform serial and a virtual terminal
+    """
+    ttyClass = root / "sys" / "class" / "tty"
+    ttyClass.mkdir(parents=True)
+    usb = root / "sys" / "devices" / "pci0000:00" / "0000:00:14.0"
+    for name, path in [("ttyUSB0", "usb1/1-7/1-7.5/1-7.5:1.0/ttyUSB0"),
+                       ("ttyACM0", "usb1/1-7/1-7.6/1-7.6:1.1"),
+                       ("ttyACM1", "usb2/2-1/2-1:1.0")]:
+        (usb / path).mkdir(parents=True)
+        (ttyClass / name).mkdir()
+        os.symlink(str(usb / path), str(ttyClass / name / "device"))
+    serial8250 = root / "sys" / "devices" / "platform" / "serial8250"
+    serial8250.mkdir(parents=True)
+    (ttyClass / "ttyS0").mkdir()
+    os.symlink(str(serial8250), str(ttyClass / "ttyS0" / "device"))
+    (ttyClass / "tty0").mkdir()
+    return root
+
+
+def test_scan_scope_linux_serial_prune(tmp_path):
+    root = make_fake_tty_tree(tmp_path)
+    opened = []
+
+    def factory(device):
+        opened.append(os.path.basename(device))
+        location = {"ttyUSB0": "1-7.5", "ttyACM0": "1-7.6:1.1", "ttyACM1": "2-1:1.0"}[os.path.basename(device)]
+        port = FakeSerialPort(device, location, "USB Serial")
+        port.vid = 0x0D28 if "ACM" in device else 0x10C4
+        return port
+
+    scanner = LinuxSerialScanner(sysfsRoot=str(root / "sys"), devRoot="/dev", portInfoFactory=factory)
+    ports = scanner.scan()
+    assert [port.device for port in ports] == ["/dev/ttyACM0", "/dev/ttyACM1", "/dev/ttyUSB0"]
+
+    # the ports out of the subtree are pruned before reading their attributes
+    del opened[:]
+    ports = scanner.scan(ScanScope(under="1-7"))
+    assert [port.device for port in ports] == ["/dev/ttyACM0", "/dev/ttyUSB0"]
+    assert sorted(opened) == ["ttyACM0", "ttyUSB0"]
+
+    ports = scanner.scan(ScanScope(under="1-7", vids=["0x0D28"]))
+    assert [port.device for port in ports] == ["/dev/ttyACM0"]
+
+
+def test_linux_serial_group_interfaces(tmp_path):
+    root = make_fake_tty_tree(tmp_path)
+    locations = {"ttyACM0": "1-3.1:1.2", "ttyACM1": "1-3.1:1.0", "ttyUSB0": "1-3.1:1.1"}
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(root / "sys"), devRoot="/dev", portInfoFactory=lambda device:
+                                            FakeSerialPort(device, locations[os.path.basename(device)], "Quad"))
+    tool.audioScanner = None
+    tool.scan()
+    # one device of the ttys ordered by the interface number
+    assert len(tool.usbDevices) == 1
+    assert tool.usbDevices[0].comPorts == ["/dev/ttyACM1", "/dev/ttyUSB0", "/dev/ttyACM0"]
+    assert tool.snapshot.keyIndex["1-3-1:2"] == "/dev/ttyACM0"
+    assert tool.get_port_from_chain("1-3-1:0") == "/dev/ttyACM1"
+    assert tool.get_port_from_chain("1-3-1:2") == "/dev/ttyACM0"
+    assert tool.get_port_from_chain("1-3-1:3") is None
+    assert tool.get_chain_from_port("/dev/ttyUSB0") == "1-3-1:1"
+
+    # the ports of the different devices and the ones without location are not grouped
+    ports = [FakeSerialPort("/dev/ttyUSB1", "1-3.2:1.0"), FakeSerialPort("/dev/ttyUSB0", "1-3.1:1.1"),
+             FakeSerialPort("/dev/ttyS0", None), FakeSerialPort("/dev/ttyUSB2", "1-3.1:1.0"),
+             FakeSerialPort("/dev/ttyS1", None)]
+    assert [[port.device for port in group] for group in UsbTreeViewTool.group_serial_ports(ports)] == \
+        [["/dev/ttyUSB1"], ["/dev/ttyUSB2", "/dev/ttyUSB0"], ["/dev/ttyS0"], ["/dev/ttyS1"]]
+
+
+def test_iter_devices_xml(monkeypatch):
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER)
+    classified = []
+    classify = tool.classify_node
+    monkeypatch.setattr(tool, "classify_node", lambda *args: classified.append(args[0]) or classify(*args))
+
+    # stopped at the second device, the others are not parsed
+    device = tool.find_first("COM13")
+    assert device.portChain == "1-3-2"
+    assert len(classified) == 2
+    assert len(tool.usbDevices) == 0
+
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    chains = [device.portChain for device in tool.iter_devices()]
+    # the DSC boards are numbered by all of them, they're at the end
+    assert chains[-2:] == ["1-9-3-3", "1-9-3-4-3-4"]
+    assert sorted(chains) == sorted(device.portChain for device in tool.usbDevices)
+    assert tool.find_first("USB2").deviceName == tool.get_from_chain("1-9-3-4-3-4").deviceName
+    assert [device.portChain for device in tool.iter_devices("COM16,COM20")] == ["1-7-5", "1-7-7-1"]
+    assert [device.portChain for device in tool.iter_devices(lambda device: device.sn, under="1-7")] == ["1-7-6"]
+    assert tool.find_first("COM404") is None
+
+
+def test_iter_devices_linux(tmp_path):
+    root = make_fake_tty_tree(tmp_path)
+    locations = {"ttyACM0": "1-7.6:1.1", "ttyACM1": "2-1:1.0", "ttyUSB0": "1-7.5:1.0"}
+    opened = []
+
+    def factory(device):
+        opened.append(os.path.basename(device))
+        return FakeSerialPort(device, locations[os.path.basename(device)], "USB Serial")
+
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(root / "sys"), devRoot="/dev", portInfoFactory=factory)
+    tool.audioScanner = None
+    tool.register_backend(SleepBackend("slow", "/dev/ttyS7", "3-1", 0))
+    device = tool.find_first("ttyACM0")
+    assert device.portChain == "1-7-6"
+    assert opened == ["ttyACM0"]
+    assert [device.get_com_port() for device in tool.iter_devices()] == ["/dev/ttyACM0", "/dev/ttyACM1",
+                                                                         "/dev/ttyUSB0", "/dev/ttyS7"]
+    assert tool.find_first("ttyS7").portChain == "3-1"
+    tool.scanner.unregister("slow")
+    assert [device.portChain for device in tool.iter_devices(under="1-7")] == ["1-7-6", "1-7-5"]
+
+    # the audio card is merged with the VCOM of the same USB device
+    audio = make_fake_audio_tree(tmp_path / "audio")
+    tool.audioScanner = LinuxAudioScanner(sysfsRoot=str(audio / "sys"), procRoot=str(audio / "proc"))
+    locations["ttyACM1"] = "1-24.1:1.2"
+    devices = list(tool.iter_devices())
+    assert [device.portChain for device in devices] == ["1-7-6", "1-24-1", "1-7-5", "1-3-7-4"]
+    assert devices[1].get_port("1-24-1:Microphone") == "Microphone (hw:CARD=DEMO,DEV=0)"
+    assert devices[1].get_com_port() == "/dev/ttyACM1"
+
+
+def test_scan_scope_linux_audio(tmp_path):
+    root = make_fake_audio_tree(tmp_path)
+    scanner = LinuxAudioScanner(sysfsRoot=str(root / "sys"), procRoot=str(root / "proc"))
+    assert [card.card for card in scanner.scan(scope=ScanScope(under="1-24"))] == [2]
+    assert [card.card for card in scanner.scan(scope=ScanScope(vids=[0x0D8C]))] == [1]
+
+
+def test_fingerprint_skip_unchanged_xml(tmp_path):
+    data = open(os.path.join(CUR_PATH, "export_test.xml"), "rb").read()
+    # the report is hashed while it's parsed, the same as hashing the whole of it
+    reader = HashingReader(io.BytesIO(data))
+    reader.read(100)
+    assert reader.hexdigest() == xml_fingerprint(data) == xml_fingerprint(io.BytesIO(data))
+
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER)
+    result = tool.scan()
+    assert not result.cached
+    assert result.fingerprint == xml_fingerprint(data)
+    snapshot = tool.snapshot
+
+    cachedResult = tool.scan()
+    assert cachedResult.cached
+    assert cachedResult.fingerprint == result.fingerprint
+    assert cachedResult.devices is result.devices
+    assert tool.snapshot is snapshot
+
+    # the changed report is parsed again
+    report = tmp_path / "export.xml"
+    report.write_bytes(data.replace(b"COM16", b"COM61"))
+    tool.exporter.command = STUB_EXPORTER + ["--report={}".format(report)]
+    result = tool.scan()
+    assert not result.cached
+    assert result.fingerprint == xml_fingerprint(data.replace(b"COM16", b"COM61"))
+    assert tool.get_port_from_chain("1-7-5") == "COM61"
+
+
+def make_fake_usb_bus(root, devnum=5):
+    usbDevices = root / "sys" / "bus" / "usb" / "devices"
+    usbDevices.mkdir(parents=True, exist_ok=True)
+    for name, busnum, num in [("usb1", 1, 1), ("1-7", 1, 2), ("1-7.5", 1, devnum)]:
+        (usbDevices / name).mkdir(exist_ok=True)
+        (usbDevices / name / "busnum").write_text(u"{}\n".format(busnum))
+        (usbDevices / name / "devnum").write_text(u"{}\n".format(num))
+    (usbDevices / "1-7.5:1.0").mkdir(exist_ok=True)
+    return root
+
+
+def test_fingerprint_watcher_linux(tmp_path):
+    root = make_fake_usb_bus(make_fake_tty_tree(tmp_path))
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(root / "sys"),
+                                            portInfoFactory=lambda device: FakeSerialPort(device, "1-7.5"))
+    tool.audioScanner = None
+    fingerprint = tool.fingerprint()
+    assert fingerprint == sysfs_fingerprint(str(root / "sys"))
+
+    results = []
+    watcher = TopologyWatcher(tool, callback=results.append)
+    assert watcher.poll() is not None
+    assert watcher.poll() is None
+    assert tool.scan().cached
+    assert len(results) == 1
+
+    # re-enumeration changes the devnum
+    make_fake_usb_bus(root, devnum=9)
+    assert tool.fingerprint() != fingerprint
+    result = watcher.poll()
+    assert result is not None and not result.cached
+    assert len(results) == 2
+    # the ttys of the same USB device are grouped
+    assert len(tool.usbDevices) == 1
+    assert len(tool.usbDevices[0].comPorts) == 3
+
+
+def make_descriptors(interfaces):
+    """The raw descriptors of a device with one configuration
+    :param interfaces: the list of (class, endpoint addresses)
+    """
+    body = b""
+    for number, (interfaceClass, endpoints) in enumerate(interfaces):
+        body += struct.pack("<BBBBBBBBB", 9, 4, number, 0, len(endpoints), interfaceClass, 0, 0, 0)
+        # class specific descriptor, skipped
+        body += struct.pack("<BBBBB", 5, 0x24, 0, 0x10, 0x01)
+        for address in endpoints:
+            body += struct.pack("<BBBBHB", 7, 5, address, 2, 0x200, 0)
+    config = struct.pack("<BBHBBBBB", 9, 2, 9 + len(body), len(interfaces), 1, 0, 0x80, 50)
+    device = struct.pack("<BBHBBBBHHHBBBB", 18, 1, 0x0200, 0xEF, 2, 1, 64, 0x1FC9, 0x00A6, 0x0100, 1, 2, 3, 1)
+    return device + config + body
+
+
+def test_sysfs_descriptors(tmp_path):
+    assert get_sysfs_name("1-7-5:Speaker") == "1-7.5"
+    assert get_sysfs_name("1-4") == "1-4"
+    data = make_descriptors([(CLASS_CDC, [0x83]), (CLASS_CDC_DATA, [0x81, 0x02]), (CLASS_AUDIO, [])])
+    descriptors = UsbDescriptors.parse(data)
+    assert (descriptors.bcdUSB, descriptors.vid, descriptors.pid, descriptors.bcdDevice) == ("2.00", 0x1FC9, 0xA6,
+                                                                                            "1.00")
+    assert descriptors.configurations[0].maxPower == 100
+    assert [(i.number, i.interfaceClass, len(i.endpoints)) for i in descriptors.interfaces] == \
+        [(0, CLASS_CDC, 1), (1, CLASS_CDC_DATA, 2), (2, CLASS_AUDIO, 0)]
+    assert descriptors.interfaces[1].endpoints[0].isIn and not descriptors.interfaces[1].endpoints[1].isIn
+    assert descriptors.interfaces[1].endpoints[0].maxPacketSize == 0x200
+    # the truncated descriptors are parsed as far as they are complete
+    assert len(UsbDescriptors.parse(data[:-10]).interfaces) == 2
+    assert UsbDescriptors.parse(data[:10]) is None
+
+    root = make_fake_usb_bus(make_fake_tty_tree(tmp_path))
+    usbDevices = root / "sys" / "bus" / "usb" / "devices"
+    (usbDevices / "1-7.5" / "descriptors").write_bytes(data)
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(root / "sys"),
+                                            portInfoFactory=lambda device: FakeSerialPort(device, "1-7.5"))
+    tool.audioScanner = None
+    tool.skipUnchanged = False
+    tool.scan()
+    device = tool.usbDevices[0]
+    assert device.has_interface(CLASS_CDC_DATA) and not device.has_interface(0xFF)
+    assert [interface.interfaceClass for interface in device.interfaces] == [CLASS_CDC, CLASS_CDC_DATA, CLASS_AUDIO]
+    # the descriptors are read once for the same busnum/devnum
+    tool.scan()
+    assert tool.usbDevices[0].descriptors is device.descriptors
+    assert len(tool.descriptorReader) == 1
+
+    # re-enumerated, it's read again
+    make_fake_usb_bus(root, devnum=9)
+    (usbDevices / "1-7.5" / "descriptors").write_bytes(make_descriptors([(CLASS_CDC_DATA, [0x81, 0x02])]))
+    tool.scan()
+    assert [interface.interfaceClass for interface in tool.usbDevices[0].interfaces] == [CLASS_CDC_DATA]
+    # the descriptors of the old devnum are dropped by the full scan
+    assert len(tool.descriptorReader) == 1
+    tool.scan(under="1-7")
+    assert len(tool.descriptorReader) == 1
+
+    # the scan threads read while a full scan prunes the cache
+    reader = tool.descriptorReader
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        try:
+            while not stop.is_set():
+                assert reader.get("1-7-5") is not None
+        except Exception as e:
+            errors.append(e)
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    try:
+        for _ in range(200):
+            reader.prune()
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join()
+    assert not errors
+
+
+def test_fingerprint_watcher_partial_scan(tmp_path):
+    root = make_fake_usb_bus(make_fake_tty_tree(tmp_path))
+    wedged = [True]
+
+    def factory(device):
+        if wedged[0]:
+            time.sleep(1)
+        return FakeSerialPort(device, "1-7.5")
+
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(root / "sys"), portInfoFactory=factory)
+    tool.audioScanner = None
+    watcher = TopologyWatcher(tool, timeout=0.2)
+    result = watcher.poll()
+    assert not result.complete and result.fingerprint is None
+    assert len(tool.usbDevices) == 0
+
+    # the topology is not changed, but the partial scan is scanned again
+    wedged[0] = False
+    result = watcher.poll()
+    assert result is not None and result.complete
+    assert len(tool.usbDevices) == 1
+    assert watcher.poll() is None
+
+
+@pytest.mark.parametrize("useNumpy", [False, True])
+def test_device_columns(useNumpy):
+    if useNumpy and not HAS_NUMPY:
+        pytest.skip("NumPy is not installed")
+    tool = UsbTreeViewTool()
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    columns = DeviceColumns(useNumpy=useNumpy)
+    columns.append(tool.snapshot, host="rig-1", scanTime=100.0)
+    columns.append(tool.snapshot, host="rig-2", scanTime=200.0)
+    devices = tool.usbDevices
+    assert len(columns) == 2 * len(devices)
+    # the strings are stored once
+    assert len(columns.strings["chain"].values) == len(set(device.portChain for device in devices))
+
+    under = [device for device in devices if device.portChain.startswith("1-7-")]
+    assert columns.count(columns.filter(under="1-7")) == 2 * len(under)
+    assert columns.count(columns.filter(under="1-7", host="rig-2")) == len(under)
+    assert columns.count(columns.filter(under="1-7", since=150.0)) == len(under)
+    assert columns.count(columns.filter(vid=0x10C4, pid=0xEA60, until=150.0)) == 2
+    assert columns.count(columns.filter(chain="9-9-9")) == 0
+
+    counts = columns.group_count(("host", "segment1"), columns.filter(under="1-7"))
+    assert counts == {("rig-1", 7): len(under), ("rig-2", 7): len(under)}
+    # the device counts per hub over time, the integer codes and the float times are grouped together
+    counts = columns.group_count(("segment1", "scanTime"), columns.filter(under="1-7"))
+    assert counts == {(7, 100.0): len(under), (7, 200.0): len(under)}
+    counts = columns.group_count(("chain", "scanTime"), columns.filter(chain="1-7-5"))
+    assert counts == {("1-7-5", 100.0): 1, ("1-7-5", 200.0): 1}
+    # no chain is deeper than MAX_CHAIN_DEPTH
+    assert columns.count(columns.filter(under="1-2-3-4-5-6-7-8-9")) == 0
+    moved = columns.distinct_count("sn", "chain", columns.filter(deviceType="COMPortDevice"))
+    moved.pop("", None)
+    assert moved and all(1 == count for count in moved.values())
+
+    other = tool.to_columns(host="rig-1", useNumpy=not useNumpy)
+    assert other.group_count("chain") == dict((key, count // 2) for key, count in columns.group_count("chain").items())
+
+
+def test_port_name_fuzzy():
+    assert normalize_port_name("Speakers (4- USB Audio Device)") == "speakers(usbaudiodevice)"
+    assert normalize_port_name("Speakers (USB  Audio Device)") == "speakers(usbaudiodevice)"
+    assert normalize_port_name("2- USB Audio Device") == "usbaudiodevice"
+
+    tool = UsbTreeViewTool()
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    # renamed after replug
+    assert tool.get_from_port("Microphone (7- USB AUDIO+CDC DEMO)") is None
+    device = tool.get_from_port("Microphone (7- USB AUDIO+CDC DEMO)", fuzzy=True)
+    assert device.portChain == "1-24-1"
+    assert tool.get_chain_from_port("Microphone (7- USB AUDIO+CDC DEMO)", fuzzy=True) == "1-24-1:Microphone"
+    assert tool.get_chain_from_port("COM 16", fuzzy=True) == "1-7-5"
+
+    # approximate name, ranked by the trigrams
+    candidates = tool.get_port_candidates("Speakers (2- USB AUDIO CDC DEMO)")
+    assert candidates[0][1] == "Speakers (4- USB AUDIO+CDC DEMO)"
+    assert 1.0 > candidates[0][0] > candidates[1][0]
+    assert tool.get_chain_from_port("Speakers (2- USB AUDIO CDC DEMO)", fuzzy=True) == "1-24-1:Speaker"
+    assert tool.get_port_candidates("Nothing like it") == []
+    assert tool.get_from_port("Nothing like it", fuzzy=True) is None
+
+    index = PortNameIndex([("Speakers (4- USB Audio Device)", "A"), ("Speakers (3- USB Audio Device)", "B")])
+    assert [device for _, _, device in index.search("speakers (usb audio device)")] == ["A", "B"]
+    assert index.search("speakers (usb audio device)", limit=1) == [(1.0, "Speakers (4- USB Audio Device)", "A")]
+
+    # the common trigrams are not visited, the candidates are the same as comparing with all ports
+    names = ["Speakers ({}- USB Audio Device {})".format(i % 9, i) for i in range(200)]
+    names += ["Headset Earphone (Jabra Evolve 65)", "Headset Microphone (Jabra Evolve 65)"]
+    index = PortNameIndex((name, name) for name in names)
+
+    def dice(query, name):
+        trigrams, other = get_trigrams(normalize_port_name(query)), get_trigrams(normalize_port_name(name))
+        return 2.0 * len(trigrams & other) / (len(trigrams) + len(other))
+
+    def brute_force(query, limit):
+        scores = [(dice(query, name), order, name) for order, name in enumerate(names)]
+        matched = sorted((-score, order, name) for score, order, name in scores if score >= PortNameIndex.MIN_SCORE)
+        return [name for _, _, name in matched[:limit]]
+
+    query = "Headset Earphone (2- Jabra Evolve 75 USB)"
+    assert [name for _, name, _ in index.search(query, limit=None)] == brute_force(query, None)
+    assert brute_force(query, 1) == ["Headset Earphone (Jabra Evolve 65)"]
+    query = "Speakers (USB Audio Device 7)"
+    assert index.search(query, limit=1)[0][1] == "Speakers (7- USB Audio Device 7)"
+
+    # the typo of the mostly common trigrams visits the short posting lists and the groups, not all ports
+    names = ["{} (USB Audio Device {})".format(kind, i) for i in range(8000) for kind in ("Speakers", "Microphone")]
+    index = PortNameIndex((name, name) for name in names)
+    for query in ("Speakrs (3- USB Audio Devce N)", "speaker usb audio devce 4123", "Microphone (USB Audio Devic 77)"):
+        assert [name for _, name, _ in index.search(query, limit=3)] == brute_force(query, 3)
+        assert index.visited < len(names) // 20
+
+
+def test_hotplug_journal(tmp_path):
+    journal = HotplugJournal(capacity=4)
+    for i in range(6):
+        journal.record(HotplugJournal.DETACH, "1-7-{}".format(i % 2), "SN{}".format(i), timestamp=100.0 + i)
+    # the oldest events are overwritten
+    assert len(journal) == 4
+    assert [e.sn for e in journal.history()] == ["SN2", "SN3", "SN4", "SN5"]
+    assert journal.counters == {"1-7-0": [0, 2], "1-7-1": [0, 2]}
+    assert journal.count("1-7-1") == 2
+    assert journal.count("1-7-1", since=104.0) == 1
+    assert journal.history(chain="1-7-0", since=103.0) == [HotplugEvent(104.0, HotplugJournal.DETACH, "1-7-0", "SN4")]
+
+    path = str(tmp_path / "journal.json")
+    journal.save(path)
+    loaded = HotplugJournal(capacity=4)
+    assert loaded.load(path)
+    assert loaded.history() == journal.history()
+    assert not HotplugJournal().load(str(tmp_path / "none.json"))
+    # it's replaced by the temp file of the same directory, no temp file is left
+    journal.save(path)
+    assert os.listdir(str(tmp_path)) == ["journal.json"]
+
+
+def test_hotplug_journal_file(monkeypatch, tmp_path):
+    # the default journal is per user, not in the shared temp directory
+    monkeypatch.setenv("LOCALAPPDATA" if "win32" == sys.platform else "XDG_CACHE_HOME", str(tmp_path))
+    assert USBDevicesChain.get_journal_file() == os.path.join(str(tmp_path), "pyusb_chain", "journal.json")
+
+
+def test_hotplug_journal_rescan(tmp_path):
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER)
+    tool.scan()
+    # the first scan is the baseline
+    assert len(tool.journal) == 0
+
+    report = tmp_path / "export.xml"
+    data = open(os.path.join(CUR_PATH, "export_test.xml"), "rb").read()
+    report.write_bytes(data.replace(b"[1-7-5] : Silicon Labs", b"[1-7-5] : Generic USB Hub - Silicon Labs"))
+    tool.exporter.command = STUB_EXPORTER + ["--report={}".format(report)]
+    tool.scan()
+    assert [(e.kind, e.chain) for e in tool.journal.history()] == [(HotplugJournal.DETACH, "1-7-5")]
+
+    # the scoped scan doesn't detach the devices out of the scope
+    tool.exporter.command = STUB_EXPORTER
+    tool.scan(under="1-3")
+    assert len(tool.journal) == 1
+    tool.scan(under="1-7")
+    assert tool.journal.count("1-7-5", kind=HotplugJournal.ATTACH) == 1
+    assert tool.journal.count("1-7-5") == 1
+    assert len(tool.journal.history(since=time.time() - 3600)) == 2
+
+
+def test_stress_harness_linear():
+    # the small sizes of the harness, run "python stress_pyusb_chain.py" for 1k, 5k and 20k devices
+    stream = io.StringIO()
+    # the time budgets are checked by the standalone harness only, the unit test checks the memory is linear
+    results, failures = stress_pyusb_chain.run(sizes=(200, 800), repeat=1, stream=stream, timing=False)
+    assert not failures, stream.getvalue()
+    assert set(results[800]) == set(stress_pyusb_chain.BUDGETS)
+    assert results[800]["parse"]["tracedPeak"] > results[200]["parse"]["tracedPeak"]
+    assert stress_pyusb_chain.get_chain(0) == "1-1-1-1"
+    assert stress_pyusb_chain.get_chain(344) == "2-1-1-2"
+
+
+def make_archive(directory):
+    xmlData = open(os.path.join(CUR_PATH, "export_test.xml"), "rb").read()
+    (directory / "rig-1").mkdir(parents=True)
+    (directory / "rig-2").mkdir()
+    (directory / "rig-1" / "monday.xml").write_bytes(xmlData)
+    # the same content is skipped
+    (directory / "rig-2" / "monday.xml").write_bytes(xmlData)
+    (directory / "rig-2" / "tuesday.xml").write_bytes(xmlData.replace(b"COM16", b"COM61"))
+    (directory / "rig-2" / "broken.xml").write_bytes(b"<UsbTreeViewReport>")
+    tool = UsbTreeViewTool()
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    data = {}
+    for device in tool.filter("COM16"):
+        data.update(device.export_data(jsonFormat=True))
+    (directory / "rig-2" / "export.json").write_text(json.dumps(data))
+    # the json file of other tools is skipped
+    (directory / "rig-2" / "journal.json").write_text(json.dumps({"version": 1, "events": []}))
+    (directory / "rig-2" / "notes.txt").write_text(u"not an export")
+    return tool
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_ingest_archive(tmp_path, jobs):
+    tool = make_archive(tmp_path / "archive")
+    store = ArchiveStore(str(tmp_path / "archive.db"))
+    stream = io.StringIO()
+    ingester = ArchiveIngester(store, jobs=jobs, stream=stream)
+    count = sum(len(device.export_data(jsonFormat=True)) for device in tool.usbDevices)
+    # the devices are counted, not the ports of the composite devices
+    assert count > len(tool.usbDevices)
+    assert ingester.ingest(str(tmp_path / "archive")) == (3, 2, 1, 2 * len(tool.usbDevices) + 1)
+    assert "devices/s" in stream.getvalue()
+    assert store.count() == (3, 2 * len(tool.usbDevices) + 1)
+    assert store.connection.execute("SELECT COUNT(*) FROM devices").fetchone()[0] == 2 * count + 1
+    rows = store.connection.execute("SELECT files.host, devices.portName FROM devices JOIN files "
+                                    "ON devices.hash = files.hash WHERE devices.chain = '1-7-5' "
+                                    "ORDER BY files.host, devices.portName").fetchall()
+    assert rows == [(None, "COM16"), ("ZCHLAB46681-131", "COM16"), ("ZCHLAB46681-131", "COM61")]
+
+    # the ingested files are skipped, the broken one is tried again
+    assert ingester.ingest(str(tmp_path / "archive")) == (0, 5, 1, 0)
+    store.close()
+
+
+def test_ingest_commandline(tmp_path, monkeypatch):
+    make_archive(tmp_path / "archive")
+    store = str(tmp_path / "archive.db")
+    monkeypatch.setattr(sys, "argv", ["pyusb-chain", "ingest", str(tmp_path / "archive"), "--store", store, "-j", "1"])
+    usbDevicesChain = USBDevicesChain()
+    usbDevicesChain.command_process()
+    assert usbDevicesChain.command == "ingest"
+    assert usbDevicesChain.args.jobs == 1
+    usbDevicesChain.process()
+    assert ArchiveStore(store).count()[0] == 3
+
+
+def test_exec_commandline(tmp_path, monkeypatch):
+    import pyusb_chain.__main__ as main
+    inventory = tmp_path / "rig.json"
+    inventory.write_text(u'{"console": {"chain": "1-7-7-1"}}')
+    tools = []
+
+    def make_tool():
+        tools.append(UsbTreeViewTool(exportCommand=STUB_EXPORTER))
+        return tools[-1]
+
+    calls = []
+    monkeypatch.setattr(main, "UsbTreeViewTool", make_tool)
+    monkeypatch.setattr(main.os, "execvpe", lambda file, args, env: calls.append((file, args, env)))
+    monkeypatch.setattr(main, "platform", "linux")
+    monkeypatch.setattr(sys, "argv", ["pyusb-chain", "exec", "--map", "BOARD=1-7-5", "--map", "AUDIO=1-7-3:1",
+                                      "--", "flash.sh", "--port={BOARD}", "{AUDIO}", "{UNKNOWN}", "{}"])
+    usbDevicesChain = USBDevicesChain()
+    usbDevicesChain.command_process()
+    assert usbDevicesChain.command == "exec"
+    usbDevicesChain.process()
+    assert len(tools) == 1
+    assert calls[0][:2] == ("flash.sh", ["flash.sh", "--port=COM16", "COM8", "{UNKNOWN}", "{}"])
+    assert calls[0][2]["BOARD"] == "COM16" and calls[0][2]["AUDIO"] == "COM8"
+    assert "PATH" in calls[0][2]
+    # one scan of the subtree of the chains
+    assert tools[0].usbDevices and all(device.portChain.startswith("1-7-") for device in tools[0].usbDevices)
+
+    # the aliases of the inventory
+    monkeypatch.setattr(sys, "argv", ["pyusb-chain", "exec", "-i", str(inventory), "--", "cat", "{console}"])
+    usbDevicesChain.command_process()
+    usbDevicesChain.process()
+    assert calls[1][1] == ["cat", "COM20"]
+
+    monkeypatch.setattr(sys, "argv", ["pyusb-chain", "exec", "--map", "BOARD=9-9-9", "--", "flash.sh", "{BOARD}"])
+    usbDevicesChain.command_process()
+    with pytest.raises(SystemExit):
+        usbDevicesChain.process()
+    assert len(calls) == 2
+    assert ScanScope.common_chain(["1-7-5", "1-7-7-4:1", "1-7"]) == "1-7"
+    assert ScanScope.common_chain(["1-7-5", "2-1"]) is None
+
+
+class PtyDevice(object):
+    """pty pair standing in for a USB serial device, the slave is the tty opened by the pool
+    """
+    def __init__(self, chain):
+        self.master, self.slave = os.openpty()
+        self.device = COMPortDevice("USB Serial", FakeSerialPort(os.ttyname(self.slave), chain.replace("-", ".", 1)))
+        self.device.parse()
+
+    def read(self, size):
+        return os.read(self.master, size)
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+@pytest.mark.skipif('win32' == platform, reason="requires the pty of posix os")
+def test_serial_port_pool():
+    import serial
+    opened = []
+
+    def factory(port, **settings):
+        opened.append(port)
+        return serial.Serial(port, **settings)
+
+    first = PtyDevice("1-7-5")
+    tool = UsbTreeViewTool()
+    tool.publish([first.device])
+    pool = SerialPortPool(tool, idleTimeout=None, rescan=False, serialFactory=factory, baudrate=115200, timeout=1)
+    with pool.connection("1-7-5") as ser:
+        assert ser.port == first.device.get_com_port()
+        assert ser.baudrate == 115200
+        ser.write(b"ping")
+        assert first.read(4) == b"ping"
+    # the pooled handle is reused with the changed settings
+    with pool.connection("1-7-5", baudrate=9600) as ser:
+        assert ser.baudrate == 9600
+        assert ser.is_open
+        stale = ser
+    assert len(opened) == 1
+    assert pool.acquire("9-9-9") is None
+
+    # re-enumerated under a new tty, the stale handle is closed and the new one is opened
+    second = PtyDevice("1-7-5")
+    tool.publish([second.device])
+    with pool.connection("1-7-5") as ser:
+        assert not stale.is_open
+        assert ser.port == second.device.get_com_port()
+        ser.write(b"pong")
+        assert second.read(4) == b"pong"
+    assert opened == [first.device.get_com_port(), second.device.get_com_port()]
+
+    # the held handle is replaced for the next caller, it's closed once its holder releases it
+    held = pool.acquire("1-7-5")
+    tool.publish([first.device])
+    with pool.connection("1-7-5") as ser:
+        assert held.is_open and ser is not held
+        pool.release("1-7-5", held)
+        assert not held.is_open
+        assert ser.is_open
+        assert pool._ports["1-7-5"].users == 1
+        # the shared handle is not reconfigured under its holder
+        with pytest.raises(ValueError):
+            pool.acquire("1-7-5", baudrate=9600)
+        assert ser.baudrate == 115200 and pool._ports["1-7-5"].users == 1
+    assert pool._ports["1-7-5"].users == 0
+    tool.publish([second.device])
+
+    # the port is not found in the stale snapshot, found by a rescan
+    third = PtyDevice("1-7-6")
+    unlocked = []
+
+    def rescan(*args, **kwargs):
+        # the other chains are not blocked by the scan
+        worker = threading.Thread(target=lambda: unlocked.append(pool.acquire("1-7-5") is not None))
+        worker.start()
+        worker.join()
+        tool.publish([second.device, third.device])
+
+    tool.scan = rescan
+    pool.rescan = True
+    with pool.connection("1-7-6") as ser:
+        assert ser.port == third.device.get_com_port()
+    assert unlocked == [True]
+    pool.release("1-7-5")
+
+    # the least recently used idle handle is closed
+    pool.maxIdle = 1
+    assert pool.evict_idle() == 1
+    assert len(pool) == 1
+    pool.idleTimeout = 0
+    assert pool.evict_idle() == 1
+    assert len(pool) == 0
+    for device in (first, second, third):
+        device.close()
+
+
+@pytest.mark.skipif('win32' == platform, reason="requires the pty of posix os")
+def test_probe_ports(monkeypatch):
+    import serial
+    echo, silent, wedged = PtyDevice("1-7-5"), PtyDevice("1-7-6"), PtyDevice("1-7-7")
+
+    def loopback():
+        data = echo.read(1024)
+        os.write(echo.master, data)
+
+    thread = threading.Thread(target=loopback)
+    thread.daemon = True
+    thread.start()
+
+    def factory(port, **settings):
+        if port == wedged.device.get_com_port():
+            time.sleep(5)
+        return serial.Serial(port, **settings)
+
+    tool = UsbTreeViewTool()
+    tool.publish([echo.device, silent.device, wedged.device])
+    start = time.time()
+    results = tool.probe(timeout=1.0, workers=2, loopback=True, serialFactory=factory, baudrate=115200)
+    # the wedged port doesn't hold the others
+    assert time.time() - start < 2.5
+    assert [(r.chain, r.status) for r in results] == [(echo.device.portChain, "ok"),
+                                                      (silent.device.portChain, "loopback failed"),
+                                                      (wedged.device.portChain, "timeout")]
+    assert results[0].ok and results[0].latency < 1.0
+    assert results[1].error == "read b''"
+
+    results = tool.probe(timeout=1.0, filters=silent.device.get_com_port(), serialFactory=factory)
+    assert [(r.port, r.status) for r in results] == [(silent.device.get_com_port(), "ok")]
+    results = tool.probe(filters="COM404")
+    assert results == []
+
+    stream = io.StringIO()
+    USBDevicesChain.print_probe(tool.probe(timeout=1.0, filters=silent.device.get_com_port()), stream=stream)
+    assert silent.device.get_com_port() in stream.getvalue()
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER)
+    tool.scan()
+    results = tool.probe(serialFactory=lambda port, **settings: 1 / 0)
+    assert len(results) == 16
+    assert set((r.status, r.error) for r in results) == {("failed", "division by zero")}
+    assert ("1-3-1:2", "COM11") in [(r.chain, r.port) for r in results]
+    for device in (echo, silent, wedged):
+        device.close()
+
+
+def test_live_view(tmp_path):
+    assert sorted(["1-3-10", "1-3-9:Speaker", "1-3-9", "1-24"], key=chain_sort_key) == \
+        ["1-3-9", "1-3-9:Speaker", "1-3-10", "1-24"]
+
+    tool = UsbTreeViewTool(exportCommand=STUB_EXPORTER)
+    tool.quiet = True
+    stream = io.StringIO()
+    view = LiveView(tool, USBDevicesChain.get_headers(True), allInfo=True, stream=stream, highlightSeconds=5.0)
+    # the first refresh draws the full table
+    redrawn = view.refresh(now=100.0)
+    # status, header, separator and rows
+    assert redrawn == sum(len(device.export_data(True)) for device in tool.usbDevices) + 3
+    assert stream.getvalue().startswith(LiveView.CLEAR_SCREEN)
+    assert "COM16" in stream.getvalue()
+
+    # nothing is redrawn if the topology is not changed
+    stream.truncate(0)
+    stream.seek(0)
+    assert view.refresh(now=101.0) == 0
+    assert stream.getvalue() == ""
+
+    # the detached row is kept in red, the changed rows (2 devices of COM18) are yellow,
+    # only they and the status line are redrawn
+    report = tmp_path / "export.xml"
+    data = open(os.path.join(CUR_PATH, "export_test.xml"), "rb").read()
+    report.write_bytes(data.replace(b"[1-7-5] : Silicon Labs", b"[1-7-5] : Generic USB Hub - Silicon Labs")
+                       .replace(b"COM18", b"COM81"))
+    tool.exporter.command = STUB_EXPORTER + ["--report={}".format(report)]
+    stream.truncate(0)
+    stream.seek(0)
+    assert view.refresh(now=102.0) == 4
+    output = stream.getvalue()
+    assert LiveView.CLEAR_SCREEN not in output
+    assert LiveView.COLORS[LiveView.DETACHED] + "1-7-5 " in output
+    assert LiveView.COLORS[LiveView.CHANGED] + "1-7-6 " in output
+    assert LiveView.COLORS[LiveView.CHANGED] + "1-9-3-4-3-4 " in output
+    assert "0 attached, 1 detached" in output
+
+    # the detached row is removed once the highlighting is expired, the lines after it move up
+    stream.truncate(0)
+    stream.seek(0)
+    redrawn = view.refresh(now=110.0)
+    assert "1-7-5 " not in stream.getvalue()
+    assert "COM81" in stream.getvalue()
+    assert redrawn < len(view._lines)
+
+    # the scoped view scans and lists only the subtree, even the snapshot has the devices of the other scans
+    tool.exporter.command = STUB_EXPORTER
+    tool.scan()
+    view = LiveView(tool, USBDevicesChain.get_headers(False), stream=io.StringIO(), under="1-7")
+    view.refresh(now=120.0)
+    assert view._rows and all(key.startswith("1-7-") for key in view._rows)
+    assert len(tool.usbDevices) > len(set(key.split(":")[0] for key in view._rows))
+    assert view.watcher.under == "1-7"
+    if "win32" != sys.platform:
+        assert enable_virtual_terminal()
+
+
+def test_cached_rows_and_json():
+    tool = UsbTreeViewTool()
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    device = tool.get_from_chain("1-7-5")
+    rows = device.rows(allInfo=True)
+    assert rows == tuple(tuple(row) for row in device.export_data(True))
+    assert device.rows(allInfo=True) is rows
+    assert device.json_data() is device.json_data()
+    assert "com16" in device.search_text()
+
+    # the cache is invalidated once a parsed field is changed
+    device.deviceName = "Renamed Bridge"
+    assert device.rows(allInfo=True)[0][2] == "Renamed Bridge"
+    assert device.json_data()["1-7-5"]["Device Name"] == "Renamed Bridge"
+    assert device.rows()[0][1] == "COM16"
+    device.comPorts[0] = "COM61"
+    assert device.rows()[0][1] == "COM16"
+    device.invalidate()
+    assert device.rows()[0][1] == "COM61"
+
+    # the filtered devices and the serialised json are cached in the snapshot of the scan
+    assert tool.filter("Renamed,COM20") == [device, tool.get_from_port("COM20")]
+    text = tool.to_json("Renamed")
+    assert tool.to_json("Renamed") is text
+    assert list(json.loads(text)) == ["1-7-5"]
+    # the results of the filters are bounded, the least recently used ones are dropped
+    snapshot = tool.snapshot
+    full = snapshot.to_json()
+    for i in range(snapshot.CACHE_SIZE * 2):
+        snapshot.filter("COM{}".format(i))
+        assert snapshot.to_json("Renamed") is text
+    assert len(snapshot._cache) == snapshot.CACHE_SIZE + 2
+    assert snapshot.to_json() is full
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    assert tool.to_json("Renamed") == "{}"
+
+
+def test_rig_inventory(tmp_path):
+    path = tmp_path / "rig.json"
+    path.write_text(json.dumps({
+        "console": "1-7-5",
+        "debugger": {"chain": "1-7-6", "sn": "0205000047784e4500349004d917002ae561000097969900"},
+        "quad": {"chain": "1-3-1", "ports": 4},
+        "quad2": "1-3-1:2",
+        "speaker": "1-3-5:Speaker",
+        "moved": {"chain": "1-7-7", "sn": "0229000012979c5b00000000000000000000000097969905"},
+        "swapped": {"chain": "1-7-6", "sn": "0000"},
+        "absent": "9-9-9",
+        "dual": {"chain": "1-7-3", "ports": 4},
+    }))
+    tool = UsbTreeViewTool()
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    assert tool.resolve_alias("console") is None
+    assert len(tool.load_inventory(str(path))) == 9
+
+    results = dict((result.entry.alias, result) for result in tool.validate_inventory())
+    assert [alias for alias in sorted(results) if results[alias].ok] == ["console", "debugger", "quad", "quad2",
+                                                                          "speaker"]
+    assert results["moved"].status == RigInventory.STATUS_MOVED
+    assert results["moved"].device.portChain == "1-3-7-2"
+    assert results["swapped"].status == RigInventory.STATUS_SN_MISMATCH
+    assert results["absent"].status == RigInventory.STATUS_MISSING
+    assert results["dual"].status == RigInventory.STATUS_PORT_COUNT
+    assert results["dual"].problems == ["2 ports, expected 4"]
+
+    assert tool.resolve_alias("console") == "COM16"
+    assert tool.resolve_alias("quad2") == "COM11"
+    assert tool.resolve_alias("speaker") == "Speakers (3- USB Audio Device)"
+    assert tool.resolve_alias("moved") == "COM17"
+    assert tool.resolve_alias("swapped") is None
+    assert tool.resolve_alias("absent") is None
+    assert tool.resolve_alias("unknown") is None
+
+    # the INI inventory, the alias index is rebuilt for the new scan
+    path = tmp_path / "rig.ini"
+    path.write_text(u"[console]\nchain = 1-7-5\n\n[board]\nsn = DEC3D6\nports = 1\n")
+    tool.load_inventory(str(path))
+    tool.parse(os.path.join(CUR_PATH, "export_test.xml"))
+    assert all(result.ok for result in tool.validate_inventory())
+    assert tool.resolve_alias("console") == "COM16"
+    with pytest.raises(ValueError):
+        RigInventory.from_dict({"nothing": {}})
+
+    stream = io.StringIO()
+    USBDevicesChain.print_inventory(tool.validate_inventory(), stream=stream)
+    assert "2 of 2 devices are ok" in stream.getvalue()
+
+
+class SleepBackend(ScannerBackend):
+    """The custom backend of one serial port, it takes the seconds to scan, and waits for the other backends of the
+    barrier to scan at the same time
+    """
+    def __init__(self, name, device, location, seconds, barrier=None):
+        self.name = name
+        self.port = FakeSerialPort(device, location, "USB Serial")
+        self.seconds = seconds
+        self.barrier = barrier
+
+    def scan(self, deadline, scope, result):
+        if self.barrier:
+            self.barrier.wait(timeout=5)
+        time.sleep(self.seconds)
+        usbDevice = COMPortDevice(self.port.description, self.port)
+        usbDevice.parse()
+        result.devices.append(usbDevice)
+
+
+class GateBackend(SleepBackend):
+    """The custom backend waits for the gate to scan, and counts the scans
+    """
+    def __init__(self, name, device, location, gate):
+        SleepBackend.__init__(self, name, device, location, 0)
+        self.gate = gate
+        self.scans = 0
+
+    def scan(self, deadline, scope, result):
+        self.scans += 1
+        self.gate.wait(timeout=5)
+        SleepBackend.scan(self, deadline, scope, result)
+
+
+class TagBackend(SleepBackend):
+    """The custom backend merges its device into the device of the same port chain by tagging it
+    """
+    def merge(self, device, other):
+        other.tag = self.name
+        return other
+
+
+def test_iter_devices_coalesce_scan(tmp_path):
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(make_fake_tty_tree(tmp_path) / "sys"),
+                                            portInfoFactory=make_audio_vcom_port)
+    tool.audioScanner = None
+    gate = threading.Event()
+    backend = GateBackend("gate", "/dev/ttyS7", "3-1", gate)
+    tool.register_backend(backend)
+
+    # the lazy iteration joins the scan in flight, the backends are run once for both
+    future = tool.scan_async()
+    devices = tool.iter_devices()
+    gate.set()
+    assert [device.get_com_port() for device in devices] == ["/dev/ttyACM0", "/dev/ttyS7"]
+    assert len(future.result(timeout=5).devices) == 2
+    assert backend.scans == 1
+
+    # the parked iteration never blocks the scans
+    tool.publish([])
+    devices = tool.iter_devices()
+    assert next(devices).get_com_port() == "/dev/ttyACM0"
+    result = tool.scan(timeout=5)
+    assert result.complete and len(result.devices) == 2
+    # the parked iteration doesn't scan ahead of its caller
+    assert backend.scans == 2
+    # the stopped iteration is not published, the complete one is published like scan()
+    tool.publish([])
+    devices.close()
+    assert len(tool.usbDevices) == 0
+    assert len(list(tool.iter_devices())) == 2
+    assert tool.get_port_from_chain("3-1") == "/dev/ttyS7"
+
+    # the registered backend merges its device in both scan() and iter_devices()
+    tool.scanner.unregister("gate")
+    tool.register_backend(TagBackend("tag", "/dev/ttyS8", "1-24.1", 0))
+    for devices in (tool.scan().devices, list(tool.iter_devices())):
+        assert len(devices) == 1
+        assert devices[0].get_com_port() == "/dev/ttyACM0" and devices[0].tag == "tag"
+
+
+def test_composite_scanner(tmp_path):
+    root = make_fake_audio_tree(tmp_path / "audio")
+    tool = UsbTreeViewTool()
+    tool.exporter = None
+    tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(make_fake_tty_tree(tmp_path / "tty") / "sys"),
+                                            portInfoFactory=lambda device: FakeSerialPort(device, "1-24.1:1.2"))
+    tool.audioScanner = LinuxAudioScanner(sysfsRoot=str(root / "sys"), procRoot=str(root / "proc"))
+    # the barrier is broken unless both backends are scanning at the same time
+    barrier = threading.Barrier(2)
+    tool.register_backend(SleepBackend("slow1", "/dev/ttyS7", "3-1", 0, barrier))
+    tool.register_backend(SleepBackend("slow2", "/dev/ttyS8", "3-2", 0, barrier))
+
+    # the backends are run concurrently, and the audio card is merged with the VCOMs of the same chain
+    result = tool.scan()
+    assert result.complete and not result.cached
+    assert tool.get_port_from_chain("3-1") == "/dev/ttyS7"
+    assert tool.get_port_from_chain("3-2") == "/dev/ttyS8"
+    assert tool.get_chain_from_port("Microphone (hw:CARD=DEMO,DEV=0)") == "1-24-1:Microphone"
+    assert tool.get_port_from_chain("1-24-1:/dev/ttyACM0") == "/dev/ttyACM0"
+    # the custom backends aren't covered by the topology fingerprint
+    assert not tool.scan().cached
+
+    # the hung backend is dropped at its budget
+    tool.register_backend(SleepBackend("slow1", "/dev/ttyS7", "3-1", 0))
+    tool.register_backend(SleepBackend("slow2", "/dev/ttyS8", "3-2", 5))
+    tool.backendBudgets["slow2"] = 0.5
+    result = tool.scan()
+    assert result.timedOut == ["slow2"]
+    # the scan doesn't wait for the hung backend, and its thread doesn't block the interpreter exit
+    hung = [thread for thread in threading.enumerate() if thread.name == "pyusb_chain_slow2"]
+    assert hung and all(thread.daemon and thread.is_alive() for thread in hung)
+    assert tool.get_port_from_chain("3-1") == "/dev/ttyS7"
+    assert tool.get_from_chain("3-2") is None
+
+    assert tool.scanner.unregister("slow1").name == "slow1"
+    assert tool.scanner.unregister("slow2").name == "slow2"
+    assert tool.scanner.unregister("slow2") is None
+    assert [backend.name for backend in tool.scanner.get_backends()] == [UsbTreeViewTool.BACKEND_SERIAL,
+                                                                        UsbTreeViewTool.BACKEND_AUDIO]
+
+
+PLUGIN_TEST = u'''
+import pytest
+
+
+def test_tool(usb_tool):
+    assert usb_tool.get_port_from_chain("1-7-5") == "COM16"
+
+
+@pytest.mark.usb_chain("1-7-5", "1-7-6")
+def test_ports(usb_ports, usb_port):
+    assert usb_ports == {"1-7-5": "COM16", "1-7-6": "COM18"}
+    assert usb_port == "COM16"
+
+
+@pytest.mark.usb_chain("9-9-9")
+def test_absent():
+    assert False
+
+
+@pytest.mark.usb_power_cycle
+def test_power_cycle(usb_tool):
+    pass
+
+
+def test_after_power_cycle(usb_tool):
+    assert usb_tool.get_port_from_chain("1-7-5") == "COM16"
+
+
+def test_unmarked(request):
+    assert "_usb_chain_markers" not in request.fixturenames
+'''
+
+
+@pytest.mark.skipif('win32' == platform, reason="requires the Linux sysfs backends")
+def test_pytest_plugin_share_linux(tmp_path):
+    from serial.tools.list_ports_linux import SysFS
+    from pyusb_chain.pytest_plugin import UsbChainSession
+    locations = {"ttyUSB0": "1-7.5:1.0", "ttyACM0": "1-7.6:1.1", "ttyACM1": "1-24.1:1.2"}
+
+    def factory(device):
+        port = SysFS(device)
+        port.location = locations[os.path.basename(device)]
+        port.vid, port.pid = 0x1fc9, 0xa6
+        port.description = "USB Serial"
+        port.hwid = port.usb_info()
+        return port
+
+    def make_tool():
+        tool = UsbTreeViewTool()
+        tool.exporter = None
+        tool.serialScanner = LinuxSerialScanner(sysfsRoot=str(make_fake_tty_tree(tmp_path / "tty") / "sys"),
+                                                portInfoFactory=factory)
+        audio = make_fake_audio_tree(tmp_path / "audio")
+        tool.audioScanner = LinuxAudioScanner(sysfsRoot=str(audio / "sys"), procRoot=str(audio / "proc"))
+        return tool
+
+    # the devices of pyserial SysFS and the audio cards go through the pickled snapshot of the xdist workers
+    first = UsbChainSession(shareDir=str(tmp_path))
+    first.tool = make_tool()
+    second = UsbChainSession(shareDir=str(tmp_path))
+    second.tool = UsbTreeViewTool()
+    second.tool.exporter = None
+    second.tool.scan = None
+    chains = ["1-7-5", "1-24-1:Microphone", "1-24-1:/dev/ttyACM1", "9-9-9"]
+    expected = ({"1-7-5": "/dev/ttyUSB0", "1-24-1:Microphone": "Microphone (hw:CARD=DEMO,DEV=0)",
+                 "1-24-1:/dev/ttyACM1": "/dev/ttyACM1"}, ["9-9-9"])
+    assert first.resolve(chains) == expected
+    assert second.resolve(chains) == expected
+    assert second.generation == 0
+    assert isinstance(second.tool.get_from_chain("1-7-5").info, SysFS)
+
+
+def test_pytest_plugin(tmp_path):
+    import shlex
+    import subprocess
+    (tmp_path / "test_rig.py").write_text(PLUGIN_TEST)
+    counter = tmp_path / "count"
+    counter.mkdir()
+    command = " ".join(shlex.quote(arg) for arg in STUB_EXPORTER + ["--count={}".format(counter)])
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(CUR_PATH))
+    env.pop("PYTEST_XDIST_WORKER", None)
+
+    def run_pytest(*args):
+        process = subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "pyusb_chain.pytest_plugin",
+                                  "--usb-export-command={}".format(command), str(tmp_path / "test_rig.py")] +
+                                 list(args), cwd=str(tmp_path), env=env, stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT, universal_newlines=True)
+        return process.stdout
+
+    # scanned once, and once more after the power cycle
+    output = run_pytest()
+    assert "5 passed, 1 skipped" in output, output
+    assert len(os.listdir(str(counter))) == 2
+
+    # the xdist workers share the scan of the first one
+    for name in os.listdir(str(counter)):
+        os.remove(str(counter / name))
+    (tmp_path / "share").mkdir()
+    env["PYTEST_XDIST_WORKER"] = "gw0"
+    output = run_pytest("--basetemp={}".format(tmp_path / "share" / "gw0"), "-k", "not power_cycle")
+    assert "3 passed, 1 skipped" in output, output
+    assert (tmp_path / "share" / "pyusb_chain_snapshot.pickle").exists()
+    env["PYTEST_XDIST_WORKER"] = "gw1"
+    output = run_pytest("--basetemp={}".format(tmp_path / "share" / "gw1"))
+    assert "5 passed, 1 skipped" in output, output
+    # 1 scan of gw0, and the rescan of the power cycle in gw1
+    assert len(os.listdir(str(counter))) == 2
+
+
+def test_pytest_plugin_no_stash(monkeypatch):
+    # pytest < 7 has no StashKey, the plugin is still imported
+    import importlib
+    import pyusb_chain.pytest_plugin as plugin
+    monkeypatch.delattr(pytest, "StashKey")
+    try:
+        importlib.reload(plugin)
+        node = type("Item", (object,), {})()
+        assert plugin.get_stash(node, plugin.PORTS_KEY, {}) == {}
+        plugin.set_stash(node, plugin.PORTS_KEY, {"1-7-5": "COM3"})
+        assert plugin.get_stash(node, plugin.PORTS_KEY, {}) == {"1-7-5": "COM3"}
+    finally:
+        monkeypatch.undo()
+        importlib.reload(plugin)